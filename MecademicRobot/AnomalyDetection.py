@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+import math
+import threading
+import time
+from collections import deque, namedtuple
+
+# Smallest standard deviation of each field in its stream units, so that a
+# flat baseline does not turn sensor noise into anomalies
+DEFAULT_STD_FLOOR = {'torque': 1.0, 'accelerometer': 50.0}
+
+Anomaly = namedtuple('Anomaly', ['time', 'segment', 'field', 'joint', 'value', 'mean', 'std', 'score'])
+
+
+class _Baseline:
+    """Exponentially weighted mean and variance of the 6 channels of a field."""
+
+    __slots__ = ('mean', 'variance', 'count', 'outliers')
+
+    def __init__(self):
+        self.mean = [0.0] * 6
+        self.variance = [0.0] * 6
+        self.count = 0
+        self.outliers = [0] * 6         # consecutive anomalous samples of each channel
+
+
+class AnomalyDetector:
+    """Streaming detector of collisions and anomalies on the torque and
+    accelerometer feedback, meant to be registered with
+    RobotFeedback.add_listener.
+
+    Each channel keeps an exponentially weighted mean and variance, per
+    program segment, in constant memory. A sample is scored against the
+    baseline before updating it, so an anomaly is reported on the sample
+    that crosses the threshold; anomalous samples are left out of the
+    baseline. The detector then latches until rearm is called, optionally
+    after writing PauseMotion through the priority lane.
+
+    As anomalous samples are not learned, a lasting change of the signal,
+    such as a heavier payload, keeps firing after rearm. Call reset to learn
+    the new baseline, or set relearn_after to restart the baseline of a
+    channel from its value after that many anomalous samples in a row.
+
+    Attributes
+    ----------
+    fields : tuple of string
+        Feedback fields watched, among 'torque' and 'accelerometer'.
+    alpha : float
+        Weight of a new sample in the baselines.
+    threshold : float
+        Deviation from the mean, in standard deviations, that is an anomaly.
+    warmup : int
+        Number of samples of a segment before it is scored.
+    relearn_after : int
+        Number of anomalous samples in a row after which a channel restarts
+        its baseline, None to never do so.
+    segment : string
+        Current program segment, see set_segment.
+    triggered : Anomaly
+        First anomaly since the last rearm, None while armed.
+    anomalies : deque of Anomaly
+        Last 100 anomalies.
+
+    """
+
+    def __init__(self, robot=None, fields=('torque', 'accelerometer'), alpha=0.02, threshold=6.0,
+                 warmup=100, std_floor=None, on_anomaly=None, relearn_after=None):
+        """Constructor for a detector.
+
+        Parameters
+        ----------
+        robot : RobotController
+            Controller to write PauseMotion to on an anomaly, None to only report.
+            Its answer is not waited for, so that feedback keeps flowing.
+        fields : tuple of string
+            Feedback fields to watch.
+        alpha : float
+            Weight of a new sample in the baselines, between 0 and 1.
+        threshold : float
+            Deviation in standard deviations that is an anomaly.
+        warmup : int
+            Number of samples of a segment before it is scored.
+        std_floor : dict
+            Smallest standard deviation of each field, DEFAULT_STD_FLOOR when None.
+        on_anomaly : callable
+            Called with the detector and the Anomaly when it triggers.
+        relearn_after : int
+            Number of anomalous samples in a row after which a channel
+            restarts its baseline, None to never do so.
+
+        """
+        unknown = set(fields) - set(DEFAULT_STD_FLOOR)
+        if unknown:
+            raise ValueError(f'Cannot watch {sorted(unknown)}, expected some of {tuple(DEFAULT_STD_FLOOR)}.')
+        self.robot = robot
+        self.fields = tuple(fields)
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.relearn_after = relearn_after
+        self.std_floor = dict(DEFAULT_STD_FLOOR, **(std_floor or {}))
+        self.on_anomaly = on_anomaly
+        self.segment = None
+        self.triggered = None
+        self.anomalies = deque(maxlen=100)
+        self._baselines = {}
+        self._current = self._segment_baselines(None)
+        self._lock = threading.Lock()       # set_segment and rearm may come from the control thread
+
+    def _segment_baselines(self, segment):
+        baselines = self._baselines.get(segment)
+        if baselines is None:
+            baselines = self._baselines[segment] = {field: _Baseline() for field in self.fields}
+        return baselines
+
+    def set_segment(self, segment):
+        """Switches to the baselines of a program segment, such as the name of
+        the move being run, created on first use.
+
+        Parameters
+        ----------
+        segment : hashable
+            Segment name, None for the default segment.
+
+        """
+        with self._lock:
+            self.segment = segment
+            self._current = self._segment_baselines(segment)
+
+    def rearm(self):
+        """Clears the triggered anomaly, so that the next one is reported.
+
+        """
+        self.triggered = None
+
+    def reset(self, segment=None):
+        """Forgets the baselines of a segment, of every segment when None,
+        so that they are learned again, after a lasting change of the signal.
+
+        """
+        with self._lock:
+            if segment is None:
+                self._baselines.clear()
+            else:
+                self._baselines.pop(segment, None)
+            self._current = self._segment_baselines(self.segment)
+
+    def __call__(self, feedback):
+        """Scores the latest feedback, then updates the baselines.
+
+        Parameters
+        ----------
+        feedback : RobotFeedback
+            Feedback whose watched fields are read.
+
+        """
+        baselines = self._current
+        alpha = self.alpha
+        for field in self.fields:
+            values = getattr(feedback, field)
+            if len(values) != 6:
+                continue
+            baseline = baselines[field]
+            mean = baseline.mean
+            variance = baseline.variance
+            outliers = baseline.outliers
+            scored = baseline.count >= self.warmup
+            floor = self.std_floor[field]
+            worst = None
+            for joint in range(6):
+                deviation = values[joint] - mean[joint]
+                if scored:
+                    std = max(math.sqrt(variance[joint]), floor)
+                    score = abs(deviation) / std
+                    if score > self.threshold:
+                        if worst is None or score > worst[0]:
+                            worst = (score, joint, std)
+                        outliers[joint] += 1
+                        if self.relearn_after is None or outliers[joint] < self.relearn_after:
+                            continue                # an anomaly does not teach the baseline
+                        mean[joint] = values[joint]     # lasting change, start over from here
+                        variance[joint] = 0.0
+                        outliers[joint] = 0
+                        continue
+                    outliers[joint] = 0
+                increment = alpha * deviation
+                mean[joint] += increment
+                variance[joint] = (1 - alpha) * (variance[joint] + deviation * increment)
+            baseline.count += 1
+            if worst is not None:
+                score, joint, std = worst
+                self._report(Anomaly(time.monotonic(), self.segment, field, joint, values[joint],
+                                     mean[joint], std, score))
+
+    def _report(self, anomaly):
+        self.anomalies.append(anomaly)
+        if self.triggered is not None:
+            return
+        self.triggered = anomaly
+        if self.robot is not None:
+            # Only written, ahead of buffered commands: waiting for [2042] would stall
+            # get_data, and outside threaded mode read answers meant for the control thread
+            self.robot._send_priority('PauseMotion')
+        if self.on_anomaly is not None:
+            self.on_anomaly(self, anomaly)
+
+    def stats(self, segment=None):
+        """Returns the baselines of a segment.
+
+        Parameters
+        ----------
+        segment : hashable
+            Segment name, None for the default segment.
+
+        Returns
+        -------
+        stats : dict
+            For each field, 'count' and the 'mean' and 'std' of the 6 channels,
+            empty when the segment has no baselines.
+
+        """
+        baselines = self._baselines.get(segment, {})
+        return {field: {'count': baseline.count, 'mean': tuple(baseline.mean),
+                        'std': tuple(math.sqrt(v) for v in baseline.variance)}
+                for field, baseline in baselines.items()}
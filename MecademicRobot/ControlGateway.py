@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+from MecademicRobot.RobotController import _ERROR_CODES, RobotController
+
+# Commands forwarded as soon as they arrive, ahead of queued ones and outside the window
+PRIORITY_COMMANDS = ('PauseMotion', 'ClearMotion', 'BrakesOn', 'ResetError')
+
+_GATEWAY_GREETING = b'[3000][Connected to the control gateway.]\0'
+
+# Answers of the robot to SetEOB and SetEOM, given by the gateway for each client
+_SETTING_ANSWERS = {
+    ('SetEOB', 1): b'[2054][End of block is enabled.]\0',
+    ('SetEOB', 0): b'[2055][End of block is disabled.]\0',
+    ('SetEOM', 1): b'[2052][End of movement is enabled.]\0',
+    ('SetEOM', 0): b'[2053][End of movement is disabled.]\0',
+}
+
+
+def _message_code(msg):
+    """Returns the code of a '[code][text]' message, None when it has none."""
+    end = msg.find(b']')
+    try:
+        return int(msg[1:end]) if msg[:1] == b'[' and end > 1 else None
+    except ValueError:
+        return None
+
+
+class _Client:
+    """Local connection of the gateway, with its unfinished input, queued
+    commands and its own EOB and EOM settings."""
+
+    def __init__(self, sock):
+        self.socket = sock
+        self.buffer = b''
+        self.commands = deque()
+        self.EOB = 1
+        self.EOM = 1
+
+    def muted(self):
+        """Codes of the robot messages this client disabled."""
+        return frozenset(code for code, enabled in ((3012, self.EOB), (3004, self.EOM)) if not enabled)
+
+
+class ControlGateway:
+    """Local gateway owning the single control connection of a robot and
+    multiplexing the commands of many clients connected on a Unix socket.
+
+    Client commands are forwarded in order per client, round-robin between
+    clients, with at most window commands awaiting their answer at the robot.
+    Commands of PRIORITY_COMMANDS skip the queues. Each answer goes to the
+    client whose oldest command in flight expects its code. Error codes are
+    sent to every client, as they put the robot in error for all of them, and
+    other unexpected messages, such as a late end of movement, go to the
+    last client that sent a command.
+
+    SetEOB and SetEOM only apply to the client sending them, set_queue
+    included. The gateway answers them itself and keeps the robot sending
+    both messages, which it does not pass on to the clients that disabled
+    them.
+
+    A RobotController connects to the gateway when its address is the path
+    of the Unix socket.
+
+    Attributes
+    ----------
+    robot : RobotController
+        Controller owning the connection to the robot.
+    path : string
+        Path of the Unix socket clients connect to.
+    window : int
+        Number of commands sent to the robot and still awaiting an answer.
+    answer_timeout : float
+        Time in seconds after which a command still awaiting an answer is
+        no longer counted in the window.
+
+    """
+
+    def __init__(self, robot_address, path, window=8, answer_timeout=30.0):
+        """Constructor for a gateway.
+
+        Parameters
+        ----------
+        robot_address : string
+            IP address of the robot.
+        path : string
+            Path of the Unix socket to create.
+        window : int
+            Number of commands awaiting an answer at the robot.
+        answer_timeout : float
+            Time in seconds a command may wait for its answer.
+
+        """
+        self.robot = RobotController(robot_address)
+        self.path = path
+        self.window = window
+        self.answer_timeout = answer_timeout
+        self._selector = selectors.DefaultSelector()
+        self._listener = None
+        self._clients = {}
+        self._ready = deque()           # clients with queued commands, in round-robin order
+        self._in_flight = deque()       # (client, expected codes, time sent, muted codes) of the commands sent
+        self._last_client = None
+        self._robot_buffer = b''
+        self._closing = False
+        self._thread = None
+
+    def start(self):
+        """Connects to the robot, opens the Unix socket and serves clients in a
+        daemon thread.
+
+        Returns
+        -------
+        thread : threading.Thread
+            Thread running serve_forever.
+
+        """
+        self.open()
+        self._thread = threading.Thread(target=self.serve_forever, name='ControlGateway', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def open(self):
+        """Connects to the robot and opens the Unix socket.
+
+        """
+        if not self.robot.connect():
+            raise ConnectionError(f'Cannot connect to the robot at {self.robot.address}.')
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        self._listener.listen()
+        self._selector.register(self._listener, selectors.EVENT_READ, self._accept)
+        self._selector.register(self.robot.socket, selectors.EVENT_READ, self._read_robot)
+
+    def serve_forever(self):
+        """Routes commands and answers until close is called.
+
+        """
+        while not self._closing:
+            for key, _ in self._selector.select(timeout=0.5):
+                key.data(key.fileobj)
+            self._expire()
+            self._dispatch()
+
+    def close(self):
+        """Stops serving, disconnects the clients and the robot.
+
+        """
+        self._closing = True
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        for client in list(self._clients.values()):
+            self._drop(client)
+        if self._listener is not None:
+            self._selector.unregister(self._listener)
+            self._listener.close()
+            self._listener = None
+            os.unlink(self.path)
+        if self.robot.socket is not None:
+            self._selector.unregister(self.robot.socket)
+            self.robot.disconnect()
+
+    def _accept(self, listener):
+        sock, _ = listener.accept()
+        sock.settimeout(1)          # a client not reading its answers is dropped instead of stalling the others
+        client = _Client(sock)
+        self._clients[sock] = client
+        self._selector.register(sock, selectors.EVENT_READ, self._read_client)
+        self._reply(client, _GATEWAY_GREETING)
+
+    def _drop(self, client):
+        if self._clients.pop(client.socket, None) is None:     # already dropped
+            return
+        self._selector.unregister(client.socket)
+        client.socket.close()
+        if client in self._ready:
+            self._ready.remove(client)
+        if self._last_client is client:
+            self._last_client = None
+
+    def _reply(self, client, msg):
+        try:
+            client.socket.sendall(msg)
+        except OSError:
+            self._drop(client)
+
+    def _read_client(self, sock):
+        client = self._clients.get(sock)
+        if client is None:                          # dropped earlier in the same select round
+            return
+        try:
+            data = sock.recv(4096)
+        except OSError:
+            data = b''
+        if not data:
+            self._drop(client)
+            return
+        commands = (client.buffer + data).split(b'\0')
+        client.buffer = commands.pop()
+        for cmd in commands:
+            if cmd.partition(b'(')[0].decode('ascii', 'replace') in PRIORITY_COMMANDS:
+                self._forward(client, cmd)
+            else:
+                if not client.commands and client not in self._ready:
+                    self._ready.append(client)
+                client.commands.append(cmd)
+
+    def _dispatch(self):
+        """Forwards queued commands round-robin while the window has room."""
+        while self._ready and len(self._in_flight) < self.window:
+            client = self._ready.popleft()
+            self._forward(client, client.commands.popleft())
+            if client.commands:
+                self._ready.append(client)
+
+    def _forward(self, client, cmd):
+        name = cmd.partition(b'(')[0].decode('ascii', 'replace')
+        if name in ('SetEOB', 'SetEOM'):            # per client, the robot keeps sending both
+            enabled = 0 if cmd.partition(b'(')[2].startswith(b'0') else 1
+            setattr(client, name[3:], enabled)
+            self._reply(client, _SETTING_ANSWERS[name, enabled])
+            return
+        expected = self.robot._get_answer_list(name)
+        try:
+            self.robot.socket.sendall(cmd + b'\0')
+        except OSError:
+            self._broadcast(b'[3026][Control gateway lost the robot connection.]\0')
+            self._closing = True
+            return
+        self._last_client = client
+        if expected:
+            self._in_flight.append((client, frozenset(expected), time.monotonic(), client.muted()))
+
+    def _read_robot(self, sock):
+        try:
+            data = sock.recv(4096)
+        except OSError:
+            data = b''
+        if not data:
+            self._broadcast(b'[3026][Control gateway lost the robot connection.]\0')
+            self._closing = True
+            return
+        messages = (self._robot_buffer + data).split(b'\0')
+        self._robot_buffer = messages.pop()
+        for msg in messages:
+            self._route(msg + b'\0')
+
+    def _route(self, msg):
+        code = _message_code(msg)
+        for index, (client, expected, _, muted) in enumerate(self._in_flight):
+            if code in expected:
+                del self._in_flight[index]
+                if client.socket in self._clients and code not in muted:
+                    self._reply(client, msg)
+                return
+        if code in _ERROR_CODES:
+            self._in_flight.clear()                 # the robot answers nothing else until ResetError
+            self._broadcast(msg)
+        elif self._last_client is not None and code not in self._last_client.muted():
+            self._reply(self._last_client, msg)
+
+    def _broadcast(self, msg):
+        for client in list(self._clients.values()):
+            self._reply(client, msg)
+
+    def _expire(self):
+        limit = time.monotonic() - self.answer_timeout
+        while self._in_flight and self._in_flight[0][2] < limit:
+            self._in_flight.popleft()
+
+
+def main():
+    """Runs a control gateway from the command line.
+
+    """
+    parser = argparse.ArgumentParser(
+            description='Share the control connection of a robot between local clients.',
+            epilog='exemple: python ControlGateway.py --robot_ip_address 192.168.0.100 --path /tmp/meca500.sock')
+    parser.add_argument('--robot_ip_address', type=str, required=True, help='IP address of the robot.')
+    parser.add_argument('--path', type=str, required=True, help='Path of the Unix socket to create.')
+    parser.add_argument('--window', type=int, default=8, help='Number of commands awaiting an answer at the robot.')
+    args = parser.parse_args()
+    gateway = ControlGateway(args.robot_ip_address, args.path, args.window)
+    gateway.open()
+    print(f'Serving {args.robot_ip_address} on {args.path}')
+    try:
+        gateway.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gateway.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+import copy
+import re
+
+import numpy as np
+
+from MecademicRobot.FrameTransform import rotation_angles, rotation_matrix
+from MecademicRobot.RobotKinematics import Meca500Kinematics
+
+# Meca500 R3 nominal dynamics, reached at 100% of the percentage settings.
+# The accelerations are not published: MAX_JOINT_ACC is a starting guess, fit
+# the one of a robot with fit_joint_acceleration on recorded feedback and pass
+# it to CycleTimeEstimator, compare_moves shows what is left.
+MAX_JOINT_VEL = np.array([150.0, 150.0, 180.0, 300.0, 300.0, 500.0])   # deg/s
+MAX_JOINT_ACC = MAX_JOINT_VEL * 8.0                                     # deg/s^2
+MAX_CART_LIN_ACC = 2000.0                                               # mm/s^2
+MAX_CART_ANG_ACC = 1000.0                                               # deg/s^2
+
+# Robot values of the settings after activation
+DEFAULT_SETTINGS = {'SetJointVel': (25,),
+                    'SetJointAcc': (100,),
+                    'SetCartLinVel': (150,),
+                    'SetCartAngVel': (45,),
+                    'SetCartAcc': (50,),
+                    'SetBlending': (100,),
+                    'SetAutoConf': (1,)}
+
+_MOTION_COMMANDS = ('MoveJoints', 'MovePose', 'MoveLin')
+_COMMAND_REGEX = re.compile(r'\s*(\w+)\s*(?:\(([^)]*)\))?\s*')
+
+
+def _trapezoid(distance, velocity, acceleration):
+    """Duration and ramp time of trapezoidal velocity profiles.
+
+    Parameters
+    ----------
+    distance, velocity, acceleration : array_like of float
+        Travel, cruise velocity and acceleration, broadcast together.
+
+    Returns
+    -------
+    duration : array of float
+        Time to travel the distance from stop to stop.
+    ramp : array of float
+        Time spent accelerating, equal to the time spent decelerating.
+
+    """
+    distance = np.abs(distance)
+    ramp = velocity / acceleration
+    cruising = distance >= velocity * ramp
+    short_ramp = np.sqrt(distance / acceleration)
+    duration = np.where(cruising, distance / velocity + ramp, 2.0 * short_ramp)
+    return duration, np.where(cruising, ramp, short_ramp)
+
+
+def parse_program(program):
+    """Splits a program into (command, arguments) pairs.
+
+    Parameters
+    ----------
+    program : string or list
+        Program text with one command per line, as in the README, or a list
+        of command strings or (command, arguments) pairs.
+
+    Returns
+    -------
+    commands : list of tuple
+        Command name and tuple of float arguments of each command.
+
+    """
+    if isinstance(program, str):
+        program = [line for line in program.splitlines() if line.strip()]
+    commands = []
+    for entry in program:
+        if isinstance(entry, str):
+            match = _COMMAND_REGEX.fullmatch(entry)
+            if match is None:
+                raise ValueError(f'Cannot parse command "{entry}".')
+            name, args = match.group(1), match.group(2)
+            args = tuple(float(x) for x in args.split(',')) if args and args.strip() else ()
+            commands.append((name, args))
+        else:
+            name, args = entry
+            commands.append((name, tuple(float(x) for x in args)))
+    return commands
+
+
+class CycleTimeEstimator:
+    """Host-side model of the motion time of MoveJoints, MovePose, MoveLin and
+    Delay programs, driven by the velocity, acceleration and blending settings.
+
+    Attributes
+    ----------
+    settings : dict
+        Setting arguments keyed by command name, DEFAULT_SETTINGS completed
+        with the given ones.
+    kinematics : Meca500Kinematics
+        Model used to convert poses to joint angles and back.
+    start_joints : array of float
+        Joint angles in degrees at the start of the program.
+    max_joint_acc : array of float
+        Acceleration of each joint in deg/s^2 at SetJointAcc(100).
+
+    """
+
+    def __init__(self, settings=None, kinematics=None, start_joints=(0, 0, 0, 0, 0, 0), max_joint_acc=None):
+        """Constructor for an estimator.
+
+        Parameters
+        ----------
+        settings : dict
+            Setting arguments keyed by command name, as RobotController.settings.
+        kinematics : Meca500Kinematics
+            Model with the TRF and WRF in use, default frames when None.
+        start_joints : array_like of float
+            Joint angles in degrees at the start of the program.
+        max_joint_acc : array_like of float
+            Acceleration of each joint in deg/s^2 at SetJointAcc(100),
+            MAX_JOINT_ACC when None.
+
+        """
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update(settings or {})
+        self.kinematics = kinematics if kinematics is not None else Meca500Kinematics()
+        self.start_joints = np.array(start_joints, dtype=float)
+        self.max_joint_acc = np.array(MAX_JOINT_ACC if max_joint_acc is None else max_joint_acc, dtype=float)
+
+    @classmethod
+    def from_robot(cls, robot, start_joints=(0, 0, 0, 0, 0, 0), max_joint_acc=None):
+        """Makes an estimator using the settings and frames last sent by a RobotController.
+
+        """
+        kinematics = Meca500Kinematics()
+        kinematics.sync_frames(robot)
+        return cls(robot.settings, kinematics, start_joints, max_joint_acc)
+
+    def joint_move_times(self, deltas, settings=None):
+        """Durations of synchronized joint moves.
+
+        Parameters
+        ----------
+        deltas : array_like of float, shape (..., 6)
+            Joint travel of each move in degrees.
+        settings : dict
+            Settings to use instead of the estimator ones.
+
+        Returns
+        -------
+        duration : array of float, shape (...)
+            Time of each move in seconds, from stop to stop.
+        ramp : array of float, shape (...)
+            Acceleration time of the slowest joint of each move.
+
+        """
+        settings = settings or self.settings
+        velocity = MAX_JOINT_VEL * settings['SetJointVel'][0] / 100.0
+        acceleration = self.max_joint_acc * settings['SetJointAcc'][0] / 100.0
+        duration, ramp = _trapezoid(deltas, velocity, acceleration)
+        slowest = np.argmax(duration, axis=-1)[..., np.newaxis]
+        return (np.take_along_axis(duration, slowest, axis=-1)[..., 0],
+                np.take_along_axis(ramp, slowest, axis=-1)[..., 0])
+
+    def linear_move_times(self, distances, angles, settings=None):
+        """Durations of linear moves of the TRF.
+
+        Parameters
+        ----------
+        distances : array_like of float
+            Travel of the TRF of each move in mm.
+        angles : array_like of float
+            Rotation of the TRF of each move in degrees.
+        settings : dict
+            Settings to use instead of the estimator ones.
+
+        Returns
+        -------
+        duration : array of float
+            Time of each move in seconds, from stop to stop.
+        ramp : array of float
+            Acceleration time of each move.
+
+        """
+        settings = settings or self.settings
+        acc_ratio = settings['SetCartAcc'][0] / 100.0
+        linear, linear_ramp = _trapezoid(distances, settings['SetCartLinVel'][0], MAX_CART_LIN_ACC * acc_ratio)
+        angular, angular_ramp = _trapezoid(angles, settings['SetCartAngVel'][0], MAX_CART_ANG_ACC * acc_ratio)
+        return np.maximum(linear, angular), np.where(linear >= angular, linear_ramp, angular_ramp)
+
+    def pose_joints(self, pose, joints, settings=None, kinematics=None):
+        """Joint angles a MovePose to a pose ends at, as the robot picks them.
+
+        With automatic configuration, the robot takes the configuration closest
+        to its current joints, here the valid solution reached the soonest.
+        Otherwise it keeps the configuration of the last SetConf.
+
+        Parameters
+        ----------
+        pose : array_like of float, shape (6,)
+            Target pose of the TRF with respect to the WRF.
+        joints : array_like of float, shape (6,)
+            Joint angles in degrees at the start of the move.
+        settings : dict
+            Settings to use instead of the estimator ones.
+        kinematics : Meca500Kinematics
+            Model to use instead of the estimator one.
+
+        Returns
+        -------
+        joints : array of float, shape (6,)
+            Joint angles in degrees, NaN when the pose is not reachable.
+        valid : boolean
+            True when the pose is reachable.
+
+        """
+        settings = settings or self.settings
+        kinematics = kinematics or self.kinematics
+        if settings.get('SetAutoConf', (1,))[0] == 0 and 'SetConf' in settings:
+            return kinematics.inverse(pose, settings['SetConf'])
+        solutions, valid = kinematics.inverse_all(pose)
+        if not valid.any():
+            return np.full(6, np.nan), False
+        duration, _ = self.joint_move_times(solutions - joints, settings)
+        best = np.argmin(np.where(valid, duration, np.inf))
+        return solutions[best], True
+
+    def estimate(self, program):
+        """Estimates the duration of a program.
+
+        Set commands of the program update the settings used for the moves
+        after them, SetConf and SetAutoConf included for the configuration of
+        MovePose, SetTRF and SetWRF for the frames of the MovePose and MoveLin
+        targets. Commands other than moves, Delay and settings take no time.
+
+        Parameters
+        ----------
+        program : string or list
+            Program accepted by parse_program.
+
+        Returns
+        -------
+        total : float
+            Duration of the program in seconds, blending overlaps removed.
+        durations : array of float
+            Duration of each command from stop to stop, in seconds.
+
+        """
+        settings = dict(self.settings)
+        kinematics = copy.copy(self.kinematics)     # the frame setters of the program only apply to it
+        joints = self.start_joints
+        commands = parse_program(program)
+        durations = np.zeros(len(commands))
+        total = 0.0
+        previous_ramp = None        # deceleration time of the previous move, None after a stop
+        for index, (name, args) in enumerate(commands):
+            if name == 'SetTRF' or name == 'SetWRF':
+                (kinematics.set_trf if name == 'SetTRF' else kinematics.set_wrf)(*args)
+                settings[name] = args
+                continue
+            if name in settings or name == 'SetConf':
+                settings[name] = args
+                if name == 'SetConf':
+                    settings['SetAutoConf'] = (0,)  # setting a configuration disables the automatic one
+                continue
+            if name == 'Delay':
+                durations[index] = args[0]
+                total += args[0]
+                previous_ramp = None
+                continue
+            if name not in _MOTION_COMMANDS:
+                continue
+            if name == 'MoveLin':
+                start = kinematics.forward(joints)
+                target = np.array(args)
+                rotations = rotation_matrix(*np.stack((start[3:], target[3:]), axis=1))
+                duration, ramp = self.linear_move_times(np.linalg.norm(target[:3] - start[:3]),
+                                                        rotation_angles(rotations[0], rotations[1]), settings)
+                target_joints, valid = kinematics.inverse(target, kinematics.configuration(joints))
+            else:
+                if name == 'MovePose':
+                    target_joints, valid = self.pose_joints(args, joints, settings, kinematics)
+                else:
+                    target_joints, valid = np.array(args), True
+                duration, ramp = self.joint_move_times(target_joints - joints, settings)
+            if not valid:
+                raise ValueError(f'Command {index} {name}{args} is not reachable.')
+            durations[index] = duration
+            total += duration
+            if previous_ramp is not None:
+                total -= settings['SetBlending'][0] / 100.0 * min(previous_ramp, ramp)
+            previous_ramp = ramp
+            joints = target_joints
+        return float(total), durations
+
+    def estimate_joint_orderings(self, paths):
+        """Estimates the duration of many MoveJoints sequences at once, to score
+        candidate orderings of the same waypoints.
+
+        Parameters
+        ----------
+        paths : array_like of float, shape (K, N, 6)
+            K candidate sequences of N joint waypoints, each starting from
+            start_joints.
+
+        Returns
+        -------
+        totals : array of float, shape (K,)
+            Duration of each sequence in seconds, blending overlaps removed.
+
+        """
+        paths = np.asarray(paths, dtype=float)
+        start = np.broadcast_to(self.start_joints, paths.shape[:-2] + (1, 6))
+        deltas = np.diff(np.concatenate((start, paths), axis=-2), axis=-2)
+        duration, ramp = self.joint_move_times(deltas)
+        overlap = self.settings['SetBlending'][0] / 100.0 * np.minimum(ramp[..., :-1], ramp[..., 1:])
+        return duration.sum(axis=-1) - overlap.sum(axis=-1)
+
+
+def measure_moves(timestamps, joints, still_speed=0.5):
+    """Finds the moves in recorded joint feedback, to check estimates against.
+
+    Parameters
+    ----------
+    timestamps : array_like of float, shape (N,)
+        Time of each feedback sample in seconds.
+    joints : array_like of float, shape (N, 6)
+        Joint angles of each feedback sample in degrees.
+    still_speed : float
+        Joint speed in deg/s under which the robot is considered stopped.
+
+    Returns
+    -------
+    moves : array of float, shape (M, 2)
+        Start and end time of each move in seconds.
+
+    """
+    timestamps = np.asarray(timestamps, dtype=float)
+    speed = np.abs(np.diff(np.asarray(joints, dtype=float), axis=0)).max(axis=1) / np.diff(timestamps)
+    moving = np.concatenate(([False], speed > still_speed, [False]))
+    edges = np.flatnonzero(np.diff(moving.astype(np.int8)))
+    return np.stack((timestamps[edges[0::2]], timestamps[edges[1::2]]), axis=1)
+
+
+def compare_moves(estimator, program, timestamps, joints, still_speed=0.5):
+    """Compares the estimated duration of each move of a program with the
+    moves found by measure_moves in the joint feedback recorded while the
+    robot ran it.
+
+    The robot has to stop between moves, with SetBlending(0) or Delay
+    commands, and every move has to move a joint, so that the feedback
+    shows one move per MoveJoints, MovePose and MoveLin.
+
+    Parameters
+    ----------
+    estimator : CycleTimeEstimator
+        Estimator with the settings, frames and start joints of the run.
+    program : string or list
+        Program accepted by parse_program.
+    timestamps : array_like of float, shape (N,)
+        Time of each feedback sample in seconds.
+    joints : array_like of float, shape (N, 6)
+        Joint angles of each feedback sample in degrees.
+    still_speed : float
+        Joint speed in deg/s under which the robot is considered stopped.
+
+    Returns
+    -------
+    comparison : dict
+        'commands' index of each move in the program, 'estimated' and
+        'measured' durations in seconds and their 'error', estimated minus
+        measured.
+
+    """
+    commands = parse_program(program)
+    _, durations = estimator.estimate(commands)
+    indices = np.array([index for index, (name, _) in enumerate(commands) if name in _MOTION_COMMANDS], dtype=int)
+    moves = measure_moves(timestamps, joints, still_speed)
+    if len(moves) != len(indices):
+        raise ValueError(f'Found {len(moves)} moves in the feedback for {len(indices)} in the program, '
+                         f'the robot has to stop between moves.')
+    measured = moves[:, 1] - moves[:, 0]
+    estimated = durations[indices]
+    return {'commands': indices, 'estimated': estimated, 'measured': measured, 'error': estimated - measured}
+
+
+def fit_joint_acceleration(estimator, program, timestamps, joints, still_speed=0.5,
+                           factors=np.geomspace(1.0, 50.0, 400)):
+    """Finds the joint accelerations that best match recorded moves, as a
+    multiple of MAX_JOINT_VEL like MAX_JOINT_ACC.
+
+    Parameters
+    ----------
+    estimator : CycleTimeEstimator
+        Estimator with the settings, frames and start joints of the run.
+    program : string or list
+        Program accepted by parse_program, run as compare_moves requires.
+    timestamps : array_like of float, shape (N,)
+        Time of each feedback sample in seconds.
+    joints : array_like of float, shape (N, 6)
+        Joint angles of each feedback sample in degrees.
+    still_speed : float
+        Joint speed in deg/s under which the robot is considered stopped.
+    factors : array_like of float
+        Multiples of MAX_JOINT_VEL tried.
+
+    Returns
+    -------
+    max_joint_acc : array of float, shape (6,)
+        Acceleration of each joint in deg/s^2 at SetJointAcc(100), to pass
+        to CycleTimeEstimator.
+    comparison : dict
+        Result of compare_moves with these accelerations.
+
+    """
+    commands = parse_program(program)
+    best = None
+    for factor in factors:
+        candidate = copy.copy(estimator)
+        candidate.max_joint_acc = MAX_JOINT_VEL * factor
+        comparison = compare_moves(candidate, commands, timestamps, joints, still_speed)
+        cost = float(np.sum(comparison['error'] ** 2))
+        if best is None or cost < best[0]:
+            best = (cost, candidate.max_joint_acc, comparison)
+    return best[1], best[2]
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+import bisect
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from MecademicRobot.RobotController import _ERROR_CODES
+
+# Exchange round trip buckets in seconds
+RTT_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 20.0)
+
+_CODE_REGEX = re.compile(r'\[(\d{4})\]')
+
+
+class _Shards:
+    """Value cells of one labelled metric, one per updating thread.
+
+    A thread only ever writes its own cell, so updates need no lock; the
+    collector sums the cells and may miss an update in progress.
+
+    """
+
+    __slots__ = ('_cells', '_size')
+
+    def __init__(self, size):
+        self._cells = {}
+        self._size = size
+
+    def cell(self):
+        ident = threading.get_ident()
+        cell = self._cells.get(ident)
+        if cell is None:
+            cell = self._cells[ident] = [0.0] * self._size     # single dict store, atomic
+        return cell
+
+    def totals(self):
+        totals = [0.0] * self._size
+        for cell in list(self._cells.values()):
+            for index, value in enumerate(cell):
+                totals[index] += value
+        return totals
+
+
+class _CounterChild:
+    __slots__ = ('_shards',)
+
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        self._shards.cell()[0] += amount
+
+    @property
+    def value(self):
+        return self._shards.totals()[0]
+
+
+class _HistogramChild:
+    __slots__ = ('_shards', '_buckets')
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._shards = _Shards(len(buckets) + 2)      # bucket counts, +Inf count, sum
+
+    def observe(self, value):
+        cell = self._shards.cell()
+        cell[bisect.bisect_left(self._buckets, value)] += 1
+        cell[-1] += value
+
+
+class _Metric:
+    """Metric family with its labelled children."""
+
+    def __init__(self, name, kind, documentation, labelnames, child_factory):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._child_factory = child_factory
+        self._children = {}
+        self._lock = threading.Lock()       # only taken to create a child, hot paths hold bound children
+
+    def set_function(self, values, function):
+        """Sets the callable returning the value of a gauge child at collection."""
+        self._children[values] = function
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._child_factory())
+        return child
+
+    def _label_text(self, values, extra=''):
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in list(self._children.items()):
+            if self.kind == 'counter':
+                lines.append(f'{self.name}{self._label_text(values)} {child.value:g}')
+            elif self.kind == 'gauge':
+                lines.append(f'{self.name}{self._label_text(values)} {child():g}')
+            else:
+                totals = child._shards.totals()
+                cumulative = 0.0
+                for bound, count in zip(child._buckets + (float('inf'),), totals):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float('inf') else f'le="{bound:g}"'
+                    lines.append(f'{self.name}_bucket{self._label_text(values, le)} {cumulative:g}')
+                lines.append(f'{self.name}_count{self._label_text(values)} {cumulative:g}')
+                lines.append(f'{self.name}_sum{self._label_text(values)} {totals[-1]:g}')
+        return lines
+
+
+class _ControllerMetrics:
+    """Metrics of a RobotController, bound to its address label."""
+
+    def __init__(self, registry, robot):
+        address = robot.address
+        self.commands = registry.commands.labels(address)
+        self.rtt = registry.rtt.labels(address)
+        self._connects = registry.connects.labels(address)
+        self._reconnects = registry.reconnects.labels(address)
+        self._errors = registry.errors
+        self._address = address
+        self._connected_once = False
+        registry.in_flight.set_function((address,), lambda: len(robot._pending) + robot._submissions.qsize())
+        registry.write_buffer.set_function((address,), lambda: len(robot._out_buffer))
+
+    def connected(self):
+        self._connects.inc()
+        if self._connected_once:
+            self._reconnects.inc()
+        self._connected_once = True
+
+    def count_errors(self, response):
+        for code in _CODE_REGEX.findall(response):
+            if int(code) in _ERROR_CODES:
+                self._errors.labels(self._address, code).inc()
+
+
+class _FeedbackMetrics:
+    """Metrics of a RobotFeedback, bound to its address label."""
+
+    def __init__(self, registry, feedback):
+        self.fields = {field: registry.feedback_messages.labels(feedback.address, field)
+                       for field in set(feedback._field_codes.values())}
+        self.reads = registry.feedback_reads.labels(feedback.address)
+
+
+class MetricsRegistry:
+    """In-process metrics of the controllers and feedbacks attached to it,
+    labelled per robot address and rendered in the Prometheus text format.
+
+    Hot paths update per-thread cells of pre-labelled children, without locks.
+
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._server = None
+        self.commands = self._add('mecademic_commands_total', 'counter', 'Commands written to the robot.',
+                                  ('robot',), _CounterChild)
+        self.rtt = self._add('mecademic_exchange_rtt_seconds', 'histogram',
+                             'Time from sending a command to its answer.',
+                             ('robot',), lambda: _HistogramChild(RTT_BUCKETS))
+        self.errors = self._add('mecademic_errors_total', 'counter', 'Error codes received from the robot.',
+                                ('robot', 'code'), _CounterChild)
+        self.connects = self._add('mecademic_connects_total', 'counter', 'Successful control connections.',
+                                  ('robot',), _CounterChild)
+        self.reconnects = self._add('mecademic_reconnects_total', 'counter',
+                                    'Control connections after the first one.', ('robot',), _CounterChild)
+        self.in_flight = self._add('mecademic_in_flight_commands', 'gauge',
+                                   'Commands queued or awaiting their answer in threaded mode.', ('robot',), None)
+        self.write_buffer = self._add('mecademic_write_buffer_bytes', 'gauge',
+                                      'Bytes waiting in the write buffer.', ('robot',), None)
+        self.feedback_messages = self._add('mecademic_feedback_messages_total', 'counter',
+                                           'Feedback messages kept, per field.', ('robot', 'field'), _CounterChild)
+        self.feedback_reads = self._add('mecademic_feedback_reads_total', 'counter',
+                                        'Reads of the feedback socket.', ('robot',), _CounterChild)
+
+    def _add(self, name, kind, documentation, labelnames, child_factory):
+        metric = _Metric(name, kind, documentation, labelnames, child_factory)
+        self._metrics.append(metric)
+        return metric
+
+    def attach_controller(self, robot):
+        """Feeds the metrics of a RobotController to the registry.
+
+        Parameters
+        ----------
+        robot : RobotController
+            Controller to instrument, labelled with its address.
+
+        """
+        robot._metrics = _ControllerMetrics(self, robot)
+
+    def attach_feedback(self, feedback):
+        """Feeds the metrics of a RobotFeedback to the registry.
+
+        Parameters
+        ----------
+        feedback : RobotFeedback
+            Feedback to instrument, labelled with its address.
+
+        """
+        feedback._metrics = _FeedbackMetrics(self, feedback)
+
+    def render(self):
+        """Renders every metric in the Prometheus text exposition format.
+
+        Returns
+        -------
+        text : string
+            Exposition text.
+
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port=9105, host='127.0.0.1'):
+        """Serves render() on http://host:port/metrics from a daemon thread.
+
+        Parameters
+        ----------
+        port : int
+            TCP port, 0 to let the system choose.
+        host : string
+            Address to listen on, localhost only by default.
+
+        Returns
+        -------
+        port : int
+            Port listened on.
+
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='MetricsRegistry', daemon=True).start()
+        return self._server.server_address[1]
+
+    def shutdown(self):
+        """Stops serving.
+
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+import os
+import struct
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from MecademicRobot.SharedFeedback import _FIELD_SLICES, SAMPLE_SIZE
+
+# Fixed point steps: microseconds for the time column, then the resolution the robot streams each field at
+DEFAULT_SCALES = {'time': 1e6, 'joints': 1e3, 'cartesian': 1e3, 'joints_vel': 1e3, 'torque': 1e3,
+                  'accelerometer': 1.0}
+
+_MAGIC = b'MECAREC\x01'
+_FOOTER_MAGIC = b'MECAIDX\x01'
+_BLOCK_HEADER = struct.Struct('<IIdd')          # payload length, sample count, first and last time
+_FOOTER = struct.Struct('<QQ8s')                # index offset, block count, magic
+_INDEX_DTYPE = np.dtype([('first', '<f8'), ('last', '<f8'), ('offset', '<u8'), ('count', '<u4')])
+
+# Residual types by code, code 0 marks a column without any value in the block
+_RESIDUAL_TYPES = (None, np.int8, np.int16, np.int32, np.int64)
+
+
+def _scales(scales):
+    """Returns the quantization step of each column of a sample."""
+    scales = dict(DEFAULT_SCALES, **(scales or {}))
+    column_scales = np.empty(SAMPLE_SIZE)
+    column_scales[0] = scales['time']
+    for field, columns in _FIELD_SLICES.items():
+        column_scales[columns] = scales[field]
+    return column_scales
+
+
+def _differences(values, order):
+    """Differences of a given order, keeping the first values so that order
+    cumulative sums restore the column."""
+    for _ in range(order):
+        values = np.concatenate((values[:1], np.diff(values)))
+    return values
+
+
+def _encode_block(samples, column_scales):
+    """Quantizes and packs a block of samples, see _decode_block."""
+    quantized = samples * column_scales
+    meta = bytearray()
+    seeds = []
+    data = []
+    for column in quantized.T:
+        missing = np.isnan(column)
+        if missing.all():
+            meta += bytes((0, 0, 0))
+            seeds += [0, 0]
+            continue
+        if missing.any():                           # carry the last value so that deltas stay small
+            index = np.where(missing, 0, np.arange(len(column)))
+            np.maximum.accumulate(index, out=index)
+            column = column[index]
+            column[np.isnan(column)] = column[~np.isnan(column)][0]
+        integers = np.rint(column).astype(np.int64)
+        # Delta of delta suits smooth signals such as poses and time, noisy ones compress better as deltas
+        candidates = [_differences(integers, order) for order in (1, 2)]
+        order = 1 + int(np.abs(candidates[1][2:]).sum() < np.abs(candidates[0][1:]).sum())
+        encoded = candidates[order - 1]
+        residuals = encoded[order:]
+        largest = int(np.abs(residuals).max()) if len(residuals) else 0
+        code = next(code for code in range(1, 5) if largest < 2 ** (8 * 2 ** (code - 1) - 1))
+        meta += bytes((order, code, int(missing.any())))
+        seeds += list(encoded[:order]) + [0] * (2 - len(encoded[:order]))
+        if missing.any():
+            data.append(np.packbits(missing).tobytes())
+        data.append(residuals.astype(_RESIDUAL_TYPES[code]).tobytes())
+    payload = bytes(meta) + np.array(seeds, dtype='<i8').tobytes() + b''.join(data)
+    return zlib.compress(payload, 6)
+
+
+def _decode_block(block, count, column_scales):
+    """Unpacks a block of count samples into an array of shape (count, SAMPLE_SIZE)."""
+    payload = zlib.decompress(block)
+    meta = payload[:3 * SAMPLE_SIZE]
+    seeds = np.frombuffer(payload, dtype='<i8', count=2 * SAMPLE_SIZE, offset=3 * SAMPLE_SIZE)
+    position = 3 * SAMPLE_SIZE + 16 * SAMPLE_SIZE
+    samples = np.full((count, SAMPLE_SIZE), np.nan)
+    for column in range(SAMPLE_SIZE):
+        order, code, has_missing = meta[3 * column:3 * column + 3]
+        if code == 0:
+            continue
+        if has_missing:
+            mask_size = (count + 7) // 8
+            missing = np.unpackbits(np.frombuffer(payload, np.uint8, mask_size, position), count=count).astype(bool)
+            position += mask_size
+        residual_type = np.dtype(_RESIDUAL_TYPES[code])
+        residual_count = max(count - order, 0)
+        residuals = np.frombuffer(payload, residual_type, residual_count, position)
+        position += residual_count * residual_type.itemsize
+        values = np.concatenate((seeds[2 * column:2 * column + order][:count], residuals.astype(np.int64)))
+        for _ in range(order):
+            values = np.cumsum(values)
+        samples[:, column] = values / column_scales[column]
+        if has_missing:
+            samples[missing, column] = np.nan
+    return samples
+
+
+class FeedbackRecorder:
+    """Writes feedback samples to a compact recording file.
+
+    Samples have the layout of SharedFeedback: time then 6 values per
+    feedback field, NaN when not received. They are quantized to the fixed
+    point steps of DEFAULT_SCALES, delta or delta of delta encoded per
+    column, and compressed by blocks indexed by time, so that
+    FeedbackRecording decodes only the blocks it needs.
+
+    Attributes
+    ----------
+    path : string
+        Path of the recording.
+    block_size : int
+        Number of samples per block.
+    count : int
+        Number of samples recorded.
+
+    """
+
+    def __init__(self, path, block_size=4096, scales=None):
+        """Constructor for a recorder, creating the file.
+
+        Parameters
+        ----------
+        path : string
+            Path of the recording to create.
+        block_size : int
+            Number of samples per block, larger compresses better and decodes slower.
+        scales : dict
+            Quantization steps per field overriding DEFAULT_SCALES, such as
+            {'torque': 100.0} to keep 2 decimals.
+
+        """
+        self.path = path
+        self.block_size = block_size
+        self.count = 0
+        self._column_scales = _scales(scales)
+        self._pending = []
+        self._index = []
+        self._file = open(path, 'wb')
+        self._file.write(_MAGIC + struct.pack('<I', SAMPLE_SIZE) + self._column_scales.astype('<f8').tobytes())
+
+    def record(self, feedback):
+        """Adds the current fields of a RobotFeedback, stamped with time.time().
+        Meant to be registered with RobotFeedback.add_listener.
+
+        Parameters
+        ----------
+        feedback : RobotFeedback
+            Feedback whose subscribed fields are recorded.
+
+        """
+        sample = [np.nan] * SAMPLE_SIZE
+        sample[0] = time.time()
+        for field in feedback.subscribed:
+            values = getattr(feedback, field)
+            if len(values) == 6:
+                sample[_FIELD_SLICES[field]] = values
+        self._pending.append(sample)
+        if len(self._pending) >= self.block_size:
+            self._write_block()
+
+    def add_samples(self, samples):
+        """Adds samples, such as returned by FeedbackReader.history.
+
+        Parameters
+        ----------
+        samples : array of float, shape (M, SAMPLE_SIZE)
+            Samples in time order.
+
+        """
+        self._pending.extend(np.asarray(samples, dtype=float).tolist())
+        while len(self._pending) >= self.block_size:
+            self._write_block()
+
+    def _write_block(self):
+        samples = np.array(self._pending[:self.block_size], dtype=float)
+        del self._pending[:self.block_size]
+        block = _encode_block(samples, self._column_scales)
+        offset = self._file.tell()
+        self._file.write(_BLOCK_HEADER.pack(len(block), len(samples), samples[0, 0], samples[-1, 0]))
+        self._file.write(block)
+        self._index.append((samples[0, 0], samples[-1, 0], offset, len(samples)))
+        self.count += len(samples)
+
+    def close(self):
+        """Writes the pending samples and the block index, then closes the file.
+
+        """
+        if self._file is None:
+            return
+        if self._pending:
+            self._write_block()
+        index_offset = self._file.tell()
+        self._file.write(np.array(self._index, dtype=_INDEX_DTYPE).tobytes())
+        self._file.write(_FOOTER.pack(index_offset, len(self._index), _FOOTER_MAGIC))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FeedbackRecording:
+    """Reads a recording written by FeedbackRecorder, decoding blocks on demand.
+
+    A recording whose recorder was not closed, after a crash, is read by
+    scanning its blocks instead of its index.
+
+    Attributes
+    ----------
+    path : string
+        Path of the recording.
+    index : array
+        'first' and 'last' time, file 'offset' and sample 'count' of each block.
+
+    """
+
+    def __init__(self, path, cache_blocks=8):
+        """Constructor for a reader, loading the block index.
+
+        Parameters
+        ----------
+        path : string
+            Path of the recording.
+        cache_blocks : int
+            Number of decoded blocks kept in memory.
+
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        header = self._file.read(len(_MAGIC) + 4)
+        if header[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f'{path} is not a feedback recording.')
+        columns, = struct.unpack('<I', header[len(_MAGIC):])
+        if columns != SAMPLE_SIZE:
+            raise ValueError(f'{path} holds samples of {columns} columns, expected {SAMPLE_SIZE}.')
+        self._column_scales = np.frombuffer(self._file.read(8 * columns), dtype='<f8')
+        self._data_start = self._file.tell()
+        self.index = self._read_index()
+        self._cache = OrderedDict()
+        self._cache_blocks = cache_blocks
+
+    def _read_index(self):
+        size = os.fstat(self._file.fileno()).st_size
+        if size >= self._data_start + _FOOTER.size:
+            self._file.seek(size - _FOOTER.size)
+            index_offset, blocks, magic = _FOOTER.unpack(self._file.read(_FOOTER.size))
+            if magic == _FOOTER_MAGIC:
+                self._file.seek(index_offset)
+                return np.frombuffer(self._file.read(blocks * _INDEX_DTYPE.itemsize), dtype=_INDEX_DTYPE)
+        entries = []                                # not closed, scan the complete blocks
+        offset = self._data_start
+        while offset + _BLOCK_HEADER.size <= size:
+            self._file.seek(offset)
+            length, count, first, last = _BLOCK_HEADER.unpack(self._file.read(_BLOCK_HEADER.size))
+            if offset + _BLOCK_HEADER.size + length > size:
+                break
+            entries.append((first, last, offset, count))
+            offset += _BLOCK_HEADER.size + length
+        return np.array(entries, dtype=_INDEX_DTYPE)
+
+    def __len__(self):
+        return int(self.index['count'].sum())
+
+    @property
+    def time_range(self):
+        """Times of the first and last samples, None when empty."""
+        if not len(self.index):
+            return None
+        return float(self.index['first'][0]), float(self.index['last'][-1])
+
+    def block(self, number):
+        """Decodes a block.
+
+        Parameters
+        ----------
+        number : int
+            Block number in the index.
+
+        Returns
+        -------
+        samples : array of float, shape (count, SAMPLE_SIZE)
+            Samples of the block, shared with the cache, not to be modified.
+
+        """
+        samples = self._cache.get(number)
+        if samples is not None:
+            self._cache.move_to_end(number)
+            return samples
+        entry = self.index[number]
+        self._file.seek(int(entry['offset']))
+        length, count, _, _ = _BLOCK_HEADER.unpack(self._file.read(_BLOCK_HEADER.size))
+        samples = _decode_block(self._file.read(length), count, self._column_scales)
+        samples.flags.writeable = False
+        self._cache[number] = samples
+        if len(self._cache) > self._cache_blocks:
+            self._cache.popitem(last=False)
+        return samples
+
+    def read(self, start=None, end=None):
+        """Returns the samples recorded between two times.
+
+        Parameters
+        ----------
+        start : float
+            First time included, from the beginning when None.
+        end : float
+            Last time included, up to the end when None.
+
+        Returns
+        -------
+        samples : array of float, shape (M, SAMPLE_SIZE)
+            Samples with time in column 0 and the fields in the order of
+            FEEDBACK_FIELDS, 6 columns each.
+
+        """
+        start = -np.inf if start is None else start
+        end = np.inf if end is None else end
+        first = int(np.searchsorted(self.index['last'], start, side='left'))
+        last = int(np.searchsorted(self.index['first'], end, side='right'))
+        if first >= last:
+            return np.empty((0, SAMPLE_SIZE))
+        samples = np.concatenate([self.block(number) for number in range(first, last)])
+        return samples[(samples[:, 0] >= start) & (samples[:, 0] <= end)]
+
+    def field(self, field, start=None, end=None):
+        """Returns the times and values of a field between two times.
+
+        Parameters
+        ----------
+        field : string
+            One of FEEDBACK_FIELDS.
+        start : float
+            First time included, from the beginning when None.
+        end : float
+            Last time included, up to the end when None.
+
+        Returns
+        -------
+        times : array of float, shape (M,)
+            Times of the samples.
+        values : array of float, shape (M, 6)
+            Values of the field.
+
+        """
+        samples = self.read(start, end)
+        return samples[:, 0], samples[:, _FIELD_SLICES[field]]
+
+    def close(self):
+        """Closes the file."""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
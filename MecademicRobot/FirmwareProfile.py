@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+import functools
+import json
+import os
+import re
+import threading
+
+# Capability profiles of the robots met, keyed by address
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'MecademicRobot', 'firmware.json')
+
+_VERSION_REGEX = re.compile(r'(\d+)\.(\d+)\.(\d+)')
+
+# Response codes on port 10001 of each streamed parameter, up to firmware 7 then from firmware 8
+_RESPONSE_CODES_V7 = {
+    'RobotStatus': ('[2007]',),
+    'GripperStatus': ('[2079]',),
+    'JointsPose': ('[2102]',),
+    'CartesianPose': ('[2103]',),
+    'JointsVel': ('[2212]',),
+    'TorqueRatio': ('[2213]',),
+    'AccelerometerData': ('[2220]',),
+}
+_RESPONSE_CODES_V8 = dict(_RESPONSE_CODES_V7, JointsPose=('[2026]', '[2210]'), CartesianPose=('[2027]', '[2211]'))
+
+# Field of each streamed parameter, in the order of RobotFeedback.FEEDBACK_FIELDS
+_FIELD_PARAMS = (('joints', 'JointsPose'), ('cartesian', 'CartesianPose'), ('joints_vel', 'JointsVel'),
+                 ('torque', 'TorqueRatio'), ('accelerometer', 'AccelerometerData'))
+
+_cache = None                   # contents of CACHE_PATH, read once per process
+_cache_lock = threading.Lock()
+
+
+def parse_version(text):
+    """Finds a firmware version in a message or version string.
+
+    Parameters
+    ----------
+    text : string
+        Text holding a version such as '8.3.2', like '[3000][Connected to Meca500 R3 v8.3.2.]'.
+
+    Returns
+    -------
+    version : string
+        The 'major.minor.patch' version, None when the text holds none.
+
+    """
+    match = _VERSION_REGEX.search(text)
+    return match.group(0) if match else None
+
+
+class FirmwareProfile:
+    """Capabilities of a firmware version and the tables RobotFeedback
+    dispatches on, built once per version.
+
+    Attributes
+    ----------
+    version : string
+        Firmware version, 'major.minor.patch'.
+    version_info : tuple of int
+        Major, minor and patch numbers.
+    fields : tuple of string
+        Feedback fields streamed on port 10001.
+    response_codes : dict
+        Response codes of each streamed parameter, such as 'JointsPose'.
+    field_codes : dict
+        Field of each feedback response code, as bytes such as b'[2210]'.
+    status_on_connect : boolean
+        Whether the robot sends RobotStatus and GripperStatus on port 10001
+        upon connecting instead of streaming right away.
+
+    """
+
+    def __init__(self, version):
+        """Constructor for the profile of a firmware version, use for_version.
+
+        Parameters
+        ----------
+        version : string
+            Firmware version, 'major.minor.patch'.
+
+        """
+        self.version = version
+        self.version_info = tuple(int(number) for number in version.split('.'))
+        legacy = self.version_info[0] <= 7
+        self.response_codes = _RESPONSE_CODES_V7 if legacy else _RESPONSE_CODES_V8
+        self.fields = tuple(field for field, _ in _FIELD_PARAMS[:2 if legacy else None])
+        self.field_codes = {code.encode('ascii'): field
+                            for field, param in _FIELD_PARAMS if field in self.fields
+                            for code in self.response_codes[param]}
+        self.status_on_connect = not legacy
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def for_version(cls, firmware_version):
+        """Returns the shared profile of a firmware version.
+
+        Parameters
+        ----------
+        firmware_version : string
+            Text holding the version, such as '8.3.2' or 'v7.0.6'.
+
+        Returns
+        -------
+        profile : FirmwareProfile
+            Profile of the version.
+
+        """
+        version = parse_version(firmware_version)
+        if version is None:
+            raise ValueError(f'No firmware version found in {firmware_version!r}.')
+        return cls(version)
+
+    def to_dict(self):
+        """Returns the capabilities stored in the cache."""
+        return {'version': self.version, 'fields': list(self.fields), 'status_on_connect': self.status_on_connect}
+
+
+def _load_cache(cache_path):
+    try:
+        with open(cache_path) as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):       # missing or corrupt, rebuilt on the next detection
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def cached_profile(address, cache_path=CACHE_PATH):
+    """Returns the profile cached for a robot address.
+
+    Parameters
+    ----------
+    address : string
+        IP address of the robot.
+    cache_path : string
+        Path of the cache file.
+
+    Returns
+    -------
+    profile : FirmwareProfile
+        Profile of the firmware last seen at this address, None when unknown.
+
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None or cache_path != CACHE_PATH:
+            cache = _load_cache(cache_path)
+            if cache_path == CACHE_PATH:
+                _cache = cache
+        else:
+            cache = _cache
+        entry = cache.get(address)
+    if not isinstance(entry, dict) or 'version' not in entry:
+        return None
+    return FirmwareProfile.for_version(entry['version'])
+
+
+def remember_version(address, firmware_version, cache_path=CACHE_PATH):
+    """Stores the profile of the firmware of a robot in the cache, the file
+    is only written when the version changed.
+
+    Parameters
+    ----------
+    address : string
+        IP address of the robot.
+    firmware_version : string
+        Text holding the version of the robot.
+    cache_path : string
+        Path of the cache file.
+
+    Returns
+    -------
+    profile : FirmwareProfile
+        Profile of the version.
+
+    """
+    global _cache
+    profile = FirmwareProfile.for_version(firmware_version)
+    with _cache_lock:
+        cache = _cache if _cache is not None and cache_path == CACHE_PATH else _load_cache(cache_path)
+        if cache.get(address, {}).get('version') == profile.version:
+            return profile
+        cache = dict(cache)
+        cache[address] = profile.to_dict()
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+            with open(temporary_path, 'w') as cache_file:
+                json.dump(cache, cache_file, indent=2, sort_keys=True)
+            os.replace(temporary_path, cache_path)      # readers never see a partial file
+        except OSError:
+            pass                                        # read-only home, detect again next time
+        if cache_path == CACHE_PATH:
+            _cache = cache
+    return profile
+
+
+def detect_profile(address, refresh=False, cache_path=CACHE_PATH):
+    """Returns the profile of the firmware of a robot, from the cache or else
+    detected over the control port.
+
+    Detection needs the control port to be free: a RobotController already
+    connected to the robot stores the version in the cache itself.
+
+    Parameters
+    ----------
+    address : string
+        IP address of the robot.
+    refresh : boolean
+        Whether to ignore the cache and ask the robot.
+    cache_path : string
+        Path of the cache file.
+
+    Returns
+    -------
+    profile : FirmwareProfile
+        Profile of the firmware of the robot.
+
+    """
+    if not refresh:
+        profile = cached_profile(address, cache_path)
+        if profile is not None:
+            return profile
+    from MecademicRobot.RobotController import RobotController     # imported here, RobotController imports this module
+    robot = RobotController(address, cache_path)
+    if not robot.connect():
+        raise ConnectionError(f'Cannot detect the firmware of the robot at {address}, '
+                              f'pass its firmware version instead.')
+    try:
+        version = robot.firmware_version or robot.GetFwVersion()
+    finally:
+        robot.disconnect()
+    if not version:
+        raise ConnectionError(f'The robot at {address} did not report its firmware version.')
+    return remember_version(address, version, cache_path)
@@ -1,23 +1,58 @@
 #!/usr/bin/env python3
 import sys
 import argparse
+import hashlib
+import mmap
 import requests
+import threading
 import time
 import json
-from MecademicRobot import RobotController as RC
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from MecademicRobot.RobotController import RobotController
+
+
+_UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+UpdateProgress = namedtuple('UpdateProgress', ['ip_address', 'phase', 'percent', 'message'])
+UpdateProgress.__doc__ = """Progress event of a firmware update.
+
+ip_address : string
+    IP Address of the robot being updated.
+phase : string
+    One of 'connect', 'upload', 'upgrade', 'reboot' or 'done', 'failed'
+    when update_fleet gave up on the robot.
+percent : int or None
+    Progress of the phase when known.
+message : string
+    Text of the event, new robot log output during the upgrade phase, the
+    error when failed.
+"""
+
+
+class FirmwareUpdateError(Exception):
+    """Raised when the firmware update of a robot fails.
+
+    """
+
 
 def get_args():
     """Command line interface to get arguments
 
-    Command line interface to collect the robot IP address and the path
+    Command line interface to collect the robot IP addresses and the path
     of the firmware file.
 
     Returns
     -------
     string
         Path the the robot firmware file for the robot update.
-    string
-        HTTP address of the robot to update.
+    list of string
+        HTTP addresses of the robots to update.
+    int
+        Maximum number of robots updated at the same time.
 
     """
     parser = argparse.ArgumentParser(
@@ -36,146 +71,452 @@ def get_args():
             type=str,
             nargs='+',
             default=['192.168.0.100'],
-            help='The IP of the robot that will be update.')
+            help='The IP of the robots that will be update.')
+    parser.add_argument(
+            '--max_parallel',
+            metavar='max_parallel',
+            type=int,
+            default=4,
+            help='The maximum number of robots updated at the same time.')
     args = parser.parse_args(sys.argv[1:])
-    return [args.robot_fw_path[0], args.robot_ip_address[0]]
+    return [args.robot_fw_path[0], args.robot_ip_address, args.max_parallel]
+
+class FirmwareImage:
+    """Read-only memory map of a firmware file, shared by every upload of
+    that file.
+
+    Attributes
+    ----------
+    file_path : string
+        Path to the firmware file.
+    size : int
+        Size of the firmware in bytes.
+    sha256 : string
+        Hexadecimal SHA-256 digest of the firmware file, to compare with the
+        checksum published with the firmware. The robot does not report one.
+
+    """
+
+    def __init__(self, file_path):
+        """Maps the firmware file in memory and computes its checksum.
+
+        Parameters
+        ----------
+        file_path : string
+            Path to the firmware file.
+
+        """
+        self.file_path = file_path
+        try:
+            with open(file_path, 'rb') as update_file:
+                self._map = mmap.mmap(update_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):   # mmap raises ValueError on empty files
+            raise FirmwareUpdateError(f'Could not open/read file: {file_path}.')
+        self.size = len(self._map)
+        digest = hashlib.sha256()
+        for offset in range(0, self.size, _UPLOAD_CHUNK_SIZE):
+            digest.update(self._map[offset:offset + _UPLOAD_CHUNK_SIZE])
+        self.sha256 = digest.hexdigest()
+
+    def stream(self, progress_callback=None):
+        """Returns a new file-like reader over the image for one upload.
+
+        Parameters
+        ----------
+        progress_callback : callable
+            Called with (bytes_sent, total_bytes) after each chunk read.
+
+        Returns
+        -------
+        stream : _UploadStream
+            Reader starting at the beginning of the image.
+
+        """
+        return _UploadStream(self, progress_callback)
+
+    def close(self):
+        """Unmaps the firmware file.
+
+        """
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
-def update_robot(file_path, ip_address):
-    """Send the update specified by file_path to the robot.
+
+class _UploadStream:
+    """File-like reader sending one firmware image in chunks while
+    reporting progress.
+
+    """
+
+    def __init__(self, image, progress_callback=None):
+        self.image = image
+        self.offset = 0
+        self.progress_callback = progress_callback
+
+    def __len__(self):
+        return self.image.size - self.offset
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.image.size - self.offset
+        chunk = self.image._map[self.offset:self.offset + min(size, _UPLOAD_CHUNK_SIZE)]
+        self.offset += len(chunk)
+        if chunk and self.progress_callback is not None:
+            self.progress_callback(self.offset, self.image.size)
+        return chunk
+
+    def verify(self):
+        """Checks that the whole image was read by the upload, the robot
+        answering before the end of the body.
+
+        """
+        if self.offset != self.image.size:
+            raise FirmwareUpdateError(f'Firmware upload incomplete: {self.offset} of {self.image.size} bytes '
+                                      f'of {self.image.file_path} sent.')
+
+
+def upload_firmware(image, ip_address, progress_callback=None, max_retries=3, backoff=1.0, max_backoff=8.0,
+                    timeout=(10.0, 120.0)):
+    """Streams a firmware image to the robot web server.
+
+    The upload is restarted from the beginning when the connection is lost,
+    the robot does not support resuming a partial upload.
 
     Parameters
     ----------
-    Param file_path : string
-        Path to the firware file
-    Param ip_address: string
-        IP Address of the robot to update
+    image : FirmwareImage
+        Firmware to upload.
+    ip_address : string
+        IP Address of the robot, may include a port ("host:port").
+    progress_callback : callable
+        Called with (bytes_sent, total_bytes) while uploading.
+    max_retries : int
+        Number of new attempts after a connection loss or timeout.
+    backoff : float
+        Delay in seconds before the first retry, doubled for each retry.
+    max_backoff : float
+        Upper bound of the delay between retries in seconds.
+    timeout : tuple of float
+        Time in seconds to connect, then to wait for each read from the robot,
+        its answer included once the whole image is sent.
+
+    """
+    headers = {'Connection': 'keep-alive',
+               'Content-type': 'application/x-gzip'}
+    attempt = 0
+    while True:
+        stream = image.stream(progress_callback)
+        try:
+            r = requests.post(f'http://{ip_address}/', data=stream, headers=headers, timeout=timeout)
+            break
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+            if attempt >= max_retries:
+                raise FirmwareUpdateError(f'Firmware upload request failed. Error: {err}')
+        except requests.exceptions.RequestException as err:
+            raise FirmwareUpdateError(f'Firmware upload request failed. Error: {err}')
+        time.sleep(min(backoff * 2 ** attempt, max_backoff))
+        attempt += 1
+    _raise_for_status(r, 'Firmware upload request')
+    stream.verify()
+
+def _raise_for_status(request, action):
+    """Converts the HTTP errors of a request to FirmwareUpdateError.
+
+    Parameters
+    ----------
+    request : requests.Response
+        Response of the request to check.
+    action : string
+        Description of the failed action for the error message.
+
+    """
+    try:
+        request.raise_for_status()
+    except requests.exceptions.RequestException as err:
+        raise FirmwareUpdateError(f'{action} failed. Error: {err}')
+
+class _AdaptiveInterval:
+    """Polling interval that restarts short after a change and grows
+    geometrically while nothing happens.
+
+    """
+
+    def __init__(self, minimum, maximum, growth=1.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.growth = growth
+        self.interval = minimum
+
+    def reset(self):
+        self.interval = self.minimum
+
+    def next(self):
+        interval = self.interval
+        self.interval = min(self.interval * self.growth, self.maximum)
+        return interval
+
+
+class _UpdateLog:
+    """Incremental reader of the LOG dictionary returned by the robot
+    /update page, only the entries added since the previous poll are visited.
+
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.last_key = None
+        self.text = ''
+        self.percent = None
+
+    def update(self, log):
+        """Returns the log text added since the previous call.
+
+        """
+        if len(log) > self.count:
+            for key in islice(log, self.count, None):
+                if self.last_key is None or key > self.last_key:
+                    self.last_key = key
+            self.count = len(log)
+        if self.last_key is None:
+            return ''
+        text = log[self.last_key]
+        new_text = text[len(self.text):] if text.startswith(self.text) else text
+        self.text = text
+        if new_text:
+            percent = re.findall(r'(\d+)%', new_text)
+            if percent:
+                self.percent = int(percent[-1])
+        return new_text
+
+
+def _try_connect(robot_inst):
+    """Connects to the robot control port, a refused connection counts as not connected.
+
+    """
+    try:
+        return robot_inst.connect()
+    except OSError:
+        return False
+
+def _update_robot(image, ip_address, report, poll_interval=(0.25, 4.0), reboot_timeout=600):
+    """Sends the firmware update to one robot and waits for its reboot.
+
+    Parameters
+    ----------
+    image : FirmwareImage
+        Firmware to upload, shared between robots.
+    ip_address : string
+        IP Address of the robot to update.
+    report : callable
+        Called with an UpdateProgress for each progress event.
+    poll_interval : tuple of float
+        Shortest and longest delay in seconds between two polls of the robot.
+    reboot_timeout : float
+        Time in seconds allowed for the robot to come back after the upgrade.
 
     """
     REQUEST_GET_TIMEOUT = 10
     ip_address_long = f'http://{ip_address}/'
-    robot_inst = RC.RobotController(ip_address)
-    if robot_inst.connect() :
-        robot_inst.DeactivateRobot()
-        robot_inst.disconnect()
-        print(f'Opening firmware file...')
-        try:
-            update_file = open(file_path, 'rb')
-        except OSError:
-            print(f'Could not open/read file: {file_path}.')
-            sys.exit()
-        with update_file:
-            update_data = update_file.read()
-            update_file_size_str = str(len(update_data))
-        print(f'Done, update size is: {update_file_size_str}B.')
-
-        print(f'Uploading file...')
-        headers = {'Connection': 'keep-alive',
-                   'Content-type': 'application/x-gzip',
-                   'Content-Length': update_file_size_str}
-        r = requests.post(ip_address_long, data=update_data, headers=headers)
+    robot_inst = RobotController(ip_address)
+    report(UpdateProgress(ip_address, 'connect', None, 'Deactivating the robot.'))
+    if not _try_connect(robot_inst):
+        raise FirmwareUpdateError(f'Could not connect to robot {ip_address}.')
+    robot_inst.DeactivateRobot()
+    robot_inst.disconnect()
+
+    last_percent = [None]
+    def upload_progress(sent, total):
+        percent = 100 * sent // total
+        if percent != last_percent[0]:
+            last_percent[0] = percent
+            report(UpdateProgress(ip_address, 'upload', percent, 'Uploading file...'))
+    upload_firmware(image, ip_address, upload_progress)
+
+    report(UpdateProgress(ip_address, 'upgrade', 0, 'Upgrading the robot...'))
+    interval = _AdaptiveInterval(*poll_interval)
+    update_log = _UpdateLog()
+    while True:
         try:
-            r.raise_for_status()
-        except requests.exceptions.HTTPError as errh:
-            print(f'HTTP request error when posting Update request.')
-            print(f'Error: {errh}')
-            print(f'Firmware upload request failed.')
-            sys.exit()
-        except requests.exceptions.ConnectionError as errc:
-            print(f'HTTP request connection error when posting Update request.')
-            print(f'Error: {errc}')
-            print(f'Firmware upload request failed.')
-            sys.exit()
-        except requests.exceptions.Timeout as errt:
-            print(f'HTTP request timeout when posting Update request.')
-            print(f'Error: {errt}')
-            print(f'Firmware upload request failed.')
-            sys.exit()
-        except requests.exceptions.RequestException as err:
-            print(f'HTTP request return a connection Error when posting Update request.')
-            print(f'Error: {err}')
-            print(f'Firmware upload request failed.')
-            sys.exit()
-
-        print('Upgrading the robot...')
-        update_done = False
-        progress = ''
-        last_progress = ''
-        while not update_done:
             r = requests.get(ip_address_long, 'update', timeout=REQUEST_GET_TIMEOUT)
-            try:
-                r.raise_for_status()
-            except requests.exceptions.HTTPError as errh:
-                print(f'HTTP request error when posting Update request.')
-                print(f'Error: {errh}')
-                print(f'Firmware upgrading failed.')
-                sys.exit()
-            except requests.exceptions.ConnectionError as errc:
-                print(f'HTTP request connection error when posting Update request.')
-                print(f'Error: {errc}')
-                print(f'Firmware upgrading failed.')
-                sys.exit()
-            except requests.exceptions.Timeout as errt:
-                print(f'HTTP request timeout when posting Update request.')
-                print(f'Error: {errt}')
-                print(f'Firmware upgrading failed.')
-                sys.exit()
-            except requests.exceptions.RequestException as err:
-                print(f'HTTP request return a connection Error when posting Update request.')
-                print(f'Error: {err}')
-                print(f'Firmware upgrading failed.')
-                sys.exit()
-
-            if r.status_code == 200:
-                resp = r.text
-            else:
-                resp = None
-            # When the json file is not yet created, get() returns 0.
-            if (resp is None) or (resp == '0'):
-                continue
-
-            try:
-                request_answer = json.loads(resp)
-            except Exception as e:
-                print(f'Failed to parse the answer "{resp}". {e}')
-                continue
-
-            if request_answer.get('STATUS'):
-                status_code = int(request_answer.get('STATUS').get('Code'))
-                status_msg = request_answer.get('STATUS').get('MSG')
-
-            if status_code in [0, 1]:
-                keys = sorted(request_answer.get('LOG').keys())
-                if keys:
-                    last_progress = progress
-                    progress = request_answer.get('LOG').get(keys[-1])
-                    new_progress = progress.replace(last_progress, '')
-                    if '#' in new_progress:
-                        print(f' ', end='')
-                    print(f'{new_progress}', end='', flush='True')
-                    if '100%' in new_progress:
-                        print(f'')
-                if status_code == 0:
-                    update_done = True
-                    print(f'{status_msg}')
-            else:
-                print(f'{status_msg}')
-                raise RuntimeError('Error while updating')
-
-            time.sleep(2)
-
-        print(f'Update done')
-        time.sleep(5)
-        print(f'Rebooting ...', end='', flush='True')
-        while(not robot_inst.connect()):
-            time.sleep(1)
-            print(f'...', end='', flush='True')
-        print(f'\nRebooting done.')
+        except requests.exceptions.RequestException as err:
+            raise FirmwareUpdateError(f'Firmware upgrading failed. Error: {err}')
+        _raise_for_status(r, 'Firmware upgrading')
+
+        if r.status_code == 200:
+            resp = r.text
+        else:
+            resp = None
+        # When the json file is not yet created, get() returns 0.
+        if (resp is None) or (resp == '0'):
+            time.sleep(interval.next())
+            continue
+
+        try:
+            request_answer = json.loads(resp)
+        except Exception as e:
+            report(UpdateProgress(ip_address, 'upgrade', update_log.percent, f'Failed to parse the answer "{resp}". {e}'))
+            time.sleep(interval.next())
+            continue
+
+        status = request_answer.get('STATUS') or {}
+        status_code = int(status.get('Code', 1))
+        status_msg = status.get('MSG')
+        if status_code not in [0, 1]:
+            raise FirmwareUpdateError(f'Error while updating: {status_msg}')
+
+        new_progress = update_log.update(request_answer.get('LOG') or {})
+        if new_progress:
+            interval.reset()        # the robot is moving on, look again soon
+            report(UpdateProgress(ip_address, 'upgrade', update_log.percent, new_progress))
+        if status_code == 0:
+            report(UpdateProgress(ip_address, 'upgrade', 100, f'{status_msg}'))
+            break
+        time.sleep(interval.next())
+
+    # Wait for the robot to go down for its reboot, then to accept connections again.
+    report(UpdateProgress(ip_address, 'reboot', None, 'Rebooting...'))
+    interval = _AdaptiveInterval(0.5, poll_interval[1])
+    going_down = time.monotonic() + 5
+    while time.monotonic() < going_down and _try_connect(robot_inst):
         robot_inst.disconnect()
+        time.sleep(interval.next())
+    interval.reset()
+    deadline = time.monotonic() + reboot_timeout
+    while not _try_connect(robot_inst):
+        if time.monotonic() > deadline:
+            raise FirmwareUpdateError(f'Robot {ip_address} did not come back after {reboot_timeout}s.')
+        time.sleep(interval.next())
+    robot_inst.disconnect()
+    report(UpdateProgress(ip_address, 'done', 100, 'Update done.'))
 
+def update_robot(file_path, ip_address, progress_callback=None, reboot_timeout=600):
+    """Send the update specified by file_path to the robot.
 
-if __name__ == '__main__':
+    Parameters
+    ----------
+    file_path : string
+        Path to the firmware file.
+    ip_address : string
+        IP Address of the robot to update.
+    progress_callback : callable
+        Called with an UpdateProgress for each progress event.
+    reboot_timeout : float
+        Time in seconds allowed for the robot to come back after the upgrade.
+
+    Raises
+    ------
+    FirmwareUpdateError
+        If the firmware could not be read, sent or installed.
+
+    """
+    report = progress_callback if progress_callback is not None else (lambda progress: None)
+    with FirmwareImage(file_path) as image:
+        _update_robot(image, ip_address, report, reboot_timeout=reboot_timeout)
+
+def update_fleet(file_path, ip_addresses, max_parallel=4, progress_callback=None, reboot_timeout=600):
+    """Send the update specified by file_path to several robots in parallel.
+
+    The firmware file is mapped once and shared by all the uploads. A failure
+    on one robot does not stop the update of the others, it is reported as a
+    'failed' UpdateProgress as soon as it happens.
+
+    Parameters
+    ----------
+    file_path : string
+        Path to the firmware file.
+    ip_addresses : list of string
+        IP Addresses of the robots to update, each listed once.
+    max_parallel : int
+        Maximum number of robots updated at the same time.
+    progress_callback : callable
+        Called with an UpdateProgress for each progress event, from the
+        thread updating the robot.
+    reboot_timeout : float
+        Time in seconds allowed for each robot to come back after the upgrade.
+
+    Returns
+    -------
+    results : dict
+        Error of each robot update keyed by IP Address, None on success.
+
+    Raises
+    ------
+    ValueError
+        If an IP Address is listed more than once.
+
+    """
+    duplicates = sorted({ip for ip in ip_addresses if ip_addresses.count(ip) > 1})
+    if duplicates:
+        raise ValueError(f'Robots listed more than once: {", ".join(duplicates)}.')
+    report = progress_callback if progress_callback is not None else (lambda progress: None)
+
+    def update_one(ip_address):
+        try:
+            _update_robot(image, ip_address, report, reboot_timeout=reboot_timeout)
+        except Exception as err:    # keep the other updates going whatever happens to this robot
+            report(UpdateProgress(ip_address, 'failed', None, f'{err}'))
+            return err
+        return None
+
+    with FirmwareImage(file_path) as image:
+        with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as executor:
+            errors = list(executor.map(update_one, ip_addresses))
+    return dict(zip(ip_addresses, errors))
+
+
+class _ProgressPrinter:
+    """Prints the progress events of one or several robot updates, one line
+    per message and per 10% step.
+
+    """
+
+    def __init__(self, ip_addresses):
+        self.lock = threading.Lock()
+        self.total = len(ip_addresses)
+        self.finished = 0
+        self.failed = 0
+        self.last = {ip: (None, -10) for ip in ip_addresses}
+
+    def __call__(self, progress):
+        with self.lock:
+            last_phase, last_percent = self.last[progress.ip_address]
+            percent = progress.percent if progress.percent is not None else -10
+            if progress.phase == last_phase == 'upload' and percent < last_percent + 10 and percent != 100:
+                return
+            self.last[progress.ip_address] = (progress.phase, percent)
+            if progress.phase in ('done', 'failed'):
+                self.finished += 1
+            if progress.phase == 'failed':
+                self.failed += 1
+            self._print(progress.ip_address, progress.phase, progress.percent, progress.message.strip())
+
+    def _print(self, ip_address, phase, percent, message):
+        percent = f' {percent}%' if percent is not None else ''
+        if self.total > 1:
+            print(f'[{self.finished}/{self.total} finished, {self.failed} failed] {ip_address} {phase}{percent}: {message}', flush=True)
+        else:
+            print(f'{phase}{percent}: {message}', flush=True)
+
+
+def main():
     """Update the robot firmware.
 
     """
-    [robot_fw_path, robot_ip_address] = get_args()
-    update_robot(robot_fw_path, robot_ip_address)
+    [robot_fw_path, robot_ip_addresses, max_parallel] = get_args()
+    printer = _ProgressPrinter(robot_ip_addresses)
+    try:
+        results = update_fleet(robot_fw_path, robot_ip_addresses, max_parallel, printer)
+    except (FirmwareUpdateError, ValueError) as err:
+        print(f'{err}')
+        sys.exit(1)
+    if any(error is not None for error in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+import numpy as np
+
+
+def rotation_matrix(alpha, beta, gamma):
+    """Builds the rotation matrices of mobile XYZ Euler angles, the
+    convention used by the Mecademic Robot for every pose.
+
+    Parameters
+    ----------
+    alpha, beta, gamma : float or array of float
+        Euler angles in degrees, broadcast together.
+
+    Returns
+    -------
+    rotation : array of float, shape (..., 3, 3)
+        Rotation matrices Rx(alpha) @ Ry(beta) @ Rz(gamma).
+
+    """
+    a, b, c = np.radians(alpha), np.radians(beta), np.radians(gamma)
+    ca, sa = np.cos(a), np.sin(a)
+    cb, sb = np.cos(b), np.sin(b)
+    cc, sc = np.cos(c), np.sin(c)
+    rotation = np.empty(np.broadcast(a, b, c).shape + (3, 3))
+    rotation[..., 0, 0] = cb * cc
+    rotation[..., 0, 1] = -cb * sc
+    rotation[..., 0, 2] = sb
+    rotation[..., 1, 0] = ca * sc + sa * sb * cc
+    rotation[..., 1, 1] = ca * cc - sa * sb * sc
+    rotation[..., 1, 2] = -sa * cb
+    rotation[..., 2, 0] = sa * sc - ca * sb * cc
+    rotation[..., 2, 1] = sa * cc + ca * sb * sc
+    rotation[..., 2, 2] = ca * cb
+    return rotation
+
+
+def euler_angles(rotation):
+    """Extracts the mobile XYZ Euler angles of rotation matrices.
+
+    When beta is +/-90 degrees, alpha and gamma are coupled and gamma is set to 0.
+
+    Parameters
+    ----------
+    rotation : array of float, shape (..., 3, 3)
+        Rotation matrices.
+
+    Returns
+    -------
+    angles : array of float, shape (..., 3)
+        Euler angles (alpha, beta, gamma) in degrees.
+
+    """
+    rotation = np.asarray(rotation, dtype=float)
+    beta = np.arcsin(np.clip(rotation[..., 0, 2], -1.0, 1.0))
+    gimbal_lock = np.abs(rotation[..., 0, 2]) > 1.0 - 1e-12
+    alpha = np.where(gimbal_lock,
+                     np.arctan2(rotation[..., 2, 1], rotation[..., 1, 1]),
+                     np.arctan2(-rotation[..., 1, 2], rotation[..., 2, 2]))
+    gamma = np.where(gimbal_lock, 0.0, np.arctan2(-rotation[..., 0, 1], rotation[..., 0, 0]))
+    return np.degrees(np.stack((alpha, beta, gamma), axis=-1))
+
+
+def pose_to_matrix(poses):
+    """Converts poses to homogeneous transforms.
+
+    Parameters
+    ----------
+    poses : array_like of float, shape (..., 6)
+        Poses (x, y, z, alpha, beta, gamma) in mm and degrees.
+
+    Returns
+    -------
+    matrices : array of float, shape (..., 4, 4)
+        Homogeneous transforms of the poses.
+
+    """
+    poses = np.asarray(poses, dtype=float)
+    matrices = np.zeros(poses.shape[:-1] + (4, 4))
+    matrices[..., :3, :3] = rotation_matrix(poses[..., 3], poses[..., 4], poses[..., 5])
+    matrices[..., :3, 3] = poses[..., :3]
+    matrices[..., 3, 3] = 1.0
+    return matrices
+
+
+def matrix_to_pose(matrices):
+    """Converts homogeneous transforms to poses.
+
+    Parameters
+    ----------
+    matrices : array_like of float, shape (..., 4, 4)
+        Homogeneous transforms.
+
+    Returns
+    -------
+    poses : array of float, shape (..., 6)
+        Poses (x, y, z, alpha, beta, gamma) in mm and degrees.
+
+    """
+    matrices = np.asarray(matrices, dtype=float)
+    return np.concatenate((matrices[..., :3, 3], euler_angles(matrices[..., :3, :3])), axis=-1)
+
+
+def invert_transform(matrices):
+    """Inverts rigid homogeneous transforms without a general matrix inversion.
+
+    Parameters
+    ----------
+    matrices : array_like of float, shape (..., 4, 4)
+        Homogeneous transforms.
+
+    Returns
+    -------
+    inverses : array of float, shape (..., 4, 4)
+        Inverse transforms.
+
+    """
+    matrices = np.asarray(matrices, dtype=float)
+    inverses = np.zeros_like(matrices)
+    rotation_t = np.swapaxes(matrices[..., :3, :3], -1, -2)
+    inverses[..., :3, :3] = rotation_t
+    inverses[..., :3, 3] = -np.einsum('...ij,...j->...i', rotation_t, matrices[..., :3, 3])
+    inverses[..., 3, 3] = 1.0
+    return inverses
+
+
+def rotation_angles(rotations_a, rotations_b):
+    """Computes the angle of the rotations between two sets of orientations.
+
+    Parameters
+    ----------
+    rotations_a, rotations_b : array_like of float, shape (..., 3, 3)
+        Rotation matrices, broadcast together.
+
+    Returns
+    -------
+    angles : array of float, shape (...)
+        Angle in degrees of the rotation taking each a to its b.
+
+    """
+    trace = np.einsum('...ij,...ij->...', np.asarray(rotations_a), np.asarray(rotations_b))
+    return np.degrees(np.arccos(np.clip((trace - 1.0) / 2.0, -1.0, 1.0)))
+
+
+def interpolate_rotations(rotations_a, rotations_b, fractions):
+    """Interpolates orientations along the shortest rotation from a to b.
+
+    Parameters
+    ----------
+    rotations_a, rotations_b : array_like of float, shape (..., 3, 3)
+        Start and end rotation matrices, broadcast together.
+    fractions : array_like of float, shape (...)
+        Position along the rotation, 0 at a and 1 at b.
+
+    Returns
+    -------
+    rotations : array of float, shape (..., 3, 3)
+        Interpolated rotation matrices.
+
+    """
+    rotations_a = np.asarray(rotations_a, dtype=float)
+    relative = np.swapaxes(rotations_a, -1, -2) @ np.asarray(rotations_b, dtype=float)
+    angle = np.arccos(np.clip((np.trace(relative, axis1=-2, axis2=-1) - 1.0) / 2.0, -1.0, 1.0))
+    axis = np.stack((relative[..., 2, 1] - relative[..., 1, 2],
+                     relative[..., 0, 2] - relative[..., 2, 0],
+                     relative[..., 1, 0] - relative[..., 0, 1]), axis=-1)
+    norm = np.linalg.norm(axis, axis=-1, keepdims=True)
+    axis = np.divide(axis, norm, out=np.zeros_like(axis), where=norm > 1e-12)
+    # Rodrigues formula for the partial rotation
+    theta = angle * np.asarray(fractions, dtype=float)
+    k = np.zeros(axis.shape + (3,))
+    k[..., 0, 1], k[..., 0, 2] = -axis[..., 2], axis[..., 1]
+    k[..., 1, 0], k[..., 1, 2] = axis[..., 2], -axis[..., 0]
+    k[..., 2, 0], k[..., 2, 1] = -axis[..., 1], axis[..., 0]
+    sin, cos = np.sin(theta)[..., np.newaxis, np.newaxis], np.cos(theta)[..., np.newaxis, np.newaxis]
+    partial = np.eye(3) + sin * k + (1.0 - cos) * (k @ k)
+    return rotations_a @ partial
+
+
+class FrameCache:
+    """Host-side copy of the active TRF and WRF with named tool and fixture
+    frames, converting whole pose arrays between frames instead of sending
+    SetTRF and SetWRF and querying GetPose again.
+
+    A pose of a TRF T in a WRF W places the flange at W @ pose @ inv(T), with
+    W relative to the BRF and T relative to the FRF. Poses are converted
+    between frames by keeping the flange in place.
+
+    Attributes
+    ----------
+    trf, wrf : array of float, shape (4, 4)
+        Active TRF with respect to the FRF and active WRF with respect to the BRF.
+    frames : dict
+        Named frames as homogeneous transforms.
+
+    """
+
+    def __init__(self, trf=(0, 0, 0, 0, 0, 0), wrf=(0, 0, 0, 0, 0, 0)):
+        """Constructor for a frame cache.
+
+        Parameters
+        ----------
+        trf, wrf : array_like of float, shape (6,)
+            Active TRF and WRF, as the arguments of SetTRF and SetWRF.
+
+        """
+        self.frames = {}
+        self._conversions = {}
+        self.set_trf(trf)
+        self.set_wrf(wrf)
+
+    def add_frame(self, name, pose):
+        """Names a tool or fixture frame.
+
+        Parameters
+        ----------
+        name : string
+            Name used in place of the pose afterwards.
+        pose : array_like of float, shape (6,)
+            Frame as the arguments of SetTRF or SetWRF.
+
+        """
+        self.frames[name] = pose_to_matrix(pose)
+        self._conversions.clear()
+
+    def set_trf(self, frame):
+        """Changes the active TRF, frame is a name or a SetTRF argument list."""
+        self.trf = self._matrix(frame)
+        self._conversions.clear()
+
+    def set_wrf(self, frame):
+        """Changes the active WRF, frame is a name or a SetWRF argument list."""
+        self.wrf = self._matrix(frame)
+        self._conversions.clear()
+
+    def sync(self, robot):
+        """Copies the TRF and WRF last sent by a RobotController.
+
+        Parameters
+        ----------
+        robot : RobotController
+            Controller whose settings hold the frames.
+
+        """
+        self.set_trf(robot.settings.get('SetTRF', (0, 0, 0, 0, 0, 0)))
+        self.set_wrf(robot.settings.get('SetWRF', (0, 0, 0, 0, 0, 0)))
+
+    def _matrix(self, frame):
+        if isinstance(frame, str):
+            return self.frames[frame]
+        return pose_to_matrix(frame)
+
+    def _conversion(self, trf, wrf):
+        """Transforms taking poses of trf in wrf to poses of the active frames,
+        computed once per pair of frames.
+
+        """
+        key = (trf if trf is None or isinstance(trf, str) else tuple(trf),
+               wrf if wrf is None or isinstance(wrf, str) else tuple(wrf))
+        conversion = self._conversions.get(key)
+        if conversion is None:
+            left = np.eye(4) if wrf is None else invert_transform(self.wrf) @ self._matrix(wrf)
+            right = np.eye(4) if trf is None else invert_transform(self._matrix(trf)) @ self.trf
+            conversion = self._conversions[key] = (left, right)
+        return conversion
+
+    def to_active(self, poses, trf=None, wrf=None):
+        """Converts poses of a TRF in a WRF to poses of the active TRF in the
+        active WRF, ready to send.
+
+        Parameters
+        ----------
+        poses : array_like of float, shape (..., 6)
+            Poses in mm and degrees.
+        trf, wrf : string or array_like of float
+            Frames of the poses, as names or SetTRF and SetWRF argument lists.
+            The active frame when None.
+
+        Returns
+        -------
+        poses : array of float, shape (..., 6)
+            Poses of the active TRF in the active WRF.
+
+        """
+        left, right = self._conversion(trf, wrf)
+        return matrix_to_pose(left @ pose_to_matrix(poses) @ right)
+
+    def from_active(self, poses, trf=None, wrf=None):
+        """Converts poses of the active TRF in the active WRF, as GetPose or the
+        feedback report them, to poses of a TRF in a WRF.
+
+        Parameters
+        ----------
+        poses : array_like of float, shape (..., 6)
+            Poses in mm and degrees.
+        trf, wrf : string or array_like of float
+            Frames to express the poses in, as names or SetTRF and SetWRF
+            argument lists. The active frame when None.
+
+        Returns
+        -------
+        poses : array of float, shape (..., 6)
+            Poses of the given TRF in the given WRF.
+
+        """
+        left, right = self._conversion(trf, wrf)
+        return matrix_to_pose(invert_transform(left) @ pose_to_matrix(poses) @ invert_transform(right))
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+import bisect
+import threading
+import time
+from collections import deque
+
+# Log-spaced bin edges in seconds, 4 per decade from 10 us to 10 s
+HISTOGRAM_EDGES = tuple(10 ** (exponent / 4) for exponent in range(-20, 5))
+
+
+class RollingHistogram:
+    """Histogram of the last samples of a duration, updated in constant time.
+
+    Attributes
+    ----------
+    edges : tuple of float
+        Upper edges of the bins in seconds, the last bin holds larger values.
+    counts : list of int
+        Number of samples of each bin, len(edges) + 1 bins.
+    window : int
+        Number of samples kept.
+
+    """
+
+    def __init__(self, window=1024, edges=HISTOGRAM_EDGES):
+        """Constructor for a rolling histogram.
+
+        Parameters
+        ----------
+        window : int
+            Number of samples kept.
+        edges : tuple of float
+            Upper edges of the bins in seconds, increasing.
+
+        """
+        self.edges = edges
+        self.window = window
+        self.counts = [0] * (len(edges) + 1)
+        self._samples = deque()
+        self._total = 0.0
+
+    def add(self, value):
+        """Adds a sample, evicting the oldest one once the window is full."""
+        if len(self._samples) == self.window:
+            oldest = self._samples.popleft()
+            self.counts[bisect.bisect_left(self.edges, oldest)] -= 1
+            self._total -= oldest
+        self._samples.append(value)
+        self.counts[bisect.bisect_left(self.edges, value)] += 1
+        self._total += value
+
+    def __len__(self):
+        return len(self._samples)
+
+    @property
+    def last(self):
+        """Latest sample, None when empty."""
+        return self._samples[-1] if self._samples else None
+
+    @property
+    def mean(self):
+        """Mean of the samples, None when empty."""
+        return self._total / len(self._samples) if self._samples else None
+
+    def quantile(self, q):
+        """Upper edge of the bin holding the q quantile, None when empty.
+
+        Parameters
+        ----------
+        q : float
+            Quantile between 0 and 1.
+
+        Returns
+        -------
+        value : float
+            Value in seconds, inf when the quantile falls beyond the last edge.
+
+        """
+        if not self._samples:
+            return None
+        rank = q * len(self._samples)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.edges[index] if index < len(self.edges) else float('inf')
+        return float('inf')
+
+
+class LinkMonitor:
+    """Watches the link to a robot and declares it dead within dead_after
+    seconds of silence.
+
+    The control link is probed every interval with RobotController.ping,
+    which needs the thread-safe mode, and the feedback link through the
+    arrivals reported by RobotFeedback listeners. When a watched link stays
+    silent for dead_after seconds, the threads waiting for robot answers are
+    woken and on_dead is called. on_alive is called when it answers again.
+
+    Attributes
+    ----------
+    rtt : RollingHistogram
+        Round trip times of the pings.
+    inter_arrival : RollingHistogram
+        Time between feedback arrivals.
+    alive : boolean
+        False once a watched link is declared dead, until it answers again.
+    reason : string
+        'control' or 'feedback', the link found dead last.
+
+    """
+
+    def __init__(self, robot=None, feedback=None, interval=0.1, dead_after=0.3,
+                 on_dead=None, on_alive=None, abort_on_dead=True):
+        """Constructor for a monitor.
+
+        Parameters
+        ----------
+        robot : RobotController
+            Controller in thread-safe mode to ping, None to not watch the control link.
+        feedback : RobotFeedback
+            Feedback to watch the arrivals of, None to not watch the feedback link.
+        interval : float
+            Time in seconds between pings and checks.
+        dead_after : float
+            Silence in seconds after which a link is declared dead.
+        on_dead : callable
+            Called with the monitor when a link is declared dead.
+        on_alive : callable
+            Called with the monitor when a dead link answers again.
+        abort_on_dead : boolean
+            Whether to wake the threads waiting for answers of the robot when
+            a link is declared dead.
+
+        """
+        if robot is not None and not robot.threaded:
+            raise ValueError('The robot must be in thread-safe mode, see RobotController.set_threaded.')
+        self.robot = robot
+        self.feedback = feedback
+        self.interval = interval
+        self.dead_after = dead_after
+        self.on_dead = on_dead
+        self.on_alive = on_alive
+        self.abort_on_dead = abort_on_dead
+        self.rtt = RollingHistogram()
+        self.inter_arrival = RollingHistogram()
+        self.alive = True
+        self.reason = None
+        self._last_answer = None
+        self._last_arrival = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts watching in a daemon thread.
+
+        """
+        now = time.monotonic()
+        self._last_answer = self._last_arrival = now
+        if self.feedback is not None:
+            self.feedback.add_listener(self._on_feedback)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='LinkMonitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops watching.
+
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.feedback is not None:
+            self.feedback.remove_listener(self._on_feedback)
+
+    def _on_feedback(self, feedback):
+        now = time.monotonic()
+        self.inter_arrival.add(now - self._last_arrival)
+        self._last_arrival = now
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.robot is not None:
+                rtt = self.robot.ping(self.dead_after)
+                if rtt is not None:
+                    self.rtt.add(rtt)
+                    self._last_answer = time.monotonic()
+            self._check(time.monotonic())
+
+    def _check(self, now):
+        """Updates alive from the time of the last answers."""
+        if self.robot is not None and now - self._last_answer > self.dead_after:
+            reason = 'control'
+        elif self.feedback is not None and now - self._last_arrival > self.dead_after:
+            reason = 'feedback'
+        else:
+            reason = None
+        if reason is not None and self.alive:
+            self.alive = False
+            self.reason = reason
+            if self.abort_on_dead and self.robot is not None:
+                self.robot.abort_pending()
+            if self.on_dead is not None:
+                self.on_dead(self)
+        elif reason is None and not self.alive:
+            self.alive = True
+            if self.on_alive is not None:
+                self.on_alive(self)
+
+    def stats(self):
+        """Summarizes the link health.
+
+        Returns
+        -------
+        stats : dict
+            'alive', 'reason', and the median, 99th percentile and last values
+            of 'rtt' and 'inter_arrival' in seconds.
+
+        """
+        summary = {'alive': self.alive, 'reason': self.reason}
+        for name, histogram in (('rtt', self.rtt), ('inter_arrival', self.inter_arrival)):
+            summary[name] = {'median': histogram.quantile(0.5), 'p99': histogram.quantile(0.99),
+                             'last': histogram.last, 'count': len(histogram)}
+        return summary
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from MecademicRobot.FrameTransform import interpolate_rotations, rotation_angles, rotation_matrix
+
+_CONTROL_PERIOD = 0.001         # s, cycle of the robot trajectory generator
+_MIN_TOLERANCE = 0.01           # mm or degrees, close to the robot repeatability
+_MAX_TOLERANCE = 0.05           # mm, geometric accuracy kept whatever the settings
+_DEFAULT_CART_LIN_VEL = 150.0   # mm/s, robot default of SetCartLinVel
+
+
+def default_tolerance(settings):
+    """Derives the Cartesian decimation tolerance from the robot settings.
+
+    With blending enabled the robot cannot follow a detail shorter than what
+    the TCP travels in one trajectory cycle at the SetCartLinVel velocity,
+    capped so that the shape of the path is kept at high velocities. Without
+    blending every waypoint is a stop, so only the floor tolerance is used.
+
+    Parameters
+    ----------
+    settings : dict
+        RobotController.settings.
+
+    Returns
+    -------
+    tolerance : float
+        Position tolerance in mm, between 0.01 and 0.05.
+
+    """
+    blending = settings.get('SetBlending', (100,))[0]
+    if blending == 0:
+        return _MIN_TOLERANCE
+    velocity = settings.get('SetCartLinVel', (_DEFAULT_CART_LIN_VEL,))[0]
+    return min(_MAX_TOLERANCE, max(_MIN_TOLERANCE, velocity * _CONTROL_PERIOD))
+
+
+def _simplify(count, segment_error):
+    """Ramer-Douglas-Peucker simplification with an explicit stack.
+
+    Parameters
+    ----------
+    count : int
+        Number of points of the path.
+    segment_error : callable
+        Called with the (start, end) indices of a chord, returns the error of
+        each interior point, normalized so that 1 is the tolerance.
+
+    Returns
+    -------
+    keep : array of bool
+        True for the points kept.
+
+    """
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        error = segment_error(start, end)
+        worst = int(np.argmax(error))
+        if error[worst] > 1.0:
+            split = start + 1 + worst
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def decimate_poses(poses, tolerance, angular_tolerance=0.1):
+    """Removes the poses of a Cartesian path that stay within tolerance of the
+    linear move between the poses kept around them.
+
+    Parameters
+    ----------
+    poses : array_like of float, shape (N, 6)
+        Poses (x, y, z, alpha, beta, gamma) in mm and degrees.
+    tolerance : float
+        Largest position deviation allowed, in mm.
+    angular_tolerance : float
+        Largest orientation deviation allowed, in degrees.
+
+    Returns
+    -------
+    keep : array of int
+        Indices of the poses to send, first and last always included.
+
+    """
+    poses = np.asarray(poses, dtype=float).reshape(-1, 6)
+    if len(poses) < 3:
+        return np.arange(len(poses))
+    positions = poses[:, :3]
+    rotations = rotation_matrix(poses[:, 3], poses[:, 4], poses[:, 5])
+
+    def segment_error(start, end):
+        chord = positions[end] - positions[start]
+        offset = positions[start + 1:end] - positions[start]
+        length = chord @ chord
+        fraction = np.clip(offset @ chord / length, 0.0, 1.0) if length > 0 else np.zeros(len(offset))
+        deviation = np.linalg.norm(offset - fraction[:, np.newaxis] * chord, axis=1)
+        expected = interpolate_rotations(rotations[start], rotations[end], fraction)
+        twist = rotation_angles(expected, rotations[start + 1:end])
+        return np.maximum(deviation / tolerance, twist / angular_tolerance)
+
+    return np.flatnonzero(_simplify(len(poses), segment_error))
+
+
+def decimate_joints(joints, tolerance=_MIN_TOLERANCE):
+    """Removes the joint sets of a MoveJoints path that stay within tolerance of
+    the joint interpolation between the joint sets kept around them.
+
+    Parameters
+    ----------
+    joints : array_like of float, shape (N, 6)
+        Joint angles in degrees.
+    tolerance : float
+        Largest deviation allowed on any joint, in degrees.
+
+    Returns
+    -------
+    keep : array of int
+        Indices of the joint sets to send, first and last always included.
+
+    """
+    joints = np.asarray(joints, dtype=float).reshape(-1, 6)
+    if len(joints) < 3:
+        return np.arange(len(joints))
+
+    def segment_error(start, end):
+        chord = joints[end] - joints[start]
+        offset = joints[start + 1:end] - joints[start]
+        length = chord @ chord
+        fraction = np.clip(offset @ chord / length, 0.0, 1.0) if length > 0 else np.zeros(len(offset))
+        return np.abs(offset - fraction[:, np.newaxis] * chord).max(axis=1) / tolerance
+
+    return np.flatnonzero(_simplify(len(joints), segment_error))
+
+
+def decimate_path(command, path, settings=None, tolerance=None, angular_tolerance=0.1,
+                  kinematics=None, conf=None):
+    """Decimates a MoveJoints, MovePose or MoveLin path in the space the robot
+    interpolates it in: joints for MoveJoints and MovePose, Cartesian for MoveLin.
+
+    Parameters
+    ----------
+    command : string
+        'MoveJoints', 'MovePose' or 'MoveLin'.
+    path : array_like of float, shape (N, 6)
+        Arguments of each command.
+    settings : dict
+        RobotController.settings, used for the default tolerance.
+    tolerance : float
+        Largest deviation allowed, in mm for MoveLin and degrees otherwise.
+        When None, derived from the blending and velocity settings for
+        MoveLin and 0.01 degrees otherwise.
+    angular_tolerance : float
+        Largest orientation deviation allowed for MoveLin, in degrees.
+    kinematics : Meca500Kinematics
+        Model used to find the joint angles of MovePose targets.
+    conf : array_like of int, shape (3,)
+        Configuration of the MovePose targets, None when automatic.
+
+    Returns
+    -------
+    keep : array of int
+        Indices of the waypoints to send.
+
+    """
+    if command == 'MoveLin':
+        if tolerance is None:
+            tolerance = default_tolerance(settings or {})
+        return decimate_poses(path, tolerance, angular_tolerance)
+    if tolerance is None:
+        tolerance = _MIN_TOLERANCE
+    if command == 'MovePose':
+        if kinematics is None:
+            from MecademicRobot.RobotKinematics import Meca500Kinematics
+            kinematics = Meca500Kinematics()
+        joints, valid = kinematics.inverse(path, conf)
+        if not valid.all():         # keep every pose so that the validation reports them
+            return np.arange(len(joints))
+        return decimate_joints(joints, tolerance)
+    if command == 'MoveJoints':
+        return decimate_joints(path, tolerance)
+    raise ValueError(f'Cannot decimate a {command} path.')
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from MecademicRobot.FrameTransform import interpolate_rotations, matrix_to_pose, pose_to_matrix, rotation_angles
+from MecademicRobot.RobotKinematics import Meca500Kinematics
+
+PATH_COMMANDS = ('MoveJoints', 'MovePose', 'MoveLin')
+
+
+class PathValidationError(Exception):
+    """Raised when a path holds waypoints the robot would refuse.
+
+    Attributes
+    ----------
+    report : PathReport
+        Result of the validation, with the offending indices.
+
+    """
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(f'{report.command} path rejected, offending waypoints: {report.offending.tolist()}')
+
+
+class PathReport:
+    """Result of the validation of a whole path.
+
+    Attributes
+    ----------
+    command : string
+        Move command the path is meant for.
+    joints : array of float, shape (N, 6)
+        Joint angles of each waypoint in degrees, NaN where there is no solution.
+    out_of_limits : array of int
+        Indices of the waypoints outside the joint limits.
+    unreachable : array of int
+        Indices of the poses with no valid inverse kinematic solution.
+    singular : array of int
+        Indices of the waypoints closer to a singularity than the margins.
+    discontinuous : array of int
+        Indices of the MoveLin waypoints the straight line to which leaves
+        the reach, nears a singularity or flips the wrist on the way.
+    offending : array of int
+        Indices of the waypoints the robot would refuse, sorted.
+
+    """
+
+    def __init__(self, command, joints, out_of_limits, unreachable, singular, singular_offends,
+                 discontinuous=None):
+        self.command = command
+        self.joints = joints
+        self.out_of_limits = np.flatnonzero(out_of_limits)
+        self.unreachable = np.flatnonzero(unreachable)
+        self.singular = np.flatnonzero(singular)
+        if discontinuous is None:
+            discontinuous = np.zeros(len(joints), dtype=bool)
+        self.discontinuous = np.flatnonzero(discontinuous)
+        offending = out_of_limits | unreachable | discontinuous
+        if singular_offends:
+            offending = offending | singular
+        self.offending = np.flatnonzero(offending)
+
+    @property
+    def ok(self):
+        """True when no waypoint is offending."""
+        return self.offending.size == 0
+
+    def raise_for_errors(self):
+        """Raises PathValidationError when a waypoint is offending.
+
+        """
+        if not self.ok:
+            raise PathValidationError(self)
+
+
+def _crossed_segments(kinematics, poses, conf, start_joints, angle_margin, shoulder_margin, step, max_joint_step):
+    """Samples the straight lines between consecutive poses and flags the
+    lines the robot cannot follow in conf.
+
+    Parameters
+    ----------
+    kinematics : Meca500Kinematics
+        Model with the TRF and WRF in use.
+    poses : array of float, shape (N, 6)
+        Start of the first line, then the end of each line.
+    conf : array_like of int, shape (3,)
+        Configuration kept along the lines.
+    start_joints : array of float, shape (6,)
+        Joint angles at the first pose.
+    angle_margin, shoulder_margin : float
+        Singularity margins, as validate_path.
+    step : tuple of float
+        Largest distance in mm and rotation in degrees between two samples.
+    max_joint_step : float
+        Largest joint motion in degrees between two samples of a continuous line.
+
+    Returns
+    -------
+    crossed : array of bool, shape (N - 1,)
+        True for each line that leaves the reach, nears a singularity, changes
+        the sign of joint 5 or makes a joint jump.
+
+    """
+    matrices = pose_to_matrix(poses)
+    distances = np.linalg.norm(np.diff(poses[:, :3], axis=0), axis=1)
+    turns = rotation_angles(matrices[:-1, :3, :3], matrices[1:, :3, :3])
+    counts = np.maximum(1, np.ceil(np.maximum(distances / step[0], turns / step[1]))).astype(int)
+    segment = np.repeat(np.arange(len(counts)), counts)
+    fraction = (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 1.0) / counts[segment]
+    samples = np.zeros((len(segment), 4, 4))
+    samples[:, :3, :3] = interpolate_rotations(matrices[segment, :3, :3], matrices[segment + 1, :3, :3], fraction)
+    samples[:, :3, 3] = matrices[segment, :3, 3] + fraction[:, np.newaxis] * (matrices[segment + 1, :3, 3]
+                                                                             - matrices[segment, :3, 3])
+    samples[:, 3, 3] = 1.0
+    joints, valid = kinematics.inverse(matrix_to_pose(samples), conf)
+    chain = np.vstack((start_joints, joints))           # the last sample of a line starts the next one
+    moves = np.abs(np.diff(chain, axis=0))
+    flipped = np.signbit(chain[1:, 4]) != np.signbit(chain[:-1, 4])
+    singular = kinematics.singularity_distances(np.nan_to_num(joints))
+    bad = (~valid | flipped | (np.nan_to_num(moves, nan=np.inf).max(axis=1) > max_joint_step)
+           | (singular[:, 0] < shoulder_margin) | (singular[:, 1] < angle_margin) | (singular[:, 2] < angle_margin))
+    crossed = np.zeros(len(counts), dtype=bool)
+    crossed[segment[bad]] = True
+    return crossed
+
+
+def validate_path(command, path, kinematics=None, conf=None, start_joints=None,
+                  angle_margin=1.0, shoulder_margin=5.0, step=(1.0, 1.0), max_joint_step=15.0):
+    """Checks every waypoint of a path in one vectorized pass.
+
+    MoveJoints targets are checked against the joint limits. MovePose targets
+    must have an inverse kinematic solution, in conf when given. MoveLin
+    targets must all be reachable in the configuration the robot starts the
+    path with, and must stay away from the singularities linear moves cannot
+    cross. The straight lines between them are sampled as well, a line that
+    passes a singularity flips the wrist even when both ends are fine.
+    Singular waypoints are reported for the other commands too, but do not
+    make them offending.
+
+    Parameters
+    ----------
+    command : string
+        'MoveJoints', 'MovePose' or 'MoveLin'.
+    path : array_like of float, shape (N, 6)
+        Joint angles or poses (TRF with respect to the WRF) of the waypoints.
+    kinematics : Meca500Kinematics
+        Model with the TRF and WRF in use, default frames when None.
+    conf : array_like of int, shape (3,)
+        Configuration set with SetConf, None when automatic.
+    start_joints : array_like of float, shape (6,)
+        Joint angles before the path, used for the MoveLin configuration and
+        first line. When None, the first valid configuration of the first
+        waypoint is assumed, which may not be the one the robot is in.
+    angle_margin : float
+        Smallest distance in degrees to the elbow and wrist singularities.
+    shoulder_margin : float
+        Smallest distance in mm of the wrist center to the joint 1 axis.
+    step : tuple of float
+        Largest distance in mm and rotation in degrees between two samples
+        of a MoveLin line.
+    max_joint_step : float
+        Largest joint motion in degrees between two samples of a MoveLin line.
+
+    Returns
+    -------
+    report : PathReport
+        Offending waypoints and the joint angles found for the path.
+
+    """
+    if command not in PATH_COMMANDS:
+        raise ValueError(f'Cannot validate a {command} path, expected one of {PATH_COMMANDS}.')
+    if kinematics is None:
+        kinematics = Meca500Kinematics()
+    path = np.asarray(path, dtype=float).reshape(-1, 6)
+    no_error = np.zeros(len(path), dtype=bool)
+
+    discontinuous = no_error
+    if command == 'MoveJoints':
+        joints = path
+        out_of_limits = ~kinematics.within_limits(joints)
+        unreachable = no_error
+    else:
+        if command == 'MoveLin':
+            if start_joints is not None:
+                start_joints = np.asarray(start_joints, dtype=float)
+                conf = kinematics.configuration(start_joints)
+            else:
+                conf = kinematics.configuration(kinematics.inverse(path[:1])[0][0])
+        joints, valid = kinematics.inverse(path, conf)
+        out_of_limits = no_error
+        unreachable = ~valid
+        if command == 'MoveLin' and valid.any():
+            if start_joints is not None:
+                lines, first = np.vstack((kinematics.forward(start_joints), path)), start_joints
+                ends = np.arange(len(path))
+            else:
+                lines, first = path, joints[0]
+                ends = np.arange(1, len(path))
+            if len(lines) > 1 and not np.isnan(first).any():
+                discontinuous = no_error.copy()
+                discontinuous[ends] = _crossed_segments(kinematics, lines, conf, first, angle_margin,
+                                                        shoulder_margin, step, max_joint_step)
+                discontinuous &= ~unreachable
+
+    distances = kinematics.singularity_distances(np.nan_to_num(joints))
+    singular = ((distances[:, 0] < shoulder_margin) | (distances[:, 1] < angle_margin)
+                | (distances[:, 2] < angle_margin))
+    return PathReport(command, joints, out_of_limits, unreachable, singular & ~unreachable,
+                      singular_offends=(command == 'MoveLin'), discontinuous=discontinuous)
@@ -1,6 +1,72 @@
 #!/usr/bin/env python3
+import ipaddress
+import queue
+import select
 import socket
+import threading
 import time
+from collections import deque
+
+from MecademicRobot.FirmwareProfile import CACHE_PATH, parse_version, remember_version
+
+_SEND_TIMEOUT = 10.0      # longest wait for the robot to take more bytes, they stay buffered afterwards
+
+_ERROR_CODES = frozenset(list(range(1000, 1039)) + [3001, 3003, 3005, 3009, 3014, 3026])
+
+_ARG_FORMAT = b'%.6f'     # fixed precision for arguments, avoids float repr noise such as 0.30000000000000004
+
+_COMMAND_PREFIXES = {name: name.encode('ascii') + b'(' for name in (
+    'Delay', 'MoveJoints', 'MoveLin', 'MoveLinRelTRF', 'MoveLinRelWRF', 'MovePose',
+    'SetAutoConf', 'SetBlending', 'SetCartAcc', 'SetCartAngVel', 'SetCartLinVel',
+    'SetConf', 'SetEOB', 'SetEOM', 'SetGripperForce', 'SetGripperVel', 'SetJointAcc',
+    'SetJointVel', 'SetTRF', 'SetWRF')}
+
+
+def _command_prefix(name):
+    """Returns the encoded 'Name(' prefix of a command, caching unknown names.
+
+    Parameters
+    ----------
+    name : string
+        Command name.
+
+    Returns
+    -------
+    prefix : bytes
+        ASCII encoded command name followed by the opening parenthesis.
+
+    """
+    prefix = _COMMAND_PREFIXES.get(name)
+    if prefix is None:
+        prefix = _COMMAND_PREFIXES[name] = name.encode('ascii') + b'('
+    return prefix
+
+
+def _is_loopback(address):
+    """Whether an address is the local host, where only stand-ins of robots run."""
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return address == 'localhost'
+
+
+class _PendingAnswer:
+    """Answer awaited by a thread in threaded mode, completed by the reader thread."""
+
+    __slots__ = ('codes', 'answer', '_event')
+
+    def __init__(self, codes):
+        self.codes = frozenset(codes)
+        self.answer = None
+        self._event = threading.Event()
+
+    def complete(self, answer):
+        self.answer = answer
+        self._event.set()
+
+    def wait(self, timeout):
+        self._event.wait(timeout)
+        return self.answer
 
 
 class RobotController:
@@ -10,7 +76,8 @@ class RobotController:
     Attributes
     ----------
     address : string
-        The IP address associated to the Mecademic Robot
+        The IP address associated to the Mecademic Robot, or the path of the
+        Unix socket of a ControlGateway sharing the robot.
     socket : socket object
         Socket connecting to physical Mecademic Robot.
     EOB : int
@@ -21,24 +88,78 @@ class RobotController:
         Error Status of the Mecademic Robot.
     queue : boolean
         Queuing option flag.
+    settings : dict
+        Arguments last sent with the persistent Set* commands, keyed by command name.
+    elided_commands : int
+        Number of Set* commands not sent because the robot already acknowledged
+        the same arguments.
+    flush_bytes : int
+        Size of buffered commands that triggers a write, 0 to write every command at once.
+    flush_delay : float
+        Longest time in seconds a command waits in the buffer, None to wait
+        for the size trigger or an explicit flush.
+    priority_latencies : deque of float
+        Time in seconds from the call to the command on the wire, for the
+        last 1000 PauseMotion, ClearMotion, BrakesOn and ping.
+    threaded : boolean
+        Thread-safe mode flag, see set_threaded.
+    unsolicited : deque of string
+        Last 100 messages no thread waited for, in threaded mode.
+    coalesced_queries : int
+        Number of Get* calls answered by a query already in flight.
+    firmware_version : string
+        Firmware version announced by the robot on connection, None until then.
+    firmware_cache : string
+        Path of the cache the firmware version is stored in on connection,
+        see FirmwareProfile, None to leave the cache alone. Never written for
+        loopback addresses and gateway sockets.
 
     """
 
-    def __init__(self, address):
+    def __init__(self, address, firmware_cache=CACHE_PATH):
         """Constructor for an instance of the Class Mecademic Robot.
 
         Parameters
         ----------
         address : string
-            The IP address associated to the Mecademic Robot.
+            The IP address associated to the Mecademic Robot, or the path of
+            the Unix socket of a ControlGateway, recognized by its '/'.
+        firmware_cache : string
+            Path of the firmware cache, None to leave it alone.
 
         """
         self.address = address
+        self.firmware_cache = firmware_cache
         self.socket = None
+        self._writer = None         # non-blocking duplicate of socket, used for writes only
         self.EOB = 1
         self.EOM = 1
         self.error = False
         self.queue = False
+        self.firmware_version = None
+        self.settings = {}
+        self.elided_commands = 0
+        self._acknowledged = {}     # (arguments, response) of the settings confirmed by the robot
+        self._local = threading.local()     # command buffer of each thread
+        self.flush_bytes = 0
+        self.flush_delay = None
+        self._out_buffer = bytearray()      # commands waiting to be written together
+        self._out_lock = threading.Lock()
+        self._flush_timer = None
+        self._out_partial = False           # the buffer starts with the end of a partly written command
+        self._receive_lock = threading.Lock()   # a single thread reads answers at a time
+        self.priority_latencies = deque(maxlen=1000)
+        self.threaded = False
+        self.unsolicited = deque(maxlen=100)
+        self._submissions = queue.SimpleQueue()     # (command, _PendingAnswer or None, priority) for the writer thread
+        self._pending = deque()                     # answers awaited, in send order
+        self._pending_lock = threading.Lock()
+        self._threads = ()
+        self._stop_reading = False
+        self.coalesced_queries = 0
+        self._flights = {}                          # _PendingAnswer of each Get* query in flight
+        self._flights_lock = threading.Lock()
+        self._metrics = None                        # set by DriverMetrics.MetricsRegistry.attach_controller
 
     def is_in_error(self):
         """Status method that checks whether the Mecademic Robot is in error mode.
@@ -72,22 +193,40 @@ class RobotController:
             self.error = True
         return response
 
-    def connect(self):
+    def connect(self, sock=None):
         """Connects Mecademic Robot object communication to the physical Mecademic Robot.
 
+        Parameters
+        ----------
+        sock : socket
+            Socket already connected to the control port, as opened by
+            RobotSession, None to open one.
+
         Returns
         -------
         status : boolean
             Returns the status of the connection, true for success, false for failure
 
         """
+        self.invalidate_settings()
         try:
-            self.socket = socket.socket()
-            self.socket.settimeout(0.1)  # 100ms
-            try:
-                self.socket.connect((self.address, 10000))
-            except socket.timeout:
-                raise TimeoutError
+            if sock is not None:
+                self.socket = sock
+                if sock.family != getattr(socket, 'AF_UNIX', None):
+                    self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY,1)
+            else:
+                if '/' in self.address:                         #path of a ControlGateway socket
+                    self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    endpoint = self.address
+                else:
+                    self.socket = socket.socket()
+                    self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY,1)   #writes are coalesced in _send, not by Nagle
+                    endpoint = (self.address, 10000)
+                self.socket.settimeout(0.1)  # 100ms
+                try:
+                    self.socket.connect(endpoint)
+                except socket.timeout:
+                    raise TimeoutError
 
             # Receive confirmation of connection
             if self.socket is None:
@@ -102,6 +241,19 @@ class RobotController:
             if self._response_contains(response, ['[3001]']):
                 print(f'Another user is already connected, closing connection.')
             elif self._response_contains(response, ['[3000]']):     # search for key [3000] in the received packet
+                version = parse_version(response)       # the greeting names the firmware, 'Connected to Meca500 R3 v8.3.2.'
+                if version is not None:
+                    self.firmware_version = version
+                    if self.firmware_cache is not None and '/' not in self.address and not _is_loopback(self.address):
+                        remember_version(self.address, version, self.firmware_cache)    # lets RobotFeedback skip detection
+                if self._writer is not None:
+                    self._writer.close()
+                self._writer = self.socket.dup()
+                self._writer.setblocking(False)     #timeouts of the reads never apply to writes
+                if self.threaded:
+                    self._start_threads()
+                if self._metrics is not None:
+                    self._metrics.connected()
                 return True
             else:
                 print(f'Unexpected code returned.')
@@ -117,10 +269,163 @@ class RobotController:
         """Disconnects Mecademic Robot object from physical Mecademic Robot.
 
         """
+        self.invalidate_settings()
         if(self.socket is not None):
+            self._stop_threads()
+            self.flush()
+            with self._out_lock:
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+                del self._out_buffer[:]                     #unsent bytes of a closed connection
+                self._out_partial = False
             self.socket.close()
             self.socket = None
 
+    def set_threaded(self, e):
+        """Enables the thread-safe mode, in which any number of threads can
+        exchange with the robot at the same time.
+
+        Commands are submitted through a queue to a single writer thread, which
+        flushes the write buffer whenever the queue is empty, and a single reader
+        thread hands each answer to the oldest waiting call expecting its code.
+        Messages nobody waits for are kept in unsolicited.
+
+        Parameters
+        ----------
+        e : boolean
+            Enables (1) or disables (0) the thread-safe mode.
+
+        Returns
+        -------
+        threaded : boolean
+            Thread-safe mode flag.
+
+        """
+        if e and not self.threaded:
+            self.threaded = True
+            if self.socket is not None:
+                self._start_threads()
+        elif not e and self.threaded:
+            self._stop_threads()
+            self.threaded = False
+        return self.threaded
+
+    def _start_threads(self):
+        self._stop_reading = False
+        self._threads = (threading.Thread(target=self._write_loop, name='RobotController writer', daemon=True),
+                         threading.Thread(target=self._read_loop, name='RobotController reader', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def _stop_threads(self):
+        if not self._threads:
+            return
+        self._submissions.put(None)
+        self._stop_reading = True
+        for thread in self._threads:
+            thread.join()
+        self._threads = ()
+        self._fail_pending(None)
+
+    def _write_loop(self):
+        """Sends the submitted commands, run by the writer thread."""
+        submissions = self._submissions
+        while True:
+            item = submissions.get()
+            if item is None:
+                break
+            cmd, pending, priority = item
+            if pending is not None:
+                with self._pending_lock:
+                    self._pending.append(pending)
+            sent = self._send_priority(cmd, ahead=False) if priority else self._send(cmd)
+            if not sent and pending is not None:
+                with self._pending_lock:
+                    self._pending.remove(pending)
+                pending.complete(None)
+            if submissions.empty():                         #batch what was submitted meanwhile
+                self.flush()
+        self.flush()
+
+    def _read_loop(self):
+        """Hands the answers of the robot to the waiting threads, run by the reader thread."""
+        sock = self.socket
+        sock.settimeout(0.2)                                #to notice _stop_threads
+        chunk = b''
+        while not self._stop_reading:
+            try:
+                data = sock.recv(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if not data:
+                break
+            messages = (chunk + data).split(b'\0')
+            chunk = messages.pop()
+            for msg in messages:
+                self._dispatch_answer(msg.decode('ascii'))
+        self._fail_pending(None)
+
+    def _dispatch_answer(self, msg):
+        """Completes the oldest pending answer expecting the code of a message.
+
+        Parameters
+        ----------
+        msg : string
+            Message received from the robot, without terminator.
+
+        """
+        try:
+            code = int(msg[1:msg.find(']')])
+        except ValueError:
+            code = None
+        with self._pending_lock:
+            for index, pending in enumerate(self._pending):
+                if code in pending.codes:
+                    del self._pending[index]
+                    break
+            else:
+                pending = None
+        if pending is not None:
+            pending.complete(msg)
+        elif code in _ERROR_CODES:
+            self.error = True
+            self.invalidate_settings()
+            if self._metrics is not None:
+                self._metrics.count_errors(msg)
+            self._fail_pending(msg)                         #the robot answers nothing else until ResetError
+        else:
+            self.unsolicited.append(msg)
+
+    def _fail_pending(self, msg):
+        with self._pending_lock:
+            failed = list(self._pending)
+            self._pending.clear()
+        for pending in failed:
+            pending.complete(msg)
+
+    def _exchange_threaded(self, cmd, response_list, delay, decode):
+        """exchange_msg of the thread-safe mode."""
+        if self.error or self.socket is None:
+            return
+        if not isinstance(cmd, str):
+            cmd = bytes(cmd)                                #the command buffer is reused by the next call
+        pending = _PendingAnswer(response_list) if response_list and not self.queue else None
+        self._submissions.put((cmd, pending, False))
+        if pending is None:
+            return
+        return self._decode_answer(pending.wait(delay), response_list, decode)
+
+    def invalidate_settings(self):
+        """Forgets which settings the robot acknowledged, so that the next Set*
+        commands are all sent. Called on connection, disconnection, error and
+        activation changes, when the robot settings can no longer be trusted.
+
+        """
+        self._acknowledged.clear()
+
     @staticmethod
     def _response_contains(response, code_list):
         """Scans received response for code IDs.
@@ -148,30 +453,120 @@ class RobotController:
     def _send(self, cmd):
         """Sends a command to the physical Mecademic Robot.
 
+        The command is appended to the write buffer, which is written at once
+        unless coalescing is enabled with set_write_coalescing.
+
         Parameters
         ----------
-        cmd : string
-            Command to be sent.
+        cmd : string or bytes-like
+            Command to be sent. Bytes are expected to be already terminated,
+            as returned by _build_command.
 
         Returns
         -------
         status : boolean
-            Returns whether the message is sent.
+            Returns whether the message is sent or buffered.
 
         """
         if self.socket is None or self.error:               #check that the connection is established or the robot is in error
             return False                                    #if issues detected, no point in trying to send a cmd that won't reach the robot
-        cmd = cmd + '\0'
-        status = 0
-        while status == 0:
-            try:                                            #while the message hasn't been sent
-                status = self.socket.send(cmd.encode('ascii'))  #send command in ascii encoding
-            except:
-                break
-            if status != 0:
-                return True                                 #return true when the message has been sent
-                                                            #Message failed to be sent, return false
-        return False
+        if isinstance(cmd, str):
+            cmd = (cmd + '\0').encode('ascii')              #commands built by hand still need encoding and terminator
+        if self._metrics is not None:
+            self._metrics.commands.inc()
+        with self._out_lock:
+            self._out_buffer += cmd
+            if len(self._out_buffer) < self.flush_bytes:
+                if self.flush_delay is not None and self._flush_timer is None:
+                    self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+                return True
+            return self._write_buffer()
+
+    def _write_buffer(self, until=None):
+        """Writes the buffered commands with as few calls as the socket allows,
+        with _out_lock held. Writes go through a non-blocking duplicate of the
+        socket and the lock is released while the socket cannot take more, so
+        that the priority lane can slip a command in. Bytes the robot does not
+        take within _SEND_TIMEOUT stay buffered for the next write.
+
+        Parameters
+        ----------
+        until : int
+            Number of bytes at the start of the buffer to write, all when None.
+
+        Returns
+        -------
+        status : boolean
+            Returns whether the bytes are sent or still buffered, False when
+            the connection is lost.
+
+        """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        buffer = self._out_buffer
+        remaining = len(buffer) if until is None else until
+        while remaining > 0 and buffer:
+            writer = self._writer
+            if writer is None:                              #closed meanwhile
+                return False
+            try:
+                sent = writer.send(buffer)                  #never waits, the socket has no timeout
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError:                                 #connection lost
+                del buffer[:]
+                self._out_partial = False
+                return False
+            if sent:
+                self._out_partial = buffer[sent - 1] != 0
+                del buffer[:sent]
+                remaining -= sent
+                continue
+            self._out_lock.release()
+            try:
+                writable = select.select([], [writer], [], _SEND_TIMEOUT)[1]
+            except (OSError, ValueError):                   #closed while waiting
+                writable = []
+            finally:
+                self._out_lock.acquire()
+            if not writable:
+                return self._writer is not None             #stalled, the bytes are written by the next write
+        return True
+
+    def flush(self):
+        """Writes the commands waiting in the write buffer.
+
+        Returns
+        -------
+        status : boolean
+            Returns whether the buffered commands are sent.
+
+        """
+        with self._out_lock:
+            return self._write_buffer()
+
+    def set_write_coalescing(self, max_bytes=1400, max_delay=0.002):
+        """Collects outgoing commands and writes them together, once max_bytes
+        are buffered, max_delay after the first buffered command, before
+        waiting for an answer or on flush.
+
+        Coalescing pays off for commands that are not answered one by one,
+        as with set_queue or send_path in queueing mode.
+
+        Parameters
+        ----------
+        max_bytes : int
+            Buffer size that triggers a write, 0 disables coalescing.
+        max_delay : float
+            Longest time in seconds a command waits in the buffer, None for no limit.
+
+        """
+        self.flush()
+        self.flush_bytes = max_bytes
+        self.flush_delay = max_delay
 
     def _receive(self, answer_list, delay=20):
         """Receives message from the Mecademic Robot and looks for
@@ -192,6 +587,15 @@ class RobotController:
         """
         if self.socket is None:                         #check that the connection is established
             return                                      #if no connection, nothing to receive
+        self.flush()                                    #the answer cannot come before the command is written
+        with self._receive_lock:
+            return self._receive_answer(answer_list, delay)
+
+    def _receive_answer(self, answer_list, delay):
+        """Reads from the robot until an expected answer or an error, with
+        _receive_lock held.
+
+        """
         response_list = []
         response_found = False
         for x in answer_list:                           #convert codes to search for in answer into comparable format
@@ -209,14 +613,19 @@ class RobotController:
             error_found = self._response_contains(response, error_list) #search message for errors
         if error_found:                                 #if errors have been found, flag the script
             self.error = True
+            self.invalidate_settings()
+            if self._metrics is not None:
+                self._metrics.count_errors(response)
         return response                                 #return the retrieved message
 
     def exchange_msg(self, cmd, delay=20, decode=True):
         """Sends and receives with the Mecademic Robot.
 
+        The round trip of answered commands is recorded when metrics are attached.
+
         Parameters
         ----------
-        cmd : string
+        cmd : string or bytes-like
             Command to send to the Mecademic Robot.
         delay : int
             Timeout to set for the socket.
@@ -229,7 +638,20 @@ class RobotController:
             Response with desired code ID.
 
         """
+        metrics = self._metrics
+        if metrics is None:
+            return self._exchange(cmd, delay, decode)
+        start = time.perf_counter()
+        response = self._exchange(cmd, delay, decode)
+        if response is not None:
+            metrics.rtt.observe(time.perf_counter() - start)
+        return response
+
+    def _exchange(self, cmd, delay, decode):
+        """Body of exchange_msg."""
         response_list = self._get_answer_list(cmd)
+        if self.threaded:
+            return self._exchange_threaded(cmd, response_list, delay, decode)
         if(not self.error):                                 #if there is no error
             status = self._send(cmd)                        #send the command to the robot
             if status is True:                              #if the command was sent
@@ -237,35 +659,248 @@ class RobotController:
                     return
                 else:
                     answer = self._receive(response_list, delay)#get response from robot
-                    if answer is not None:                      #if message was retrieved
-                        for response in response_list:          #search for response codes
-                            if self._response_contains(answer, [str(response)]):
-                                if(decode):
-                                    return self._decode_msg(answer, response)   #decrypt response based on right response code
-                                else:
-                                    return answer
-                        error_list = [str(i) for i in range(1000, 1039)]+[str(i) for i in [3001,3003,3005,3009,3014,3026]]  #Make error codes in a comparable format
-                        for response in error_list:
-                            if self._response_contains(answer, [str(response)]):
-                                if(decode):
-                                    return self._decode_msg(answer, response)   #decrypt response based on right response code
-                                else:
-                                    return answer
-                    else:
-                        if(len(response_list) == 0):            #if we aren't expecting anything, don't bother looking
-                            return
-                        else:
-                            return
+                    return self._decode_answer(answer, response_list, decode)
             #if message didn't send correctly, reboot communication
             self.disconnect()
             time.sleep(1)
             self.connect()
             return
 
+    def _decode_answer(self, answer, response_list, decode=True):
+        """Picks the expected or error code out of an answer and decodes it.
+
+        Parameters
+        ----------
+        answer : string
+            Answer read from the robot, None when nothing was read.
+        response_list : list
+            Expected answer codes.
+        decode : bool
+            Whether to decode the message or return it whole.
+
+        Returns
+        -------
+        response : string
+            Response with desired code ID.
+
+        """
+        if answer is None:                                  #nothing was retrieved
+            return
+        for response in response_list:                      #search for response codes
+            if self._response_contains(answer, [str(response)]):
+                if(decode):
+                    key = f'[{response}]'
+                    message = next((msg for msg in answer.split('\0') if key in msg), answer)   #skip answers read along, such as the [2042] of a written PauseMotion
+                    return self._decode_msg(message, response)  #decrypt response based on right response code
+                else:
+                    return answer
+        error_list = [str(i) for i in range(1000, 1039)]+[str(i) for i in [3001,3003,3005,3009,3014,3026]]  #Make error codes in a comparable format
+        for response in error_list:
+            if self._response_contains(answer, [str(response)]):
+                if(decode):
+                    return self._decode_msg(answer, response)   #decrypt response based on right response code
+                else:
+                    return answer
+
+    def _send_priority(self, cmd, ahead=True):
+        """Writes a stop command ahead of the commands waiting in the write
+        buffer, even when the robot is in error, and records the time it took.
+
+        Only commands that hold the robot, such as PauseMotion and BrakesOn,
+        may skip ahead: a ClearMotion written before buffered moves would let
+        them run after ResumeMotion, so it is written after them.
+
+        Parameters
+        ----------
+        cmd : string
+            Command to send.
+        ahead : boolean
+            Whether to write the command before the buffered ones, else it is
+            written right after them, together.
+
+        Returns
+        -------
+        status : boolean
+            Returns whether the command is on the wire.
+
+        """
+        start = time.perf_counter()
+        if self.socket is None:
+            return False
+        data = (cmd + '\0').encode('ascii')
+        if self._metrics is not None:
+            self._metrics.commands.inc()
+        with self._out_lock:                                #never held while a write waits for the socket
+            if ahead:
+                position = self._out_buffer.find(b'\0') + 1 if self._out_partial else 0
+            else:
+                position = len(self._out_buffer)
+            self._out_buffer[position:position] = data      #ahead of every command not started yet, or last
+            status = self._write_buffer(until=position + len(data))
+        if status:
+            self.priority_latencies.append(time.perf_counter() - start)
+        return status
+
+    def _exchange_priority(self, cmd, delay=20, ahead=True):
+        """Sends a stop command through the priority lane. Its answer is read
+        here unless another thread is already waiting for answers, in which
+        case that thread sees it and None is returned.
+
+        Parameters
+        ----------
+        cmd : string
+            Command to send.
+        delay : int or float
+            Time to wait for the answer in threaded mode.
+        ahead : boolean
+            Whether to write the command before the buffered ones, see _send_priority.
+
+        Returns
+        -------
+        response : string
+            Decoded answer, None when not read here.
+
+        """
+        response_list = self._get_answer_list(cmd)
+        if self.threaded and not ahead:
+            pending = _PendingAnswer(response_list)
+            self._submissions.put((cmd, pending, True))     #after the commands submitted before, even in error
+            return self._decode_answer(pending.wait(delay), response_list)
+        if self.threaded:
+            pending = _PendingAnswer(response_list)
+            with self._pending_lock:
+                self._pending.append(pending)
+            if not self._send_priority(cmd, ahead):
+                with self._pending_lock:
+                    self._pending.remove(pending)
+                return
+            return self._decode_answer(pending.wait(delay), response_list)
+        if not self._send_priority(cmd, ahead) or self.queue or self._receive_lock.locked():
+            return
+        return self._decode_answer(self._receive(response_list), response_list)
+
+    def ping(self, timeout=0.3):
+        """Measures the round trip of a GetStatusRobot sent through the priority
+        lane, whatever the error state of the robot. Needs the thread-safe mode.
+
+        Parameters
+        ----------
+        timeout : float
+            Time in seconds to wait for the answer.
+
+        Returns
+        -------
+        rtt : float
+            Round trip time in seconds, None without answer in time.
+
+        """
+        if not self.threaded:
+            raise RuntimeError('ping needs the thread-safe mode, see set_threaded.')
+        start = time.perf_counter()
+        if self._exchange_priority('GetStatusRobot', timeout) is None:
+            return None
+        return time.perf_counter() - start
+
+    def abort_pending(self):
+        """Wakes every thread waiting for an answer in threaded mode, their
+        calls return None. Meant for a link declared dead.
+
+        """
+        self._fail_pending(None)
+
+    def priority_latency_stats(self):
+        """Summarizes priority_latencies.
+
+        Returns
+        -------
+        stats : dict
+            'count' and the 'median', 'p99' and 'max' latencies in microseconds,
+            None when no stop command was sent.
+
+        """
+        latencies = sorted(self.priority_latencies)
+        if not latencies:
+            return None
+        return {'count': len(latencies),
+                'median': latencies[len(latencies) // 2] * 1e6,
+                'p99': latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1e6,
+                'max': latencies[-1] * 1e6}
+
+    def _exchange_query(self, cmd):
+        """Exchanges a read-only Get* query, sharing the answer of an identical
+        query already in flight with another thread instead of sending it again.
+
+        Parameters
+        ----------
+        cmd : string
+            Query to send.
+
+        Returns
+        -------
+        response : tuple or string
+            Decoded answer, the same object for every coalesced call.
+
+        """
+        with self._flights_lock:
+            flight = self._flights.get(cmd)
+            leader = flight is None
+            if leader:
+                flight = self._flights[cmd] = _PendingAnswer(())
+            else:
+                self.coalesced_queries += 1
+        if not leader:
+            return flight.wait(None)
+        response = None
+        try:
+            response = self.exchange_msg(cmd)
+        finally:
+            with self._flights_lock:
+                del self._flights[cmd]
+            flight.complete(response)
+        return response
+
+    def _exchange_setting(self, raw_cmd, arg_list):
+        """Sends a persistent Set* command and records its arguments in settings
+        once it went through without error.
+
+        The command is elided when the robot already acknowledged the same
+        arguments, the response to that acknowledgment is returned instead.
+
+        Parameters
+        ----------
+        raw_cmd : string
+            Command name of the setting.
+        arg_list : list
+            Arguments of the setting.
+
+        Returns
+        -------
+        response : string
+            Returns receive decrypted response.
+
+        """
+        args = tuple(arg_list)
+        acknowledged = self._acknowledged.get(raw_cmd)
+        if acknowledged is not None and acknowledged[0] == args and not self.error:
+            self.elided_commands += 1
+            return acknowledged[1]
+        cmd = self._build_command(raw_cmd, arg_list)
+        response = self.exchange_msg(cmd)
+        if not self.error:
+            self.settings[raw_cmd] = args
+        if response is not None and not self.error:
+            self._acknowledged[raw_cmd] = (args, response)
+        else:                                               #queued, timed out or failed, the robot may hold the new value
+            self._acknowledged.pop(raw_cmd, None)
+        return response
+
     def _build_command(self, cmd, arg_list=[]):
-        """Builds the command string to send to the Mecademic Robot
+        """Builds the command to send to the Mecademic Robot
         from the function name and arguments the command needs.
 
+        The command is serialized straight into a buffer reused between calls
+        of the same thread, the returned value is only valid until its next call.
+
         Parameters
         ----------
         cmd : string
@@ -275,16 +910,21 @@ class RobotController:
 
         Returns
         -------
-        command : string
-            Final command for the Mecademic Robot
+        command : bytearray
+            Final null terminated ASCII command for the Mecademic Robot
 
         """
-        command = cmd
+        command = getattr(self._local, 'buffer', None)
+        if command is None:
+            command = self._local.buffer = bytearray()
+        del command[:]
         if(len(arg_list)!=0):
-            command = command + '('
-            for index in range(0, (len(arg_list)-1)):
-                command = command+str(arg_list[index])+','
-            command = command+str(arg_list[-1])+')'
+            command += _command_prefix(cmd)
+            command += b','.join([(_ARG_FORMAT % arg).rstrip(b'0').rstrip(b'.') for arg in arg_list])   #strip trailing zeros
+            command += b')\0'
+        else:
+            command += cmd.encode('ascii')
+            command += b'\0'
         return command
 
     def _decode_msg(self, response, response_key):
@@ -321,7 +961,7 @@ class RobotController:
 
         Parameters
         ----------
-        command : string
+        command : string or bytes-like
             Command that is to be sent to the Mecademic Robot.
 
         Returns
@@ -330,6 +970,8 @@ class RobotController:
             List of answer codes to search for in response.
 
         """
+        if not isinstance(command, str):                    #only the command name is needed to find the answer codes
+            command = bytes(command).partition(b'(')[0].rstrip(b'\0').decode('ascii')
         if(command.find('ActivateRobot') != -1):
             return [2000,2001]
         elif(command.find('ActivateSim')!= -1):
@@ -344,6 +986,8 @@ class RobotController:
             return [2008]
         elif(command.find('GetConf')!= -1):
             return [2029]
+        elif(command.find('GetFwVersion')!= -1):
+            return [2081]
         elif(command.find('GetJoints')!= -1):
             return [2026]
         elif(command.find('GetStatusRobot')!= -1):
@@ -400,6 +1044,7 @@ class RobotController:
 
         """
         cmd = 'DeactivateRobot'
+        self.invalidate_settings()                          #the robot restores its default settings on deactivation
         return self.exchange_msg(cmd)
 
     def ActivateSim(self):
@@ -457,8 +1102,7 @@ class RobotController:
         else:
             self.EOB = 0
         raw_cmd = 'SetEOB'
-        cmd = self._build_command(raw_cmd,[e])
-        return self.exchange_msg(cmd)
+        return self._exchange_setting(raw_cmd,[e])
 
     def SetEOM(self, e):
         """Sets End of Movement answer active or inactive in the Mecademic Robot.
@@ -479,8 +1123,7 @@ class RobotController:
         else:
             self.EOM = 0
         raw_cmd = 'SetEOM'
-        cmd = self._build_command(raw_cmd,[e])
-        return self.exchange_msg(cmd)
+        return self._exchange_setting(raw_cmd,[e])
 
     def home(self):
         """Homes the Mecademic Robot.
@@ -680,6 +1323,71 @@ class RobotController:
         cmd = self._build_command(raw_cmd,[x,y,z,alpha,beta,gamma])
         return self.exchange_msg(cmd)
 
+    def send_path(self, raw_cmd, path, validate=True, kinematics=None, start_joints=None,
+                  decimate=False, tolerance=None):
+        """Streams a path of MoveJoints, MovePose or MoveLin targets, one command per waypoint.
+
+        The whole path is validated on the host first, so that a bad waypoint
+        is reported before anything is sent instead of putting the robot in
+        error halfway through. Dense paths can first be decimated, dropping the
+        waypoints that stay within tolerance of the path kept around them.
+
+        Parameters
+        ----------
+        raw_cmd : string
+            'MoveJoints', 'MovePose' or 'MoveLin'.
+        path : array_like of float, shape (N, 6)
+            Arguments of each command.
+        validate : boolean
+            Check joint limits, reach and singularities before sending.
+        kinematics : Meca500Kinematics
+            Model used for the validation, one using the TRF and WRF last
+            sent by this controller is made when None.
+        start_joints : tuple of float
+            Joint angles before the path, to validate MoveLin configurations
+            and first line. Read with GetJoints when None.
+        decimate : boolean
+            Remove the waypoints that do not change the path beyond tolerance.
+        tolerance : float
+            Decimation tolerance in mm for MoveLin, degrees otherwise. Derived
+            from the SetBlending and SetCartLinVel settings when None.
+
+        Returns
+        -------
+        responses : list
+            Returns the decrypted response of each command sent.
+
+        Raises
+        ------
+        PathValidationError
+            If a waypoint is refused by the validation, nothing is sent then.
+
+        """
+        if validate or decimate:
+            from MecademicRobot.RobotKinematics import Meca500Kinematics     # numpy is only needed here
+            if kinematics is None:
+                kinematics = Meca500Kinematics()
+                kinematics.sync_frames(self)
+            conf = None
+            if self.settings.get('SetAutoConf', (1,))[0] == 0:
+                conf = self.settings.get('SetConf')
+        if decimate:
+            from MecademicRobot.PathDecimation import decimate_path
+            path = [path[i] for i in decimate_path(raw_cmd, path, self.settings, tolerance,
+                                                   kinematics=kinematics, conf=conf)]
+        if validate:
+            from MecademicRobot.PathValidation import validate_path
+            if raw_cmd == 'MoveLin' and start_joints is None:
+                start_joints = self.GetJoints()             #None in queueing mode, the first waypoint is assumed then
+            validate_path(raw_cmd, path, kinematics, conf, start_joints).raise_for_errors()
+        responses = []
+        for target in path:
+            responses.append(self.exchange_msg(self._build_command(raw_cmd, target)))
+            if self.error:                                  #the robot refused a command, stop streaming
+                break
+        self.flush()
+        return responses
+
     def SetBlending(self, p):
         """Sets the blending of the Mecademic Robot.
 
@@ -695,8 +1403,7 @@ class RobotController:
 
         """
         raw_cmd = 'SetBlending'
-        cmd = self._build_command(raw_cmd,[p])
-        return self.exchange_msg(cmd)
+        return self._exchange_setting(raw_cmd,[p])
 
     def SetAutoConf(self, e):
         """Enables or Disables the automatic robot configuration
@@ -714,8 +1421,7 @@ class RobotController:
 
         """
         raw_cmd = 'SetAutoConf'
-        cmd = self._build_command(raw_cmd,[e])
-        return self.exchange_msg(cmd)
+        return self._exchange_setting(raw_cmd,[e])
 
     def SetCartAcc(self, p):
         """Sets the cartesian accelerations of the linear and angular movements of the
@@ -733,8 +1439,7 @@ class RobotController:
 
         """
         raw_cmd = 'SetCartAcc'
-        cmd = self._build_command(raw_cmd,[p])
-        return self.exchange_msg(cmd)
+        return self._exchange_setting(raw_cmd,[p])
 
     def SetCartAngVel(self, w):
         """Sets the cartesian angular velocity of the Mecademic Robot TRF with respect to its WRF.
@@ -751,8 +1456,7 @@ class RobotController:
 
         """
         raw_cmd = 'SetCartAngVel'
-        cmd = self._build_command(raw_cmd,[w])
-        return self.exchange_msg(cmd)
+        return self._exchange_setting(raw_cmd,[w])
 
     def SetCartLinVel(self, v):
         """Sets the cartesian linear velocity of the Mecademic Robot's TRF relative to its WRF.
@@ -769,8 +1473,7 @@ class RobotController:
 
         """
         raw_cmd = 'SetCartLinVel'
-        cmd = self._build_command(raw_cmd,[v])
-        return self.exchange_msg(cmd)
+        return self._exchange_setting(raw_cmd,[v])
 
     def SetConf(self, c1, c3, c5):
         """Sets the desired Mecademic Robot inverse kinematic configuration to be observed in the
@@ -792,8 +1495,11 @@ class RobotController:
 
         """
         raw_cmd = 'SetConf'
-        cmd = self._build_command(raw_cmd,[c1,c3,c5])
-        return self.exchange_msg(cmd)
+        response = self._exchange_setting(raw_cmd,[c1,c3,c5])
+        if not self.error:
+            self.settings['SetAutoConf'] = (0,)             #setting a configuration disables the automatic one
+        self._acknowledged.pop('SetAutoConf', None)         #a later SetAutoConf(1) must reach the robot
+        return response
 
     def SetGripperForce(self, p):
         """Sets the Gripper's grip force.
@@ -810,8 +1516,7 @@ class RobotController:
 
         """
         raw_cmd = 'SetGripperForce'
-        cmd = self._build_command(raw_cmd,[p])
-        return self.exchange_msg(cmd)
+        return self._exchange_setting(raw_cmd,[p])
 
     def SetGripperVel(self, p):
         """Sets the Gripper fingers' velocity with respect to the gripper.
@@ -828,8 +1533,7 @@ class RobotController:
 
         """
         raw_cmd = 'SetGripperVel'
-        cmd = self._build_command(raw_cmd,[p])
-        return self.exchange_msg(cmd)
+        return self._exchange_setting(raw_cmd,[p])
 
     def SetJointAcc(self, p):
         """Sets the acceleration of the joints.
@@ -846,8 +1550,7 @@ class RobotController:
 
         """
         raw_cmd = 'SetJointAcc'
-        cmd = self._build_command(raw_cmd,[p])
-        return self.exchange_msg(cmd)
+        return self._exchange_setting(raw_cmd,[p])
 
     def SetJointVel(self, velocity):
         """Sets the angular velocities of the Mecademic Robot's joints.
@@ -864,8 +1567,7 @@ class RobotController:
 
         """
         raw_cmd = 'SetJointVel'
-        cmd = self._build_command(raw_cmd,[velocity])
-        return self.exchange_msg(cmd)
+        return self._exchange_setting(raw_cmd,[velocity])
 
     def SetTRF(self, x, y, z, alpha, beta, gamma):
         """Sets the Mecademic Robot TRF at (x,y,z) and heading (alpha, beta, gamma)
@@ -893,8 +1595,7 @@ class RobotController:
 
         """
         raw_cmd = 'SetTRF'
-        cmd = self._build_command(raw_cmd,[x,y,z,alpha,beta,gamma])
-        return self.exchange_msg(cmd)
+        return self._exchange_setting(raw_cmd,[x,y,z,alpha,beta,gamma])
 
     def SetWRF(self, x, y, z, alpha, beta, gamma):
         """Sets the Mecademic Robot WRF at (x,y,z) and heading (alpha, beta, gamma)
@@ -922,8 +1623,7 @@ class RobotController:
 
         """
         raw_cmd = 'SetWRF'
-        cmd = self._build_command(raw_cmd,[x,y,z,alpha,beta,gamma])
-        return self.exchange_msg(cmd)
+        return self._exchange_setting(raw_cmd,[x,y,z,alpha,beta,gamma])
 
     def GetStatusRobot(self):
         """Retrieves the robot status of the Mecademic Robot.
@@ -938,7 +1638,7 @@ class RobotController:
         received = None
         while received is None:
             cmd = 'GetStatusRobot'
-            received = self.exchange_msg(cmd)
+            received = self._exchange_query(cmd)
         code_list_int = received
         return {'Activated': code_list_int[0],
                 'Homing': code_list_int[1],
@@ -961,7 +1661,7 @@ class RobotController:
         received = None
         while received is None:
             cmd = 'GetStatusGripper'
-            received = self.exchange_msg(cmd)
+            received = self._exchange_query(cmd)
         code_list_int = received
         return {'Gripper enabled': code_list_int[0],
                 'Homing state': code_list_int[1],
@@ -970,6 +1670,22 @@ class RobotController:
                 'Error state': code_list_int[4],
                 'force overload': code_list_int[5]}
 
+    def GetFwVersion(self):
+        """Retrieves the firmware version of the Mecademic Robot.
+
+        Returns
+        -------
+        version : string
+            Firmware version, 'major.minor.patch', None when not received.
+
+        """
+        cmd = 'GetFwVersion'
+        response = self.exchange_msg(cmd)
+        version = parse_version(response) if response else None
+        if version is not None:
+            self.firmware_version = version
+        return version
+
     def GetConf(self):
         """Retrieves the current inverse kinematic configuration.
 
@@ -980,7 +1696,7 @@ class RobotController:
 
         """
         cmd = 'GetConf'
-        return self.exchange_msg(cmd)
+        return self._exchange_query(cmd)
 
     def GetJoints(self):
         """Retrieves the Mecademic Robot joint angles in degrees.
@@ -992,7 +1708,7 @@ class RobotController:
 
         """
         cmd = 'GetJoints'
-        return self.exchange_msg(cmd)
+        return self._exchange_query(cmd)
 
     def GetPose(self):
         """Retrieves the current pose of the Mecademic Robot TRF with
@@ -1005,7 +1721,7 @@ class RobotController:
 
         """
         cmd = 'GetPose'
-        return self.exchange_msg(cmd)
+        return self._exchange_query(cmd)
 
     def PauseMotion(self):
         """Stops the robot movement and holds until ResumeMotion.
@@ -1017,7 +1733,7 @@ class RobotController:
 
         """
         cmd = 'PauseMotion'
-        return self.exchange_msg(cmd)
+        return self._exchange_priority(cmd)
 
     def ResumeMotion(self):
         """Resumes the robot movement after being Paused from PauseMotion
@@ -1043,7 +1759,7 @@ class RobotController:
 
         """
         cmd = 'ClearMotion'
-        return self.exchange_msg(cmd)
+        return self._exchange_priority(cmd, ahead=False)   #after the buffered moves, so that it clears them too
 
     def BrakesOn(self):
         """These commands enables the brakes of joints 1, 2 and 3,
@@ -1056,7 +1772,7 @@ class RobotController:
 
         """
         cmd = 'BrakesOn'
-        return self.exchange_msg(cmd)
+        return self._exchange_priority(cmd)
 
     def BrakesOff(self):
         """These commands disables the brakes of joints 1, 2 and 3,
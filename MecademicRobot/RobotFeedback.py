@@ -1,6 +1,51 @@
 #!/usr/bin/env python3
 import socket
-import re
+
+from MecademicRobot.FirmwareProfile import FirmwareProfile, detect_profile
+
+FEEDBACK_FIELDS = ('joints', 'cartesian', 'joints_vel', 'torque', 'accelerometer')
+
+
+def _parse_values(raw):
+    """Converts a raw feedback message to its values, without the timestamp.
+
+    Parameters
+    ----------
+    raw : bytes
+        Message such as b'[2210][timestamp,v1,...,v6]'.
+
+    Returns
+    -------
+    params : tuple of float
+        The 6 values of the message, empty when it holds an unexpected count.
+
+    """
+    start = raw.find(b'][') + 2
+    end = raw.rfind(b']')
+    param_str = raw[start:end].split(b',') if end > start else []
+    if len(param_str) == 6:
+        return tuple(float(x) for x in param_str)
+    elif len(param_str) == 7:
+        return tuple(float(x) for x in param_str[1:])   # remove timestamp
+    return ()
+
+
+class _LazyField:
+    """Feedback field stored as its raw message and parsed on first access."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance._fields[self.name]
+        if isinstance(value, bytes):
+            value = instance._fields[self.name] = _parse_values(value)
+        return value
+
+    def __set__(self, instance, value):
+        instance._fields[self.name] = value
 
 
 class RobotFeedback:
@@ -28,16 +73,26 @@ class RobotFeedback:
         Torque of joints.
     accelerometer : tuple of floats
         Acceleration of joints.
-    last_msg_chunk : string
-        Buffer of received messages.
+    last_msg_chunk : bytes
+        Incomplete message at the end of the last received data.
     version : string
         Firmware version of the Mecademic Robot.
     version_regex : list of int
         Version_regex.
+    profile : FirmwareProfile
+        Capabilities and response codes of the firmware.
+    subscribed : tuple of string
+        Fields updated by get_data, see subscribe.
 
     """
 
-    def __init__(self, address, firmware_version):
+    joints = _LazyField()
+    cartesian = _LazyField()
+    joints_vel = _LazyField()
+    torque = _LazyField()
+    accelerometer = _LazyField()
+
+    def __init__(self, address, firmware_version=None):
         """Constructor for an instance of the class Mecademic robot.
 
         Parameters
@@ -45,11 +100,15 @@ class RobotFeedback:
         address : string
             The IP address associated to the Mecademic robot.
         firmware_version : string
-            Firmware version of the Mecademic Robot.
+            Firmware version of the Mecademic Robot, None to use the version
+            cached for this address or else detect it over the control port.
 
         """
         self.address = address
         self.socket = None
+        self._fields = {}
+        self._listeners = []
+        self._metrics = None                            # set by DriverMetrics.MetricsRegistry.attach_feedback
         self.robot_status = ()
         self.gripper_status = ()
         self.joints = () #Joint Angles, angles in degrees | [theta_1, theta_2, ... theta_n]
@@ -57,14 +116,60 @@ class RobotFeedback:
         self.joints_vel =()
         self.torque =()
         self.accelerometer =()
-        self.last_msg_chunk = ''
-        a = re.search(r'(\d+)\.(\d+)\.(\d+)', firmware_version)
-        self.version = a.group(0)
-        self.version_regex = [int(a.group(1)), int(a.group(2)), int(a.group(3))]
+        self.last_msg_chunk = b''
+        if firmware_version is None:
+            self.profile = detect_profile(address)
+        else:
+            self.profile = FirmwareProfile.for_version(firmware_version)    #parsed once per version string
+        self.version = self.profile.version
+        self.version_regex = list(self.profile.version_info)
+        self._field_codes = self.profile.field_codes    #response code of each field streamed by this firmware
+        self.subscribe(*self.profile.fields)
+
+    def subscribe(self, *fields):
+        """Selects the fields get_data updates. Messages of the other fields are
+        skipped after reading their code, and the selected ones are only
+        converted to floats when read.
+
+        Parameters
+        ----------
+        fields : string
+            Names among FEEDBACK_FIELDS, all the fields streamed by the firmware when none.
+
+        """
+        unknown = set(fields) - set(FEEDBACK_FIELDS)
+        if unknown:
+            raise ValueError(f'Unknown feedback fields {sorted(unknown)}, expected some of {FEEDBACK_FIELDS}.')
+        streamed = set(self._field_codes.values())
+        self.subscribed = tuple(f for f in FEEDBACK_FIELDS if f in streamed and (not fields or f in fields))
+        self._wanted_codes = {code: field for code, field in self._field_codes.items() if field in self.subscribed}
+
+    def add_listener(self, callback):
+        """Registers a callable run by get_data after it updated subscribed fields.
 
-    def connect(self):
+        Parameters
+        ----------
+        callback : callable
+            Called with this RobotFeedback, from the thread running get_data.
+
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Unregisters a callable added with add_listener.
+
+        """
+        self._listeners.remove(callback)
+
+    def connect(self, sock=None):
         """Connects Mecademic Robot object communication to the physical Mecademic Robot.
 
+        Parameters
+        ----------
+        sock : socket
+            Socket already connected to port 10001, as opened by RobotSession,
+            None to open one.
+
         Returns
         -------
         status : boolean
@@ -72,24 +177,28 @@ class RobotFeedback:
 
         """
         try:
-            self.socket = socket.socket()
-            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY,1)
-            self.socket.settimeout(1) #1s
-            try:
-                self.socket.connect((self.address, 10001)) #connect to the robot's address
-            except socket.timeout: #catch if the robot is not connected to in time
-                raise TimeoutError
+            if sock is not None:
+                self.socket = sock
+                self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY,1)
+            else:
+                self.socket = socket.socket()
+                self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY,1)
+                self.socket.settimeout(1) #1s
+                try:
+                    self.socket.connect((self.address, 10001)) #connect to the robot's address
+                except socket.timeout: #catch if the robot is not connected to in time
+                    raise TimeoutError
             # Receive confirmation of connection
             if self.socket is None: #check that socket is not connected to nothing
                 raise RuntimeError
             self.socket.settimeout(1) #1s
             try:
-                if(self.version_regex[0] <= 7):
-                    self.get_data()
-                elif(self.version_regex[0] > 7): #RobotStatus and GripperStatus are sent on 10001 upon connecting from 8.x firmware
+                if self.profile.status_on_connect: #RobotStatus and GripperStatus are sent on 10001 upon connecting from 8.x firmware
                     msg = self.socket.recv(256).decode('ascii') #read message from robot
                     self._get_robot_status(msg)
                     self._get_gripper_status(msg)
+                else:
+                    self.get_data()
                 return True
             except socket.timeout:
                 raise RuntimeError
@@ -111,6 +220,9 @@ class RobotFeedback:
         """Receives message from the Mecademic Robot and 
         saves the values in appropriate variables.
 
+        Only the messages of the subscribed fields are kept, as raw bytes
+        converted when the field is read.
+
         Parameters
         ----------
         delay: int or float 
@@ -121,20 +233,26 @@ class RobotFeedback:
             return                                      #if no connection, nothing to receive
         self.socket.settimeout(delay)                   #set read timeout to desired delay
         try:
-            raw_msg = self.socket.recv(256).decode('ascii')         #read message from robot
-            raw_response = raw_msg.split('\x00')                    # Split the data at \x00 to manage fragmented data
+            raw_msg = self.socket.recv(256)                         #read message from robot
+            raw_response = raw_msg.split(b'\x00')                   # Split the data at \x00 to manage fragmented data
             raw_response[0] = self.last_msg_chunk + raw_response[0] # Merge the first data with last fragment from previous data stream
             self.last_msg_chunk = raw_response[-1]
+            wanted_codes = self._wanted_codes
+            fields = self._fields
+            metrics = self._metrics
+            updated = False
             for response in raw_response[:-1]:
-                if(self.version_regex[0] <= 7):
-                    self._get_joints(response)
-                    self._get_cartesian(response)
-                elif(self.version_regex[0] > 7):
-                    self._get_joints(response)
-                    self._get_cartesian(response)
-                    self._get_joints_vel(response)
-                    self._get_torque_ratio(response)
-                    self._get_accelerometer(response)
+                field = wanted_codes.get(response[:response.find(b']') + 1])    #dispatch on the [code] header only
+                if field is not None:
+                    fields[field] = response                # parsed on access by _LazyField
+                    updated = True
+                    if metrics is not None:
+                        metrics.fields[field].inc()
+            if metrics is not None:
+                metrics.reads.inc()
+            if updated:
+                for callback in self._listeners:
+                    callback(self)
         except TimeoutError:
             pass
 
@@ -172,86 +290,6 @@ class RobotFeedback:
             if response.find(resp_code) != -1:
                 self.gripper_status = self._decode_msg(response,resp_code)
 
-    def _get_joints(self, response):
-        """Gets the joint values of the variables from the message sent by the Robot.
-        Values saved to attribute joints of the object.
-
-        Parameters
-        ----------
-        response: string
-            Message received from the Robot.
-
-        """
-        code = None
-        code = self._get_response_code('JointsPose')
-        for resp_code in code:
-            if response.find(resp_code) != -1:
-                self.joints = self._decode_msg(response, resp_code)
-
-    def _get_cartesian(self, response):
-        """Gets the cartesian values of the variables from the message sent by the Robot.
-        Values saved to attribute cartesian of the object.
-
-        Parameters
-        ----------
-        response : string
-            Message received from the Robot.
-
-        """
-        code = None
-        code = self._get_response_code('CartesianPose')
-        for resp_code in code:
-            if response.find(resp_code) != -1:
-                self.cartesian = self._decode_msg(response,resp_code)
-
-    def _get_joints_vel(self, response):
-        """Gets the velocity values of the Joints from the message sent by the Robot.
-        Values saved to attribute jointsvel of the object.
-
-        Parameters
-        ----------
-        response : string
-            Message received from the Robot.
-
-        """
-        code = None
-        code = self._get_response_code('JointsVel')
-        for resp_code in code:
-            if response.find(resp_code) != -1:
-                self.joints_vel = self._decode_msg(response,resp_code)
-
-    def _get_torque_ratio(self, response):
-        """Gets the torque ratio values of the Joints from the message sent by the Robot.
-        Values saved to attribute torque of the object.
-
-        Parameters
-        ----------
-        response : string
-            Message received from the Robot.
-
-        """
-        code = None
-        code = self._get_response_code('TorqueRatio')
-        for resp_code in code:
-            if response.find(resp_code) != -1:
-                self.torque = self._decode_msg(response,resp_code)
-    
-    def _get_accelerometer(self,response):
-        """Gets the accelerometers values from the message sent by the Robot.
-        Values saved to attribute accelerometer of the object.
-
-        Parameters
-        ----------
-        response : string
-            Message received from the Robot.
-
-        """
-        code = None
-        code = self._get_response_code('AccelerometerData')
-        for resp_code in code:
-            if response.find(resp_code) != -1:
-                self.accelerometer = self._decode_msg(response,resp_code)
-
     def _get_response_code(self, param):
         """Retreives the response code for the parameters being streamed on port 100001.
 
@@ -273,28 +311,7 @@ class RobotFeedback:
             List of response codes to search for in the raw data stream.
 
         """
-        if param.find('RobotStatus') != -1:
-            return ['[2007]']
-        elif param.find('GripperStatus')!= -1:
-            return ['[2079]']
-        elif param.find('JointsPose') != -1:
-            if(self.version_regex[0] <= 7):
-                return ['[2102]']
-            elif(self.version_regex[0] > 7):
-                return ['[2026]','[2210]']
-        elif  param.find('CartesianPose') != -1:
-            if(self.version_regex[0] <= 7):
-                return ['[2103]']
-            elif(self.version_regex[0] > 7):
-                return ['[2027]','[2211]']
-        elif param.find('JointsVel') != -1:
-            return ['[2212]']
-        elif param.find('TorqueRatio') != -1:
-            return ['[2213]']
-        elif param.find('AccelerometerData') != -1:
-            return ['[2220]']
-        else:
-            return ['Invalid']
+        return list(self.profile.response_codes.get(param, ('Invalid',)))  #table of the firmware, picked once in __init__
 
     def _decode_msg(self, response, resp_code):
         """
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+import itertools
+
+import numpy as np
+
+from MecademicRobot.FrameTransform import invert_transform, matrix_to_pose, pose_to_matrix
+
+# Meca500 R3 nominal geometry in mm
+_BASE_HEIGHT = 135.0        # BRF to joint 2 axis
+_UPPER_ARM = 135.0          # joint 2 to joint 3 axis
+_FOREARM_OFFSET = 38.0      # joint 3 axis to joint 4 axis
+_FOREARM = 120.0            # joint 3 to the wrist center, along joint 4 axis
+_WRIST = 70.0               # wrist center to FRF
+
+_ELBOW_REACH = np.hypot(_FOREARM, _FOREARM_OFFSET)              # joint 3 to the wrist center
+_ELBOW_ANGLE = np.arctan2(_FOREARM_OFFSET, _FOREARM)            # angle of the forearm offset
+_ELBOW_SINGULARITY = np.degrees(_ELBOW_ANGLE) - 90.0            # joint 3 angle of the stretched arm (-72.43)
+
+# Meca500 R3 joint limits in degrees, one (min, max) row per joint
+MECA500_JOINT_LIMITS = np.array([[-175.0, 175.0],
+                                 [-70.0, 90.0],
+                                 [-135.0, 70.0],
+                                 [-170.0, 170.0],
+                                 [-115.0, 115.0],
+                                 [-180.0, 180.0]])
+
+# All the (c1, c3, c5) configurations, in the order inverse() tries them
+CONFIGURATIONS = np.array(list(itertools.product((1, -1), repeat=3)), dtype=float)
+
+_ARM_CONFIGURATIONS = CONFIGURATIONS[::2, :2]        # the (c1, c3) pairs
+
+# Rotation from the wrist chain axes (joint 6 along x) to the FRF (z along joint 6)
+_FLANGE_ROTATION = np.array([[0.0, 0.0, 1.0],
+                             [0.0, 1.0, 0.0],
+                             [-1.0, 0.0, 0.0]])
+
+
+def _rot_z(theta):
+    c, s = np.cos(theta), np.sin(theta)
+    rotation = np.zeros(np.shape(theta) + (3, 3))
+    rotation[..., 0, 0], rotation[..., 0, 1] = c, -s
+    rotation[..., 1, 0], rotation[..., 1, 1] = s, c
+    rotation[..., 2, 2] = 1.0
+    return rotation
+
+
+def _rot_y(theta):
+    c, s = np.cos(theta), np.sin(theta)
+    rotation = np.zeros(np.shape(theta) + (3, 3))
+    rotation[..., 0, 0], rotation[..., 0, 2] = c, s
+    rotation[..., 1, 1] = 1.0
+    rotation[..., 2, 0], rotation[..., 2, 2] = -s, c
+    return rotation
+
+
+def _rot_x(theta):
+    c, s = np.cos(theta), np.sin(theta)
+    rotation = np.zeros(np.shape(theta) + (3, 3))
+    rotation[..., 0, 0] = 1.0
+    rotation[..., 1, 1], rotation[..., 1, 2] = c, -s
+    rotation[..., 2, 1], rotation[..., 2, 2] = s, c
+    return rotation
+
+
+class Meca500Kinematics:
+    """Vectorized forward and inverse kinematics of the Meca500 R3, computed
+    on the host to check poses before they are sent to the robot.
+
+    Joint angles are in degrees, poses are (x, y, z, alpha, beta, gamma) of
+    the TRF with respect to the WRF in mm and degrees, like the robot commands.
+
+    Attributes
+    ----------
+    joint_limits : array of float, shape (6, 2)
+        Minimum and maximum angle of each joint in degrees.
+    trf : array of float, shape (4, 4)
+        Transform of the TRF with respect to the FRF.
+    wrf : array of float, shape (4, 4)
+        Transform of the WRF with respect to the BRF.
+
+    """
+
+    def __init__(self, joint_limits=MECA500_JOINT_LIMITS):
+        """Constructor for a kinematic model with the TRF and WRF at their default.
+
+        Parameters
+        ----------
+        joint_limits : array_like of float, shape (6, 2)
+            Minimum and maximum angle of each joint in degrees.
+
+        """
+        self.joint_limits = np.array(joint_limits, dtype=float)
+        self.trf = np.eye(4)
+        self.wrf = np.eye(4)
+        self._trf_inv = np.eye(4)
+        self._wrf_inv = np.eye(4)
+
+    def set_trf(self, x, y, z, alpha, beta, gamma):
+        """Sets the TRF with respect to the FRF, same arguments as RobotController.SetTRF.
+
+        """
+        self.trf = pose_to_matrix((x, y, z, alpha, beta, gamma))
+        self._trf_inv = invert_transform(self.trf)
+
+    def set_wrf(self, x, y, z, alpha, beta, gamma):
+        """Sets the WRF with respect to the BRF, same arguments as RobotController.SetWRF.
+
+        """
+        self.wrf = pose_to_matrix((x, y, z, alpha, beta, gamma))
+        self._wrf_inv = invert_transform(self.wrf)
+
+    def sync_frames(self, robot):
+        """Copies the TRF and WRF last sent by a RobotController.
+
+        Parameters
+        ----------
+        robot : RobotController
+            Controller whose settings hold the frames.
+
+        """
+        self.set_trf(*robot.settings.get('SetTRF', (0, 0, 0, 0, 0, 0)))
+        self.set_wrf(*robot.settings.get('SetWRF', (0, 0, 0, 0, 0, 0)))
+
+    def within_limits(self, joints):
+        """Checks joint sets against the joint limits.
+
+        Parameters
+        ----------
+        joints : array_like of float, shape (..., 6)
+            Joint angles in degrees.
+
+        Returns
+        -------
+        valid : array of bool, shape (...)
+            True where every joint is within its limits.
+
+        """
+        joints = np.asarray(joints, dtype=float)
+        return np.all((joints >= self.joint_limits[:, 0]) & (joints <= self.joint_limits[:, 1]), axis=-1)
+
+    def flange_transforms(self, joints):
+        """Computes the FRF with respect to the BRF.
+
+        Parameters
+        ----------
+        joints : array_like of float, shape (..., 6)
+            Joint angles in degrees.
+
+        Returns
+        -------
+        matrices : array of float, shape (..., 4, 4)
+            Homogeneous transforms of the FRF.
+
+        """
+        theta = np.radians(np.asarray(joints, dtype=float))
+        theta_1, theta_2, theta_23 = theta[..., 0], theta[..., 1], theta[..., 1] + theta[..., 2]
+        reach = (_UPPER_ARM * np.sin(theta_2) + _FOREARM * np.cos(theta_23)
+                 + _FOREARM_OFFSET * np.sin(theta_23))
+        height = (_BASE_HEIGHT + _UPPER_ARM * np.cos(theta_2) - _FOREARM * np.sin(theta_23)
+                  + _FOREARM_OFFSET * np.cos(theta_23))
+        wrist = np.stack((reach * np.cos(theta_1), reach * np.sin(theta_1), height), axis=-1)
+        chain = (_rot_z(theta_1) @ _rot_y(theta_23) @ _rot_x(theta[..., 3])
+                 @ _rot_y(theta[..., 4]) @ _rot_x(theta[..., 5]))
+        matrices = np.zeros(theta.shape[:-1] + (4, 4))
+        matrices[..., :3, :3] = chain @ _FLANGE_ROTATION
+        matrices[..., :3, 3] = wrist + _WRIST * chain[..., :, 0]
+        matrices[..., 3, 3] = 1.0
+        return matrices
+
+    def forward(self, joints):
+        """Computes the pose of the TRF with respect to the WRF.
+
+        Parameters
+        ----------
+        joints : array_like of float, shape (..., 6)
+            Joint angles in degrees.
+
+        Returns
+        -------
+        poses : array of float, shape (..., 6)
+            Poses reached with these joint angles.
+
+        """
+        return matrix_to_pose(self._wrf_inv @ self.flange_transforms(joints) @ self.trf)
+
+    def configuration(self, joints):
+        """Computes the inverse kinematic configuration of joint sets, as GetConf.
+
+        Parameters
+        ----------
+        joints : array_like of float, shape (..., 6)
+            Joint angles in degrees.
+
+        Returns
+        -------
+        conf : array of int, shape (..., 3)
+            Configuration parameters (c1, c3, c5), each -1 or 1.
+
+        """
+        joints = np.asarray(joints, dtype=float)
+        theta_2, theta_23 = np.radians(joints[..., 1]), np.radians(joints[..., 1] + joints[..., 2])
+        reach = (_UPPER_ARM * np.sin(theta_2) + _FOREARM * np.cos(theta_23)
+                 + _FOREARM_OFFSET * np.sin(theta_23))
+        conf = np.stack((reach, joints[..., 2] - _ELBOW_SINGULARITY, joints[..., 4]), axis=-1)
+        return np.where(conf < 0, -1, 1)
+
+    def singularity_distances(self, joints):
+        """Computes how far joint sets are from the three singularities of the arm.
+
+        Parameters
+        ----------
+        joints : array_like of float, shape (..., 6)
+            Joint angles in degrees.
+
+        Returns
+        -------
+        distances : array of float, shape (..., 3)
+            Distance of the wrist center to the joint 1 axis in mm (shoulder),
+            of joint 3 to the stretched arm angle in degrees (elbow) and of
+            joint 5 to 0 in degrees (wrist).
+
+        """
+        joints = np.asarray(joints, dtype=float)
+        theta_2, theta_23 = np.radians(joints[..., 1]), np.radians(joints[..., 1] + joints[..., 2])
+        reach = (_UPPER_ARM * np.sin(theta_2) + _FOREARM * np.cos(theta_23)
+                 + _FOREARM_OFFSET * np.sin(theta_23))
+        return np.abs(np.stack((reach, joints[..., 2] - _ELBOW_SINGULARITY, joints[..., 4]), axis=-1))
+
+    def inverse_all(self, poses):
+        """Computes the joint angles of poses in the 8 configurations at once.
+
+        Parameters
+        ----------
+        poses : array_like of float, shape (..., 6)
+            Poses of the TRF with respect to the WRF.
+
+        Returns
+        -------
+        joints : array of float, shape (..., 8, 6)
+            Joint angles in degrees for each configuration of CONFIGURATIONS.
+        valid : array of bool, shape (..., 8)
+            True where the solution exists and is within the joint limits.
+
+        """
+        flange = self.wrf @ pose_to_matrix(poses) @ self._trf_inv
+        chain = flange[..., :3, :3] @ _FLANGE_ROTATION.T
+        wrist = flange[..., :3, 3] - _WRIST * chain[..., :, 0]
+        batch = wrist.shape[:-1]
+        c1, c3 = _ARM_CONFIGURATIONS[:, 0], _ARM_CONFIGURATIONS[:, 1]
+
+        # Shoulder and elbow, solved in the arm plane for the 4 (c1, c3) pairs
+        x, y = wrist[..., 0, np.newaxis], wrist[..., 1, np.newaxis]
+        theta_1 = np.arctan2(y, x) + np.where(c1 < 0, np.pi, 0.0)
+        theta_1 = np.where(theta_1 > np.pi, theta_1 - 2 * np.pi, theta_1)
+        reach = c1 * np.hypot(x, y)
+        height = wrist[..., 2, np.newaxis] - _BASE_HEIGHT
+        elbow = ((reach ** 2 + height ** 2 - _UPPER_ARM ** 2 - _ELBOW_REACH ** 2)
+                 / (2 * _UPPER_ARM * _ELBOW_REACH))
+        reachable = np.abs(elbow) <= 1.0
+        delta = np.arcsin(np.clip(elbow, -1.0, 1.0))
+        delta = np.where(c3 > 0, delta, np.pi - delta)
+        theta_3 = _ELBOW_ANGLE - delta
+        theta_3 = np.where(theta_3 < -np.pi, theta_3 + 2 * np.pi, theta_3)
+        a = _UPPER_ARM + _ELBOW_REACH * np.sin(delta)
+        b = _ELBOW_REACH * np.cos(delta)
+        theta_2 = np.arctan2(a * reach - b * height, a * height + b * reach)
+
+        # Wrist, from the rotation left once the arm is placed: Ry(-theta_23) @ Rz(-theta_1) @ chain
+        row_0, row_1, row_2 = (chain[..., np.newaxis, i, :] for i in range(3))
+        c_1, s_1 = np.cos(theta_1)[..., np.newaxis], np.sin(theta_1)[..., np.newaxis]
+        c_23, s_23 = np.cos(theta_2 + theta_3)[..., np.newaxis], np.sin(theta_2 + theta_3)[..., np.newaxis]
+        row_x = c_1 * row_0 + s_1 * row_1
+        row_y = c_1 * row_1 - s_1 * row_0
+        wrist_0 = c_23 * row_x - s_23 * row_2
+        wrist_2 = s_23 * row_x + c_23 * row_2
+        theta_5 = np.arccos(np.clip(wrist_0[..., 0], -1.0, 1.0))      # c5 = 1 branch
+        aligned = np.sin(theta_5) < 1e-9        # wrist singularity, joints 4 and 6 coupled
+        theta_4 = np.where(aligned, 0.0, np.arctan2(row_y[..., 0], -wrist_2[..., 0]))
+        theta_6 = np.where(aligned, np.arctan2(wrist_2[..., 1], row_y[..., 1]),
+                           np.arctan2(wrist_0[..., 1], wrist_0[..., 2]))
+
+        # The c5 = -1 branch mirrors joint 5 and turns joints 4 and 6 by half a turn
+        joints = np.empty(batch + (4, 2, 6))
+        joints[..., 0] = theta_1[..., np.newaxis]
+        joints[..., 1] = theta_2[..., np.newaxis]
+        joints[..., 2] = theta_3[..., np.newaxis]
+        joints[..., 0, 3] = theta_4
+        joints[..., 0, 4] = theta_5
+        joints[..., 0, 5] = theta_6
+        joints[..., 1, 3] = np.where(aligned, theta_4, theta_4 - np.copysign(np.pi, theta_4))
+        joints[..., 1, 4] = -theta_5
+        joints[..., 1, 5] = np.where(aligned, theta_6, theta_6 - np.copysign(np.pi, theta_6))
+        joints = np.degrees(joints).reshape(batch + (8, 6))
+        return joints, np.repeat(reachable, 2, axis=-1) & self.within_limits(joints)
+
+    def inverse(self, poses, conf=None):
+        """Computes the joint angles reaching poses.
+
+        Parameters
+        ----------
+        poses : array_like of float, shape (..., 6)
+            Poses of the TRF with respect to the WRF.
+        conf : array_like of int, shape (3,) or (..., 3)
+            Configuration (c1, c3, c5) to use as with SetConf, None to take the
+            first valid configuration of CONFIGURATIONS.
+
+        Returns
+        -------
+        joints : array of float, shape (..., 6)
+            Joint angles in degrees, NaN where no valid solution exists.
+        valid : array of bool, shape (...)
+            True where the pose is reachable.
+
+        """
+        joints, valid = self.inverse_all(poses)
+        if conf is None:
+            index = np.argmax(valid, axis=-1)
+        else:
+            conf = np.asarray(conf)
+            index = (conf[..., 0] < 0) * 4 + (conf[..., 1] < 0) * 2 + (conf[..., 2] < 0)
+            index = np.broadcast_to(index, valid.shape[:-1])
+        valid = np.take_along_axis(valid, index[..., np.newaxis], axis=-1)[..., 0]
+        joints = np.take_along_axis(joints, index[..., np.newaxis, np.newaxis], axis=-2)[..., 0, :]
+        return np.where(valid[..., np.newaxis], joints, np.nan), valid
+
+    def is_reachable(self, poses, conf=None):
+        """Checks whether poses can be reached, in a given configuration or in any.
+
+        Parameters
+        ----------
+        poses : array_like of float, shape (..., 6)
+            Poses of the TRF with respect to the WRF.
+        conf : array_like of int, shape (3,) or (..., 3)
+            Configuration (c1, c3, c5) to check, None for any configuration.
+
+        Returns
+        -------
+        reachable : array of bool, shape (...)
+            True where the pose is reachable.
+
+        """
+        return self.inverse(poses, conf)[1]
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+import errno
+import itertools
+import selectors
+import socket
+import threading
+import time
+
+from MecademicRobot.FirmwareProfile import cached_profile
+from MecademicRobot.RobotController import RobotController
+from MecademicRobot.RobotFeedback import RobotFeedback
+
+CONTROL_PORT = 10000
+FEEDBACK_PORT = 10001
+
+_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY)
+
+
+def _race_connect(address, port, stagger=0.25, timeout=2.0, attempts=3):
+    """Opens a TCP connection, starting a new attempt every stagger seconds
+    until one completes, in the manner of happy eyeballs (RFC 8305).
+
+    A lost SYN then costs stagger instead of the 1 s retransmission timeout
+    of the system. Attempts alternate between the address families the
+    address resolves to, and the first to complete wins, the others are closed.
+    Each address has at most one attempt pending: the control port takes a
+    single client, so a retry closes the pending attempt to its address
+    first, lest two handshakes complete and the robot answer the second
+    with [3001].
+
+    Parameters
+    ----------
+    address : string
+        Host name or IP address.
+    port : int
+        TCP port.
+    stagger : float
+        Time in seconds between attempts.
+    timeout : float
+        Time in seconds after which the connection is given up.
+    attempts : int
+        Number of attempts per resolved address, one at a time.
+
+    Returns
+    -------
+    sock : socket
+        Connected blocking socket.
+
+    """
+    infos = socket.getaddrinfo(address, port, type=socket.SOCK_STREAM)
+    families = {}
+    for info in infos:
+        families.setdefault(info[0], []).append(info)
+    interleaved = [info for group in itertools.zip_longest(*families.values()) for info in group if info]
+    candidates = iter(interleaved * attempts)
+    deadline = time.monotonic() + timeout
+    selector = selectors.DefaultSelector()
+    pending = {}                                    # attempt in progress of each address
+    next_start = time.monotonic()
+    last_error = None
+    winner = None
+    try:
+        while winner is None:
+            now = time.monotonic()
+            if now >= deadline:
+                raise TimeoutError(f'Connection to {address}:{port} timed out.')
+            if now >= next_start:
+                info = next(candidates, None)
+                if info is None:
+                    next_start = deadline
+                    if not selector.get_map():
+                        raise ConnectionError(f'Cannot connect to {address}:{port}: {last_error}')
+                else:
+                    family, type_, proto, _, sockaddr = info
+                    previous = pending.pop(sockaddr, None)
+                    if previous is not None:        # presumably a lost SYN, start this address over
+                        selector.unregister(previous)
+                        previous.close()
+                    sock = socket.socket(family, type_, proto)
+                    sock.setblocking(False)
+                    error = sock.connect_ex(sockaddr)
+                    if error == 0:
+                        winner = sock
+                        break
+                    if error in _IN_PROGRESS:
+                        selector.register(sock, selectors.EVENT_WRITE, sockaddr)
+                        pending[sockaddr] = sock
+                        next_start = now + stagger
+                    else:                           # refused or unreachable, try the next one now
+                        sock.close()
+                        last_error = OSError(error, errno.errorcode.get(error, str(error)))
+                        continue
+            for key, _ in selector.select(max(0.0, min(next_start, deadline) - time.monotonic())):
+                sock = key.fileobj
+                selector.unregister(sock)
+                del pending[key.data]
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error == 0:
+                    winner = sock
+                    break
+                sock.close()
+                last_error = OSError(error, errno.errorcode.get(error, str(error)))
+                next_start = time.monotonic()       # failed fast, do not wait for the stagger
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+    winner.setblocking(True)
+    return winner
+
+
+class RobotSession:
+    """Connected RobotController and RobotFeedback of a robot, brought up
+    together by connect.
+
+    Attributes
+    ----------
+    address : string
+        IP address of the robot.
+    robot : RobotController
+        Controller connected to the control port.
+    feedback : RobotFeedback
+        Feedback connected to port 10001, None when not requested.
+    timings : dict
+        Duration in seconds of each phase of connect: 'control_connect' and
+        'feedback_connect' for the TCP connections opened at the same time,
+        'greeting' until the robot accepted the control connection,
+        'firmware' to find the firmware version when not given,
+        'feedback_ready' until the feedback connection is usable, and 'total'.
+
+    """
+
+    def __init__(self, address, robot, feedback, timings):
+        self.address = address
+        self.robot = robot
+        self.feedback = feedback
+        self.timings = timings
+
+    @classmethod
+    def connect(cls, address, firmware_version=None, feedback=True, stagger=0.25, timeout=2.0):
+        """Connects the control and feedback channels of a robot in parallel.
+
+        The feedback connection is opened while the control connection
+        waits for its greeting. The firmware version, when not given, is
+        taken from the greeting, else from the cache, else from GetFwVersion
+        on the control connection, so no extra connection is needed.
+
+        Parameters
+        ----------
+        address : string
+            IP address of the robot.
+        firmware_version : string
+            Firmware version of the robot, None to find it.
+        feedback : boolean
+            Whether to connect a RobotFeedback as well.
+        stagger : float
+            Time in seconds between the connection attempts of a channel.
+        timeout : float
+            Time in seconds given to each TCP connection.
+
+        Returns
+        -------
+        session : RobotSession
+            Session with both channels ready.
+
+        """
+        start = time.perf_counter()
+        timings = {}
+        opened = {}
+
+        def open_feedback():
+            try:
+                opened['feedback'] = _race_connect(address, FEEDBACK_PORT, stagger, timeout)
+            except OSError as error:
+                opened['feedback'] = error
+            timings['feedback_connect'] = time.perf_counter() - start
+
+        thread = None
+        if feedback:
+            thread = threading.Thread(target=open_feedback, name='RobotSession', daemon=True)
+            thread.start()
+        robot = RobotController(address)
+        try:
+            control_socket = _race_connect(address, CONTROL_PORT, stagger, timeout)
+            timings['control_connect'] = time.perf_counter() - start
+            phase = time.perf_counter()
+            if not robot.connect(control_socket):
+                raise ConnectionError(f'The robot at {address} refused the control connection.')
+            timings['greeting'] = time.perf_counter() - phase
+            phase = time.perf_counter()
+            if feedback and firmware_version is None:
+                profile = cached_profile(address)
+                # the greeting is free and current, the cache may predate a firmware update
+                firmware_version = robot.firmware_version or (profile and profile.version) or robot.GetFwVersion()
+                if firmware_version is None:
+                    raise ConnectionError(f'The robot at {address} did not report its firmware version.')
+            timings['firmware'] = time.perf_counter() - phase
+            robot_feedback = None
+            if feedback:
+                thread.join()
+                if isinstance(opened['feedback'], Exception):
+                    raise opened['feedback']
+                phase = time.perf_counter()
+                robot_feedback = RobotFeedback(address, firmware_version)
+                if not robot_feedback.connect(opened.pop('feedback')):
+                    raise ConnectionError(f'The robot at {address} did not answer on the feedback port.')
+                timings['feedback_ready'] = time.perf_counter() - phase
+        except BaseException:
+            robot.disconnect()
+            if thread is not None:
+                thread.join()
+                if isinstance(opened.get('feedback'), socket.socket):
+                    opened['feedback'].close()
+            raise
+        timings['total'] = time.perf_counter() - start
+        return cls(address, robot, robot_feedback, timings)
+
+    def close(self):
+        """Disconnects both channels.
+
+        """
+        if self.feedback is not None:
+            self.feedback.disconnect()
+        self.robot.disconnect()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def connect_fleet(addresses, **kwargs):
+    """Connects many robots at once, one thread per robot.
+
+    Parameters
+    ----------
+    addresses : list of string
+        IP addresses of the robots.
+    kwargs
+        Passed to RobotSession.connect.
+
+    Returns
+    -------
+    sessions : dict
+        RobotSession of each address, or the exception raised connecting it.
+
+    """
+    sessions = {}
+
+    def bring_up(address):
+        try:
+            sessions[address] = RobotSession.connect(address, **kwargs)
+        except Exception as error:
+            sessions[address] = error
+
+    threads = [threading.Thread(target=bring_up, args=(address,), daemon=True) for address in addresses]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sessions
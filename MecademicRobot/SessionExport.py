@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from MecademicRobot.FeedbackRecording import FeedbackRecording
+from MecademicRobot.SharedFeedback import _FIELD_SLICES
+
+# One column per channel: time, then joints_1 to joints_6, cartesian_1 to cartesian_6 and so on
+COLUMNS = ('time',) + tuple(f'{field}_{channel}' for field in _FIELD_SLICES for channel in range(1, 7))
+
+_MANIFEST = 'manifest.json'
+_FORMAT = 1
+
+
+def _field_columns(field):
+    return [f'{field}_{channel}' for channel in range(1, 7)]
+
+
+def _write_chunk(directory, name, columns):
+    """Saves the columns of a chunk as .npy files and returns its manifest entry."""
+    os.makedirs(os.path.join(directory, name), exist_ok=True)
+    stats = {}
+    for column, values in columns.items():
+        np.save(os.path.join(directory, name, f'{column}.npy'), values)
+        if values.dtype.kind == 'f':
+            present = values[~np.isnan(values)]
+            stats[column] = [float(present.min()), float(present.max())] if len(present) else None
+    return {'name': name, 'rows': len(next(iter(columns.values()))), 'stats': stats}
+
+
+def export_session(recording_path, directory, commands=None, chunk_size=65536):
+    """Exports a feedback recording, and the commands sent meanwhile, as
+    columnar chunks.
+
+    Each chunk is a directory holding one .npy file per column of COLUMNS,
+    loadable with numpy.load(mmap_mode='r') column by column. The manifest
+    lists the chunks with their number of rows and the minimum and maximum
+    of each column, time included, so that readers skip the chunks outside
+    a time range or without interesting values.
+
+    Parameters
+    ----------
+    recording_path : string
+        Path of a recording written by FeedbackRecorder.
+    directory : string
+        Directory to create the export in.
+    commands : iterable of (float, string)
+        Time and text of the commands sent during the recording, such as
+        (time.time(), 'MoveJoints(0,0,0,0,0,0)'), None when not recorded.
+    chunk_size : int
+        Number of samples per chunk.
+
+    Returns
+    -------
+    manifest : dict
+        Contents of the manifest written to directory.
+
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = {'format': _FORMAT, 'columns': list(COLUMNS), 'chunks': [], 'commands': []}
+    pending = []
+    pending_rows = 0
+
+    def flush(rows):
+        nonlocal pending, pending_rows
+        samples = np.concatenate(pending)
+        chunk, rest = samples[:rows], samples[rows:]
+        pending, pending_rows = ([rest], len(rest)) if len(rest) else ([], 0)
+        columns = {column: np.ascontiguousarray(chunk[:, index]) for index, column in enumerate(COLUMNS)}
+        name = f'chunk_{len(manifest["chunks"]):05d}'
+        manifest['chunks'].append(_write_chunk(directory, name, columns))
+
+    with FeedbackRecording(recording_path, cache_blocks=1) as recording:
+        for number in range(len(recording.index)):
+            pending.append(recording.block(number))
+            pending_rows += len(pending[-1])
+            while pending_rows >= chunk_size:
+                flush(chunk_size)
+        if pending_rows:
+            flush(pending_rows)
+    if commands is not None:
+        commands = sorted(commands)
+        for start in range(0, len(commands), chunk_size):
+            times, texts = zip(*commands[start:start + chunk_size])
+            columns = {'time': np.array(times, dtype=float), 'command': np.array(texts, dtype=str)}
+            name = f'commands_{len(manifest["commands"]):05d}'
+            manifest['commands'].append(_write_chunk(directory, name, columns))
+    with open(os.path.join(directory, _MANIFEST), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    return manifest
+
+
+def read_manifest(directory):
+    """Returns the manifest of an export.
+
+    Parameters
+    ----------
+    directory : string
+        Directory written by export_session.
+
+    Returns
+    -------
+    manifest : dict
+        'columns', 'chunks' and 'commands', each chunk with its 'name',
+        'rows' and the [min, max] 'stats' of each column.
+
+    """
+    with open(os.path.join(directory, _MANIFEST)) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get('format') != _FORMAT:
+        raise ValueError(f'{directory} holds an export of format {manifest.get("format")}, expected {_FORMAT}.')
+    return manifest
+
+
+def _in_range(chunk, start, end):
+    first, last = chunk['stats']['time'] or (np.inf, -np.inf)
+    return last >= start and first <= end
+
+
+def load_export(directory, columns=None, start=None, end=None, commands=False):
+    """Loads columns of an export between two times, reading only the chunks
+    whose time range overlaps. The result builds a pandas DataFrame directly,
+    pandas.DataFrame(load_export(directory)).
+
+    Parameters
+    ----------
+    directory : string
+        Directory written by export_session.
+    columns : list of string
+        Columns among COLUMNS, all when None. The time column is always loaded.
+    start : float
+        First time included, from the beginning when None.
+    end : float
+        Last time included, up to the end when None.
+    commands : boolean
+        Whether to load the command chunks, with columns 'time' and 'command',
+        instead of the feedback ones.
+
+    Returns
+    -------
+    data : dict
+        Array of each column.
+
+    """
+    manifest = read_manifest(directory)
+    start = -np.inf if start is None else start
+    end = np.inf if end is None else end
+    if commands:
+        chunks, columns = manifest['commands'], ['time', 'command']
+    else:
+        chunks = manifest['chunks']
+        columns = ['time'] + [column for column in (columns or COLUMNS) if column != 'time']
+    parts = {column: [] for column in columns}
+    for chunk in chunks:
+        if not _in_range(chunk, start, end):
+            continue
+        times = np.load(os.path.join(directory, chunk['name'], 'time.npy'), mmap_mode='r')
+        keep = (times >= start) & (times <= end)
+        for column in columns:
+            values = np.load(os.path.join(directory, chunk['name'], f'{column}.npy'), mmap_mode='r')
+            parts[column].append(np.asarray(values[keep]))
+    return {column: np.concatenate(values) if values else np.empty(0) for column, values in parts.items()}
+
+
+def _chunk_columns(directory, chunk, columns):
+    return np.column_stack([np.load(os.path.join(directory, chunk['name'], f'{column}.npy')) for column in columns])
+
+
+def _spans(flags, times):
+    """Returns the (start, end) times of the runs of True in flags."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], flags.astype(np.int8), [0]))))
+    return [(float(times[begin]), float(times[stop - 1])) for begin, stop in zip(edges[::2], edges[1::2])]
+
+
+def analyze_session(directory, idle_speed=0.01, min_idle=1.0, torque_limit=None, cycle_command=None):
+    """Computes cycle times, peak torques and idle gaps of an export.
+
+    Chunk statistics answer without reading data where they can: peak
+    torques come from the torque min and max of each chunk, chunks whose
+    joint velocities all stay within idle_speed are idle as a whole, chunks
+    where a joint velocity never comes near zero are busy as a whole, and
+    chunks whose torques stay within torque_limit are not searched for
+    overloads.
+
+    Parameters
+    ----------
+    directory : string
+        Directory written by export_session.
+    idle_speed : float
+        Joint velocity in deg/s below which the robot is idle.
+    min_idle : float
+        Shortest idle time in seconds reported as a gap.
+    torque_limit : float
+        Torque ratio in percent whose crossings are reported, None to skip.
+    cycle_command : string
+        Name of the command starting each cycle, such as 'MoveJoints', to
+        time cycles between its occurrences. Cycles are the motions between
+        idle gaps when None or when no command was exported.
+
+    Returns
+    -------
+    analysis : dict
+        'directory', 'duration', 'cycle_times', 'peak_torque' of each joint,
+        'idle_gaps' as (start, end) times, 'overloads' as (time, joint,
+        torque) when torque_limit is given, 'chunks_read' and 'chunks_skipped'.
+
+    """
+    manifest = read_manifest(directory)
+    chunks = [chunk for chunk in manifest['chunks'] if chunk['stats']['time'] is not None]
+    torque_columns = _field_columns('torque')
+    velocity_columns = _field_columns('joints_vel')
+    read = skipped = 0
+    peak = np.zeros(6)
+    for chunk in chunks:
+        for joint, column in enumerate(torque_columns):
+            if chunk['stats'].get(column) is not None:
+                peak[joint] = max(peak[joint], *np.abs(chunk['stats'][column]))
+    idle_spans = []
+    overloads = []
+    for chunk in chunks:
+        stats = chunk['stats']
+        velocity_stats = [stats.get(column) for column in velocity_columns]
+        needs_velocity = True
+        if all(bounds is not None for bounds in velocity_stats):
+            if all(-idle_speed <= low and high <= idle_speed for low, high in velocity_stats):
+                idle_spans.append(tuple(stats['time']))
+                needs_velocity = False
+            elif any(low > idle_speed or high < -idle_speed for low, high in velocity_stats):
+                needs_velocity = False              # a joint moves throughout the chunk
+        torque_stats = [stats.get(column) for column in torque_columns]
+        needs_torque = torque_limit is not None and any(
+                bounds is not None and max(abs(bounds[0]), abs(bounds[1])) > torque_limit for bounds in torque_stats)
+        if not needs_velocity and not needs_torque:
+            skipped += 1
+            continue
+        read += 1
+        times = np.load(os.path.join(directory, chunk['name'], 'time.npy'))
+        if needs_velocity:
+            if all(bounds is not None for bounds in velocity_stats):
+                speed = np.abs(_chunk_columns(directory, chunk, velocity_columns)).max(axis=1)
+            else:                                   # firmware without velocity feedback, differentiate the joints
+                joints = _chunk_columns(directory, chunk, _field_columns('joints'))
+                speed = np.abs(np.gradient(joints, times, axis=0)).max(axis=1)
+            idle_spans.extend(_spans(speed <= idle_speed, times))
+        if needs_torque:
+            torques = _chunk_columns(directory, chunk, torque_columns)
+            rows, joints = np.nonzero(np.abs(torques) > torque_limit)
+            overloads.extend((float(times[row]), int(joint), float(torques[row, joint])) for row, joint in zip(rows, joints))
+    # Merge the idle spans that continue across chunks or are split by motion jitter
+    merged = []
+    for begin, stop in sorted(idle_spans):
+        if merged and begin - merged[-1][1] <= 0.1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((begin, stop))
+    idle_gaps = [(begin, stop) for begin, stop in merged if stop - begin >= min_idle]
+    first = chunks[0]['stats']['time'][0] if chunks else 0.0
+    last = chunks[-1]['stats']['time'][1] if chunks else 0.0
+    cycle_times = []
+    if cycle_command is not None and manifest['commands']:
+        commands = load_export(directory, commands=True)
+        starts = commands['time'][np.char.startswith(commands['command'], cycle_command)]
+        cycle_times = np.diff(starts).tolist()
+    else:
+        moving_from = first
+        for begin, stop in idle_gaps:
+            if begin > moving_from:
+                cycle_times.append(begin - moving_from)
+            moving_from = stop
+        if last > moving_from and idle_gaps:
+            cycle_times.append(last - moving_from)
+    return {'directory': directory, 'duration': last - first, 'cycle_times': cycle_times,
+            'peak_torque': tuple(peak.tolist()), 'idle_gaps': idle_gaps, 'overloads': overloads,
+            'chunks_read': read, 'chunks_skipped': skipped}
+
+
+def _analyze_one(arguments):
+    directory, kwargs = arguments
+    try:
+        return analyze_session(directory, **kwargs)
+    except Exception as error:
+        return error
+
+
+def analyze_sessions(directories, max_parallel=None, **kwargs):
+    """Runs analyze_session on many exports in parallel processes.
+
+    Parameters
+    ----------
+    directories : list of string
+        Directories written by export_session.
+    max_parallel : int
+        Number of processes, the number of processors when None.
+    kwargs
+        Passed to analyze_session.
+
+    Returns
+    -------
+    analyses : dict
+        Result of analyze_session for each directory, or the exception it raised.
+
+    """
+    with ProcessPoolExecutor(max_workers=max_parallel) as executor:
+        results = list(executor.map(_analyze_one, [(directory, kwargs) for directory in directories]))
+    return dict(zip(directories, results))
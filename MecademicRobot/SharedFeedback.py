@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from MecademicRobot.RobotFeedback import FEEDBACK_FIELDS
+
+# Sample layout: monotonic time of publication then 6 values per feedback field, NaN when not received
+SAMPLE_SIZE = 1 + 6 * len(FEEDBACK_FIELDS)
+_FIELD_SLICES = {field: slice(1 + 6 * i, 7 + 6 * i) for i, field in enumerate(FEEDBACK_FIELDS)}
+
+# Header of int64: sequence counter, samples published, capacity, then padding to a cache line
+_SEQUENCE, _COUNT, _CAPACITY = 0, 1, 2
+_HEADER_SIZE = 8
+
+
+def _attach(name):
+    """Attaches to an existing segment without letting this process' resource
+    tracker unlink it at exit, which would pull it from under the publisher.
+
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:                   # track is only accepted from Python 3.13
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+
+class FeedbackPublisher:
+    """Publishes the feedback of a RobotFeedback to a shared memory segment,
+    as the latest sample and a ring of recent ones, for FeedbackReader
+    instances in other processes.
+
+    Writes are guarded by a seqlock: the sequence counter is odd while a
+    sample is written, so readers never block the publisher and retry when
+    they catch a write in progress. There must be a single publisher.
+
+    Attributes
+    ----------
+    name : string
+        Name of the shared memory segment, passed to FeedbackReader.
+    capacity : int
+        Number of samples kept in the ring.
+
+    """
+
+    def __init__(self, name=None, capacity=1024):
+        """Constructor for a publisher, creating the segment.
+
+        Parameters
+        ----------
+        name : string
+            Name of the segment, chosen by the system when None.
+        capacity : int
+            Number of samples kept in the ring.
+
+        """
+        self.capacity = capacity
+        size = 8 * (_HEADER_SIZE + capacity * SAMPLE_SIZE)
+        self._segment = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = self._segment.name
+        self._header = np.ndarray((_HEADER_SIZE,), dtype=np.int64, buffer=self._segment.buf)
+        self._ring = np.ndarray((capacity, SAMPLE_SIZE), dtype=np.float64, buffer=self._segment.buf,
+                                offset=8 * _HEADER_SIZE)
+        self._header[:] = 0
+        self._header[_CAPACITY] = capacity
+        self._ring[:] = np.nan
+
+    def publish(self, feedback):
+        """Writes the current fields of a RobotFeedback as the latest sample.
+        Meant to be registered with RobotFeedback.add_listener.
+
+        Parameters
+        ----------
+        feedback : RobotFeedback
+            Feedback whose subscribed fields are published.
+
+        """
+        header = self._header
+        sample = self._ring[header[_COUNT] % self.capacity]
+        header[_SEQUENCE] += 1                      # odd, write in progress
+        sample[:] = np.nan
+        sample[0] = time.monotonic()
+        for field in feedback.subscribed:
+            values = getattr(feedback, field)
+            if len(values) == 6:
+                sample[_FIELD_SLICES[field]] = values
+        header[_COUNT] += 1
+        header[_SEQUENCE] += 1                      # even, sample complete
+
+    def close(self):
+        """Releases and removes the segment, readers attached keep their mapping."""
+        del self._header, self._ring
+        self._segment.close()
+        # Readers of this process tree may have unregistered the segment from
+        # the shared resource tracker, register it again for unlink to remove it
+        resource_tracker.register(self._segment._name, 'shared_memory')
+        self._segment.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FeedbackReader:
+    """Reads the feedback published by a FeedbackPublisher of another process.
+
+    Attributes
+    ----------
+    name : string
+        Name of the shared memory segment.
+    capacity : int
+        Number of samples kept in the ring.
+
+    """
+
+    def __init__(self, name):
+        """Constructor for a reader, attaching to a published segment.
+
+        Parameters
+        ----------
+        name : string
+            FeedbackPublisher.name of the publisher.
+
+        """
+        self.name = name
+        self._segment = _attach(name)
+        self._header = np.ndarray((_HEADER_SIZE,), dtype=np.int64, buffer=self._segment.buf)
+        self.capacity = int(self._header[_CAPACITY])
+        self._ring = np.ndarray((self.capacity, SAMPLE_SIZE), dtype=np.float64, buffer=self._segment.buf,
+                                offset=8 * _HEADER_SIZE)
+
+    @property
+    def count(self):
+        """Number of samples published so far."""
+        return int(self._header[_COUNT])
+
+    def latest(self):
+        """Returns the latest published sample.
+
+        Returns
+        -------
+        sample : dict
+            'time' and the values of each field as an array of 6 floats,
+            NaN when not published. None before the first sample.
+
+        """
+        header = self._header
+        while True:
+            sequence = header[_SEQUENCE]
+            if sequence & 1:                        # write in progress
+                continue
+            count = header[_COUNT]
+            if count == 0:
+                return None
+            sample = self._ring[(count - 1) % self.capacity].copy()
+            if header[_SEQUENCE] == sequence:
+                return self._as_dict(sample)
+
+    def history(self, length):
+        """Returns the latest published samples, oldest first.
+
+        Parameters
+        ----------
+        length : int
+            Number of samples, at most capacity - 1.
+
+        Returns
+        -------
+        samples : array of float, shape (M, SAMPLE_SIZE)
+            Samples with time in column 0 and the fields in the order of
+            FEEDBACK_FIELDS, 6 columns each. M is below length until enough
+            samples are published.
+
+        """
+        if not 0 < length < self.capacity:
+            raise ValueError(f'History length must be between 1 and {self.capacity - 1}.')
+        header = self._header
+        while True:
+            count = int(header[_COUNT])
+            length = min(length, count)
+            slots = np.arange(count - length, count) % self.capacity
+            samples = self._ring[slots]             # fancy indexing copies
+            # The publisher writes slot count % capacity onwards, the copy is
+            # intact as long as it did not wrap around to the oldest copied slot
+            if int(header[_COUNT]) + 1 - count <= self.capacity - length:
+                return samples
+
+    def field_history(self, field, length):
+        """Returns the times and values of a field for the latest samples.
+
+        Parameters
+        ----------
+        field : string
+            One of FEEDBACK_FIELDS.
+        length : int
+            Number of samples, at most capacity - 1.
+
+        Returns
+        -------
+        times : array of float, shape (M,)
+            Monotonic time of publication of the samples.
+        values : array of float, shape (M, 6)
+            Values of the field.
+
+        """
+        samples = self.history(length)
+        return samples[:, 0], samples[:, _FIELD_SLICES[field]]
+
+    @staticmethod
+    def _as_dict(sample):
+        values = {'time': sample[0]}
+        for field, columns in _FIELD_SLICES.items():
+            values[field] = sample[columns]
+        return values
+
+    def close(self):
+        """Detaches from the segment."""
+        del self._header, self._ring
+        self._segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
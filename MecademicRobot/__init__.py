@@ -1,3 +1,59 @@
+import importlib
+
 from .RobotController import RobotController
 from .RobotFeedback import RobotFeedback
-from .FirmwareUpdate import update_robot
\ No newline at end of file
+from .FirmwareProfile import FirmwareProfile, detect_profile
+from .RobotSession import RobotSession, connect_fleet
+
+# Names loaded on first access only, so that control processes never pay
+# for the import of requests, numpy and the modules built on them.
+_LAZY_ATTRIBUTES = {
+    'update_robot': 'FirmwareUpdate',
+    'update_fleet': 'FirmwareUpdate',
+    'upload_firmware': 'FirmwareUpdate',
+    'FirmwareImage': 'FirmwareUpdate',
+    'FirmwareUpdateError': 'FirmwareUpdate',
+    'UpdateProgress': 'FirmwareUpdate',
+    'FrameCache': 'FrameTransform',
+    'Meca500Kinematics': 'RobotKinematics',
+    'validate_path': 'PathValidation',
+    'PathValidationError': 'PathValidation',
+    'decimate_path': 'PathDecimation',
+    'FeedbackPublisher': 'SharedFeedback',
+    'FeedbackReader': 'SharedFeedback',
+    'FeedbackRecorder': 'FeedbackRecording',
+    'export_session': 'SessionExport',
+    'load_export': 'SessionExport',
+    'analyze_sessions': 'SessionExport',
+    'LinkMonitor': 'LinkHealth',
+    'RollingHistogram': 'LinkHealth',
+    'MetricsRegistry': 'DriverMetrics',
+    'AnomalyDetector': 'AnomalyDetection',
+    'Anomaly': 'AnomalyDetection',
+    'CycleTimeEstimator': 'CycleTime',
+    'measure_moves': 'CycleTime',
+    'compare_moves': 'CycleTime',
+    'fit_joint_acceleration': 'CycleTime',
+}
+_LAZY_SUBMODULES = ('FirmwareUpdate', 'FrameTransform', 'RobotKinematics', 'PathValidation',
+                     'PathDecimation', 'CycleTime', 'SharedFeedback', 'ControlGateway',
+                     'LinkHealth', 'DriverMetrics', 'AnomalyDetection',
+                     'FeedbackRecording', 'SessionExport')
+
+__all__ = ['RobotController', 'RobotFeedback', 'FirmwareProfile', 'detect_profile',
+           'RobotSession', 'connect_fleet'] + list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f'.{name}', __name__)
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value     # next accesses skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | set(_LAZY_SUBMODULES))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Bytes on the wire and CPU per move of the command serializer.
+
+Compares RobotController._build_command with the string serializer it
+replaced, which concatenated str(float) arguments and then appended the
+terminator and encoded the result in _send. Arguments are the floats
+a program computes, such as 0.1 + 0.2, rather than round numbers.
+
+    python benchmarks/bench_command_serializer.py [--moves 20000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MecademicRobot import RobotController
+
+COMMANDS = ('MoveJoints', 'MovePose', 'MoveLin')
+
+
+def _legacy_build(cmd, arg_list):
+    """Serializer before the fixed precision buffer, _send included."""
+    command = cmd
+    if(len(arg_list)!=0):
+        command = command + '('
+        for index in range(0, (len(arg_list)-1)):
+            command = command+str(arg_list[index])+','
+        command = command+str(arg_list[-1])+')'
+    return (command + '\0').encode('ascii')
+
+
+def _moves(count, seed=0):
+    generator = random.Random(seed)
+    return [(COMMANDS[index % len(COMMANDS)], [generator.uniform(-180, 180) for _ in range(6)])
+            for index in range(count)]
+
+
+def _time_per_move(build, moves, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        for cmd, arg_list in moves:
+            build(cmd, arg_list)
+        elapsed = (time.process_time() - start) / len(moves)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--moves', type=int, default=20000, help='Number of moves serialized per run.')
+    args = parser.parse_args()
+    moves = _moves(args.moves)
+    robot = RobotController('127.0.0.1')
+    serializers = (('str concatenation', _legacy_build), ('fixed precision buffer', robot._build_command))
+    print(f'{"serializer":<24} {"bytes/move":>10} {"CPU us/move":>12}')
+    for name, build in serializers:
+        size = sum(len(build(cmd, arg_list)) for cmd, arg_list in moves) / len(moves)
+        print(f'{name:<24} {size:>10.1f} {_time_per_move(build, moves) * 1e6:>12.2f}')
+    print(f'example: {_legacy_build("MoveJoints", [0.1 + 0.2, 0, 0, 0, 0, 0])!r}')
+    print(f'         {bytes(robot._build_command("MoveJoints", [0.1 + 0.2, 0, 0, 0, 0, 0]))!r}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Cold start cost of importing MecademicRobot.
+
+Each case runs in a new interpreter, as a short-lived job runner would.
+The script prints the median wall time of the whole process, the time of
+the import statement itself, the number of entries in sys.modules and
+whether requests was imported. The firmware update case touches a lazy
+name, which costs what every import cost while FirmwareUpdate was
+imported eagerly.
+
+    python benchmarks/bench_import_time.py [--runs 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = (
+    ('interpreter only', 'pass'),
+    ('import MecademicRobot', 'import MecademicRobot'),
+    ('with firmware update', 'import MecademicRobot; MecademicRobot.update_robot'),
+)
+
+# Run in the child, prints the import time, the number of modules and whether requests is loaded
+_PROBE = ('import sys, time\n'
+          'start = time.perf_counter()\n'
+          '{statement}\n'
+          'print(time.perf_counter() - start, len(sys.modules), "requests" in sys.modules)\n')
+
+
+def run(statement):
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (ROOT, os.environ.get('PYTHONPATH')))))
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', _PROBE.format(statement=statement)], env=environment,
+                            check=True, capture_output=True, text=True).stdout
+    wall = time.perf_counter() - start
+    import_time, modules, requests_loaded = output.split()
+    return wall, float(import_time), int(modules), requests_loaded == 'True'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='Number of interpreters started per case.')
+    args = parser.parse_args()
+    run('import MecademicRobot; MecademicRobot.update_robot')      # compiles the bytecode caches once
+    print(f'{"case":<22} {"process ms":>10} {"import ms":>10} {"sys.modules":>11} {"requests":>9}')
+    for name, statement in CASES:
+        results = [run(statement) for _ in range(args.runs)]
+        wall = statistics.median(result[0] for result in results)
+        import_time = statistics.median(result[1] for result in results)
+        _, _, modules, requests_loaded = results[-1]
+        print(f'{name:<22} {wall * 1e3:>10.1f} {import_time * 1e3:>10.1f} {modules:>11} {str(requests_loaded):>9}')
+
+
+if __name__ == '__main__':
+    main()
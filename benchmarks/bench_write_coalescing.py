@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Syscalls per command and latency of the write coalescing policies.
+
+A burst of MoveJoints is queued against a local stand-in of the control
+port, once per set_write_coalescing policy. For each policy the script
+prints the writes per command and the submit time of the burst, the time
+until the stand-in received all of it, and the median time until an
+isolated command reaches the stand-in.
+
+    python benchmarks/bench_write_coalescing.py [--commands 2000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MecademicRobot import RobotController
+from standin_robot import StandInRobot
+
+POLICIES = ((0, None), (1400, 0.002), (8192, 0.002))
+
+
+class _CountingWriter:
+    """Socket proxy counting the send calls of the controller."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sends = 0
+
+    def send(self, data):
+        self.sends += 1
+        return self.sock.send(data)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def _wait_received(standin, count):
+    while len(standin.received) < count:
+        time.sleep(0)
+
+
+def run(standin, max_bytes, max_delay, commands, isolated=50):
+    robot = RobotController(standin.address[0])
+    robot.connect(standin.connect())
+    robot.set_write_coalescing(max_bytes, max_delay)
+    robot.queue = True                          # commands are not answered one by one
+    writer = robot._writer = _CountingWriter(robot._writer)
+    standin.received.clear()
+    start = time.perf_counter()
+    for index in range(commands):
+        robot.MoveJoints(index % 90, 0, 0, 0, 0, 0)
+    submit = time.perf_counter() - start
+    robot.flush()
+    _wait_received(standin, commands)
+    delivered = time.perf_counter() - start
+    sends = writer.sends
+    latencies = []
+    for _ in range(isolated):
+        count = len(standin.received)
+        start = time.perf_counter()
+        robot.MoveJoints(1, 2, 3, 4, 5, 6)
+        _wait_received(standin, count + 1)
+        latencies.append(time.perf_counter() - start)
+    robot._writer = writer.sock
+    robot.disconnect()
+    return sends / commands, submit / commands, delivered, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--commands', type=int, default=2000, help='Number of commands of the burst.')
+    args = parser.parse_args()
+    standin = StandInRobot()
+    standin.answer = False
+    print(f'{"policy":<16} {"syscalls/cmd":>12} {"submit us/cmd":>14} {"all delivered":>14} {"isolated p50":>13}')
+    for max_bytes, max_delay in POLICIES:
+        policy = 'off' if max_bytes == 0 else f'{max_bytes} B / {max_delay * 1e3:g} ms'
+        per_command, submit, delivered, latency = run(standin, max_bytes, max_delay, args.commands)
+        print(f'{policy:<16} {per_command:>12.3f} {submit * 1e6:>14.1f} {delivered * 1e3:>11.1f} ms '
+              f'{latency * 1e3:>10.2f} ms')
+    standin.close()
+
+
+if __name__ == '__main__':
+    main()
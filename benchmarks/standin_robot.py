@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Local stand-in of the robot control port for the benchmarks.
+
+It greets like the robot, splits the stream on the null terminators and
+answers the commands it knows, with [3012] end of block for the others.
+"""
+import socket
+import threading
+import time
+
+# Answers of the stand-in, by command name
+ANSWERS = {
+    b'ActivateRobot': b'[2000][Motors activated.]',
+    b'DeactivateRobot': b'[2004][Motors deactivated.]',
+    b'GetJoints': b'[2026][0.0,0.0,0.0,0.0,0.0,0.0]',
+    b'GetPose': b'[2027][190.0,0.0,308.0,0.0,90.0,0.0]',
+    b'GetConf': b'[2029][1,1,1]',
+    b'GetStatusRobot': b'[2007][1,1,0,1,0,0,0]',
+    b'PauseMotion': b'[2042][Motion paused.]',
+    b'ClearMotion': b'[2044][Motion cleared.]',
+    b'GetFwVersion': b'[2081][v8.3.2]',
+}
+
+
+class StandInRobot:
+    """Control port stand-in serving one client at a time.
+
+    Attributes
+    ----------
+    address : tuple
+        Host and port the stand-in listens on.
+    received : list of bytes
+        Commands received, without their terminator.
+    answer : boolean
+        Whether to answer the commands, False to only record them.
+    delay : float
+        Time in seconds waited before answering what was received.
+
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.received = []
+        self.answer = True
+        self.delay = 0.0
+        self._listener = socket.create_server((host, port))
+        self.address = self._listener.getsockname()[:2]
+        threading.Thread(target=self._serve, name='StandInRobot', daemon=True).start()
+
+    def connect(self):
+        """Returns a socket connected to the stand-in, for RobotController.connect."""
+        return socket.create_connection(self.address)
+
+    def _serve(self):
+        while True:
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            with client:
+                client.sendall(b'[3000][Connected to Meca500 R3 v8.3.2.]\0')
+                pending = b''
+                while True:
+                    try:
+                        data = client.recv(65536)
+                    except OSError:
+                        break
+                    if not data:
+                        break
+                    *messages, pending = (pending + data).split(b'\0')
+                    self.received.extend(messages)
+                    if self.answer:
+                        if self.delay:
+                            time.sleep(self.delay)
+                        answers = [ANSWERS.get(message.partition(b'(')[0], b'[3012][End of block.]') + b'\0'
+                                   for message in messages]
+                        client.sendall(b''.join(answers))
+
+    def close(self):
+        self._listener.close()
@@ -17,6 +17,10 @@ setuptools.setup(
     packages=setuptools.find_packages(),
     data_files=[('',['LICENSE', 'README.md'])],
     include_package_data=True,
+    extras_require={
+        # kinematics, path validation and decimation, cycle time, shared feedback, recording and export
+        'analysis': ['numpy'],
+    },
     classifiers=[
         'Programming Language :: Python :: 3',
         'License :: OSI Approved :: MIT License',
@@ -24,7 +28,8 @@ setuptools.setup(
     ],
     entry_points={
         'console_scripts': [
-            'FirmwareUpdate = FirmwareUpdate:main',
+            'FirmwareUpdate = MecademicRobot.FirmwareUpdate:main',
+            'ControlGateway = MecademicRobot.ControlGateway:main',
         ],
     }
 )
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Routing of the control gateway between local clients and one robot."""
+import functools
+import os
+import socket
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from MecademicRobot import RobotController
+from MecademicRobot.ControlGateway import ControlGateway
+from standin_robot import StandInRobot
+
+
+def _wait_received(standin, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while len(standin.received) < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return standin.received
+
+
+class _RawClient:
+    """Unix socket client sending raw commands and reading whole messages."""
+
+    def __init__(self, path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.socket.settimeout(2)
+        self.buffer = b''
+        self.greeting = self.read()
+
+    def send(self, *commands):
+        self.socket.sendall(b''.join(cmd + b'\0' for cmd in commands))
+
+    def read(self, timeout=2):
+        self.socket.settimeout(timeout)
+        while b'\0' not in self.buffer:
+            data = self.socket.recv(4096)
+            if not data:
+                raise ConnectionError
+            self.buffer += data
+        msg, _, self.buffer = self.buffer.partition(b'\0')
+        return msg
+
+    def close(self):
+        self.socket.close()
+
+
+class ControlGatewayTest(unittest.TestCase):
+
+    window = 8
+    answer_timeout = 30.0
+
+    def setUp(self):
+        self.standin = StandInRobot()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'meca500.sock')
+        self.gateway = ControlGateway(self.standin.address[0], self.path, self.window, self.answer_timeout)
+        self.gateway.robot.connect = functools.partial(self.gateway.robot.connect, self.standin.connect())
+        self.gateway.start()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.gateway.close()
+        self.standin.close()
+        self.directory.cleanup()
+
+    def _client(self):
+        client = _RawClient(self.path)
+        self.clients.append(client)
+        return client
+
+    def test_answers_go_to_their_client(self):
+        first, second = RobotController(self.path), RobotController(self.path)
+        self.assertTrue(first.connect())
+        self.assertTrue(second.connect())
+        try:
+            self.assertEqual(first.GetJoints(), (0.0,) * 6)
+            self.assertEqual(second.GetPose(), (190.0, 0.0, 308.0, 0.0, 90.0, 0.0))
+        finally:
+            first.disconnect()
+            second.disconnect()
+
+    def test_interleaved_clients(self):
+        first, second = self._client(), self._client()
+        first.send(b'GetJoints', b'GetPose')
+        second.send(b'GetConf')
+        self.assertEqual(first.read(), b'[2026][0.0,0.0,0.0,0.0,0.0,0.0]')
+        self.assertEqual(first.read(), b'[2027][190.0,0.0,308.0,0.0,90.0,0.0]')
+        self.assertEqual(second.read(), b'[2029][1,1,1]')
+
+    def test_end_of_block_per_client(self):
+        muted, other = self._client(), self._client()
+        muted.send(b'SetEOB(0)')
+        self.assertEqual(muted.read(), b'[2055][End of block is disabled.]')
+        muted.send(b'SetJointVel(10)', b'GetJoints')
+        other.send(b'SetJointVel(20)')
+        self.assertEqual(other.read(), b'[3012][End of block.]')     # still enabled for the other client
+        self.assertEqual(muted.read(), b'[2026][0.0,0.0,0.0,0.0,0.0,0.0]')
+        self.assertNotIn(b'SetEOB(0)', self.standin.received)       # the robot keeps sending it
+        muted.send(b'SetEOB(1)', b'SetJointVel(30)')
+        self.assertEqual(muted.read(), b'[2054][End of block is enabled.]')
+        self.assertEqual(muted.read(), b'[3012][End of block.]')
+
+
+class WindowTest(ControlGatewayTest):
+    """A robot not answering fills the window, answers time out after answer_timeout."""
+
+    window = 2
+    answer_timeout = 0.3
+
+    def test_priority_bypasses_full_window(self):
+        self.standin.answer = False
+        client = self._client()
+        client.send(*[f'SetJointVel({index})'.encode('ascii') for index in range(4)])
+        self.assertEqual(_wait_received(self.standin, 2), [b'SetJointVel(0)', b'SetJointVel(1)'])
+        time.sleep(0.1)
+        self.assertEqual(len(self.standin.received), 2)             # the window is full
+        client.send(b'PauseMotion')
+        self.assertEqual(_wait_received(self.standin, 3)[2], b'PauseMotion')
+        received = _wait_received(self.standin, 5)                  # the window empties as answers time out
+        self.assertEqual(received[3:], [b'SetJointVel(2)', b'SetJointVel(3)'])
+
+    def test_round_robin(self):
+        self.standin.answer = False
+        first, second = self._client(), self._client()
+        first.send(*[f'SetJointVel({index})'.encode('ascii') for index in range(4)])
+        time.sleep(0.1)
+        second.send(b'SetCartLinVel(1)')
+        received = _wait_received(self.standin, 5)
+        self.assertEqual(received[2:], [b'SetJointVel(2)', b'SetCartLinVel(1)', b'SetJointVel(3)'])
+
+
+if __name__ == '__main__':
+    unittest.main()
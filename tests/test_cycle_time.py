@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Cycle time estimates against recorded feedback, and frame setters in programs."""
+import unittest
+
+import numpy as np
+
+from MecademicRobot.CycleTime import (MAX_JOINT_VEL, CycleTimeEstimator, compare_moves, fit_joint_acceleration,
+                                      parse_program)
+from MecademicRobot.RobotKinematics import Meca500Kinematics
+
+START = np.array([0.0, 0.0, 30.0, 0.0, 40.0, 0.0])
+PROGRAM = """SetBlending(0)
+SetJointVel(50)
+MoveJoints(20,10,30,0,40,0)
+Delay(0.2)
+MoveJoints(-30,10,20,40,60,90)
+Delay(0.2)
+MoveJoints(-28,12,22,40,60,95)
+Delay(0.2)
+MoveJoints(0,0,30,0,40,0)"""
+
+
+def _record(program, max_joint_acc, period=0.001):
+    """Joint feedback of a robot moving the MoveJoints of a program on trapezoidal profiles."""
+    estimator = CycleTimeEstimator(start_joints=START, max_joint_acc=max_joint_acc)
+    _, durations = estimator.estimate(program)
+    timestamps, joints = [0.0], [START]
+    settings = dict(estimator.settings)
+    for (name, args), duration in zip(parse_program(program), durations):
+        if name in settings:
+            settings[name] = args
+            continue
+        times = np.arange(period, duration + period / 2, period)
+        if name == 'Delay':
+            fractions = np.zeros_like(times)
+        else:
+            _, ramp = estimator.joint_move_times(np.array(args) - joints[-1], settings)
+            cruise = duration - ramp            # end of cruise, the profile is symmetric
+            velocity = 1.0 / cruise             # normalized travel per second at cruise
+            fractions = np.where(times < ramp, 0.5 * velocity / ramp * times ** 2,
+                                 np.where(times < cruise, velocity * (times - ramp / 2),
+                                          1.0 - 0.5 * velocity / ramp * np.maximum(duration - times, 0.0) ** 2))
+        start = joints[-1]
+        target = start if name == 'Delay' else np.array(args)
+        timestamps.extend(timestamps[-1] + times)
+        joints.extend(start + fractions[:, np.newaxis] * (target - start))
+    # Still at the end, as the recording goes on after the program
+    timestamps.extend(timestamps[-1] + np.arange(1, 200) * period)
+    joints.extend([joints[-1]] * 199)
+    return np.array(timestamps), np.array(joints)
+
+
+class CalibrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.true_acc = MAX_JOINT_VEL * 5.0
+        self.timestamps, self.joints = _record(PROGRAM, self.true_acc)
+
+    def test_matching_model(self):
+        comparison = compare_moves(CycleTimeEstimator(start_joints=START, max_joint_acc=self.true_acc),
+                                   PROGRAM, self.timestamps, self.joints)
+        self.assertEqual(comparison['commands'].tolist(), [2, 4, 6, 8])
+        np.testing.assert_allclose(comparison['error'], 0.0, atol=0.005)
+
+    def test_wrong_acceleration_shows(self):
+        comparison = compare_moves(CycleTimeEstimator(start_joints=START), PROGRAM, self.timestamps, self.joints)
+        self.assertLess(comparison['error'].max(), -0.01)     # faster ramps than the recording, moves too short
+
+    def test_fit_recovers_acceleration(self):
+        max_joint_acc, comparison = fit_joint_acceleration(CycleTimeEstimator(start_joints=START), PROGRAM,
+                                                           self.timestamps, self.joints)
+        np.testing.assert_allclose(max_joint_acc, self.true_acc, rtol=0.03)
+        np.testing.assert_allclose(comparison['error'], 0.0, atol=0.005)
+
+    def test_blended_moves_rejected(self):
+        with self.assertRaises(ValueError):
+            compare_moves(CycleTimeEstimator(start_joints=START), PROGRAM.replace('Delay(0.2)', ''),
+                          *_record(PROGRAM.replace('Delay(0.2)', ''), self.true_acc))
+
+
+class FrameSetterTest(unittest.TestCase):
+
+    def test_trf_applies_to_following_moves(self):
+        kinematics = Meca500Kinematics()
+        kinematics.set_trf(0, 0, 80, 0, 0, 0)
+        target = kinematics.forward(START) + [0.0, 40.0, 0.0, 0.0, 0.0, 0.0]
+        framed = CycleTimeEstimator(kinematics=kinematics, start_joints=START)
+        _, expected = framed.estimate([('MoveLin', tuple(target)), ('MovePose', tuple(target - [0, 60, 0, 0, 0, 0]))])
+        estimator = CycleTimeEstimator(start_joints=START)
+        _, durations = estimator.estimate([('SetTRF', (0, 0, 80, 0, 0, 0)), ('MoveLin', tuple(target)),
+                                           ('MovePose', tuple(target - [0, 60, 0, 0, 0, 0]))])
+        np.testing.assert_allclose(durations[1:], expected)
+        # The estimator frames are left as they were
+        np.testing.assert_allclose(estimator.kinematics.forward(START), Meca500Kinematics().forward(START))
+
+    def test_wrf_applies_to_following_moves(self):
+        kinematics = Meca500Kinematics()
+        pose = kinematics.forward(START)
+        estimator = CycleTimeEstimator(start_joints=START)
+        # The same numbers are 20 mm away once the WRF is raised by 20 mm
+        _, durations = estimator.estimate([('MoveLin', tuple(pose)), ('SetWRF', (0, 0, 20, 0, 0, 0)),
+                                           ('MoveLin', tuple(pose))])
+        self.assertAlmostEqual(durations[0], 0.0)
+        self.assertGreater(durations[2], 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Firmware versions stored by RobotController on connection."""
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from MecademicRobot import RobotController
+from standin_robot import StandInRobot
+
+
+class FirmwareCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.standin = StandInRobot()
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.directory.name, 'firmware.json')
+
+    def tearDown(self):
+        self.standin.close()
+        self.directory.cleanup()
+
+    def _connect(self, address, firmware_cache):
+        robot = RobotController(address, firmware_cache)
+        self.assertTrue(robot.connect(self.standin.connect()))
+        robot.disconnect()
+        self.assertEqual(robot.firmware_version, '8.3.2')
+
+    def test_robot_address_remembered(self):
+        self._connect('192.0.2.7', self.cache_path)
+        with open(self.cache_path) as cache_file:
+            self.assertEqual(json.load(cache_file)['192.0.2.7']['version'], '8.3.2')
+
+    def test_loopback_not_remembered(self):
+        for address in ('127.0.0.1', '::1', 'localhost'):
+            self._connect(address, self.cache_path)
+        self.assertFalse(os.path.exists(self.cache_path))
+
+    def test_cache_disabled(self):
+        self._connect('192.0.2.7', None)
+        self.assertFalse(os.path.exists(self.cache_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""Firmware update against a local HTTP stand-in of the robot web server.
+
+The stand-in takes the firmware on POST / and reports the upgrade on
+GET /?update, as the robot does. The control port is replaced by a
+controller that only records its connections.
+"""
+import contextlib
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from MecademicRobot import FirmwareUpdate
+
+
+class _RobotWebServer(ThreadingHTTPServer):
+    """Stand-in of the robot web server.
+
+    Attributes
+    ----------
+    uploads : list of bytes
+        Bodies of the completed POST requests.
+    drop_uploads : int
+        Number of next uploads to cut off halfway through, as a lost connection.
+    stall : float
+        Time in seconds to wait before answering an upload.
+    update_answers : list of string
+        Bodies of the next GET /?update answers, the last one is repeated.
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _RobotHandler)
+        self.uploads = []
+        self.drop_uploads = 0
+        self.stall = 0
+        self.update_answers = ['0']
+        self.release = threading.Event()
+
+    @property
+    def address(self):
+        return f'127.0.0.1:{self.server_address[1]}'
+
+
+class _RobotHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        if self.server.drop_uploads:
+            self.server.drop_uploads -= 1
+            self.rfile.read(length // 2)
+            self.close_connection = True
+            self.connection.close()
+            return
+        body = self.rfile.read(length)
+        if self.server.stall:
+            self.server.release.wait(self.server.stall)
+        self.server.uploads.append(body)
+        self._answer('OK')
+
+    def do_GET(self):
+        answers = self.server.update_answers
+        self._answer(answers.pop(0) if len(answers) > 1 else answers[0])
+
+    def _answer(self, text):
+        body = text.encode('ascii')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _FakeController:
+    """RobotController whose connections succeed as listed in results."""
+
+    results = []
+    deactivated = 0
+
+    def __init__(self, address):
+        self.address = address
+
+    def connect(self):
+        return _FakeController.results.pop(0) if _FakeController.results else True
+
+    def disconnect(self):
+        pass
+
+    def DeactivateRobot(self):
+        _FakeController.deactivated += 1
+
+
+class FirmwareUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _RobotWebServer()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.firmware = bytes(range(256)) * 1000 + b'end'    # several upload chunks
+        handle, self.path = tempfile.mkstemp(suffix='.update')
+        with os.fdopen(handle, 'wb') as update_file:
+            update_file.write(self.firmware)
+
+    def tearDown(self):
+        self.server.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+        os.remove(self.path)
+
+    def test_upload_streams_whole_image_with_progress(self):
+        progress = []
+        with FirmwareUpdate.FirmwareImage(self.path) as image:
+            FirmwareUpdate.upload_firmware(image, self.server.address, lambda sent, total: progress.append((sent, total)))
+        self.assertEqual(self.server.uploads, [self.firmware])
+        self.assertEqual(progress[-1], (len(self.firmware), len(self.firmware)))
+        self.assertEqual([sent for sent, _ in progress], sorted(sent for sent, _ in progress))
+
+    def test_upload_restarts_after_connection_loss(self):
+        self.server.drop_uploads = 1
+        with FirmwareUpdate.FirmwareImage(self.path) as image:
+            FirmwareUpdate.upload_firmware(image, self.server.address, backoff=0.01)
+        self.assertEqual(self.server.uploads, [self.firmware])
+
+    def test_upload_gives_up_after_retries(self):
+        self.server.drop_uploads = 3
+        with FirmwareUpdate.FirmwareImage(self.path) as image:
+            with self.assertRaises(FirmwareUpdate.FirmwareUpdateError):
+                FirmwareUpdate.upload_firmware(image, self.server.address, max_retries=2, backoff=0.01)
+        self.assertEqual(self.server.uploads, [])
+
+    def test_upload_times_out_on_silent_robot(self):
+        self.server.stall = 5
+        with FirmwareUpdate.FirmwareImage(self.path) as image:
+            with self.assertRaises(FirmwareUpdate.FirmwareUpdateError):
+                FirmwareUpdate.upload_firmware(image, self.server.address, max_retries=0, timeout=(1.0, 0.2))
+
+    def test_image_checksum(self):
+        with FirmwareUpdate.FirmwareImage(self.path) as image:
+            self.assertEqual(image.size, len(self.firmware))
+            self.assertEqual(image.sha256, hashlib.sha256(self.firmware).hexdigest())
+
+    def test_update_reports_upgrade_log(self):
+        self.server.update_answers = [
+            '0',
+            json.dumps({'STATUS': {'Code': 1, 'MSG': 'Upgrading'}, 'LOG': {'1': 'Installing 40%'}}),
+            json.dumps({'STATUS': {'Code': 0, 'MSG': 'Update done'}, 'LOG': {'1': 'Installing 40% 100%'}}),
+        ]
+        _FakeController.results = [True, False, True]     # deactivate, gone for the reboot, back
+        _FakeController.deactivated = 0
+        events = []
+        with mock.patch.object(FirmwareUpdate, 'RobotController', _FakeController):
+            with FirmwareUpdate.FirmwareImage(self.path) as image:
+                FirmwareUpdate._update_robot(image, self.server.address, events.append, poll_interval=(0.01, 0.05))
+        self.assertEqual(_FakeController.deactivated, 1)
+        self.assertEqual(self.server.uploads, [self.firmware])
+        phases = [event.phase for event in events]
+        self.assertEqual(phases[0], 'connect')
+        self.assertEqual(phases[-1], 'done')
+        self.assertLess(phases.index('upload'), phases.index('upgrade'))
+        self.assertIn(40, [event.percent for event in events if event.phase == 'upgrade'])
+
+    def test_update_raises_on_robot_error(self):
+        self.server.update_answers = [json.dumps({'STATUS': {'Code': 2, 'MSG': 'Bad image'}, 'LOG': {}})]
+        _FakeController.results = []
+        with mock.patch.object(FirmwareUpdate, 'RobotController', _FakeController):
+            with FirmwareUpdate.FirmwareImage(self.path) as image:
+                with self.assertRaisesRegex(FirmwareUpdate.FirmwareUpdateError, 'Bad image'):
+                    FirmwareUpdate._update_robot(image, self.server.address, lambda event: None)
+
+
+class UpdateFleetTest(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.update')
+        with os.fdopen(handle, 'wb') as update_file:
+            update_file.write(b'firmware')
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_failure_reported_while_others_run(self):
+        failed = threading.Event()
+        failure_seen = []
+
+        def update_robot(image, ip_address, report, **kwargs):
+            if ip_address == 'bad':
+                raise FirmwareUpdate.FirmwareUpdateError('Could not connect to robot bad.')
+            failure_seen.append(failed.wait(2))     # still updating when the failure comes out
+            report(FirmwareUpdate.UpdateProgress(ip_address, 'done', 100, 'Update done.'))
+
+        def progress(event):
+            events.append(event)
+            if event.phase == 'failed':
+                failed.set()
+
+        events = []
+        with mock.patch.object(FirmwareUpdate, '_update_robot', update_robot):
+            results = FirmwareUpdate.update_fleet(self.path, ['good', 'bad'], 2, progress)
+        self.assertEqual(failure_seen, [True])
+        self.assertEqual([(event.ip_address, event.phase) for event in events], [('bad', 'failed'), ('good', 'done')])
+        self.assertEqual(events[0].message, 'Could not connect to robot bad.')
+        self.assertIsNone(results['good'])
+        self.assertIsInstance(results['bad'], FirmwareUpdate.FirmwareUpdateError)
+
+    def test_duplicate_addresses_rejected(self):
+        with mock.patch.object(FirmwareUpdate, '_update_robot') as update_robot:
+            with self.assertRaisesRegex(ValueError, '192.168.0.100'):
+                FirmwareUpdate.update_fleet(self.path, ['192.168.0.100', '192.168.0.101', '192.168.0.100'])
+        update_robot.assert_not_called()
+
+    def test_printer_counts_failures(self):
+        printer = FirmwareUpdate._ProgressPrinter(['good', 'bad'])
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            printer(FirmwareUpdate.UpdateProgress('bad', 'failed', None, 'Could not connect to robot bad.'))
+            printer(FirmwareUpdate.UpdateProgress('good', 'done', 100, 'Update done.'))
+        self.assertEqual(output.getvalue().splitlines(),
+                         ['[1/2 finished, 1 failed] bad failed: Could not connect to robot bad.',
+                          '[2/2 finished, 1 failed] good done 100%: Update done.'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Decimation of Cartesian paths keeps their shape within the tolerance."""
+import unittest
+
+import numpy as np
+
+from MecademicRobot.PathDecimation import decimate_path, default_tolerance
+
+
+def _circle(radius, count=2000):
+    angles = np.linspace(0.0, 2.0 * np.pi, count)
+    return np.column_stack([190.0 + radius * np.cos(angles), radius * np.sin(angles), np.full(count, 300.0),
+                            np.zeros(count), np.full(count, 90.0), np.zeros(count)])
+
+
+def _deviation(poses, keep):
+    """Largest distance of the poses to the segments between the kept poses."""
+    positions = poses[:, :3]
+    worst = 0.0
+    for start, end in zip(keep[:-1], keep[1:]):
+        chord = positions[end] - positions[start]
+        offset = positions[start:end + 1] - positions[start]
+        fraction = np.clip(offset @ chord / (chord @ chord), 0.0, 1.0)
+        worst = max(worst, np.linalg.norm(offset - fraction[:, np.newaxis] * chord, axis=1).max())
+    return worst
+
+
+class DefaultToleranceTest(unittest.TestCase):
+
+    def test_bounded_whatever_the_settings(self):
+        for velocity in (1, 150, 500, 1000):
+            for acceleration in (1, 50, 100):
+                for blending in (0, 50, 100):
+                    tolerance = default_tolerance({'SetCartLinVel': (velocity,), 'SetCartAcc': (acceleration,),
+                                                   'SetBlending': (blending,)})
+                    self.assertGreaterEqual(tolerance, 0.01)
+                    self.assertLessEqual(tolerance, 0.05)
+
+    def test_no_blending_uses_floor(self):
+        self.assertEqual(default_tolerance({'SetBlending': (0,), 'SetCartLinVel': (500,)}), 0.01)
+
+
+class DecimatePathTest(unittest.TestCase):
+
+    def test_small_circle_keeps_its_shape(self):
+        poses = _circle(20.0)
+        for settings in ({}, {'SetCartLinVel': (500,), 'SetCartAcc': (100,)}, {'SetBlending': (0,)}):
+            tolerance = default_tolerance(settings)
+            keep = decimate_path('MoveLin', poses, settings)
+            self.assertEqual((keep[0], keep[-1]), (0, len(poses) - 1))
+            self.assertLessEqual(_deviation(poses, keep), tolerance + 1e-9)
+            self.assertGreater(len(keep), 50)
+            self.assertLess(len(keep), len(poses))
+
+    def test_straight_line_reduced_to_its_ends(self):
+        poses = np.column_stack([np.linspace(150, 250, 500), np.zeros(500), np.full(500, 300.0),
+                                 np.zeros(500), np.full(500, 90.0), np.zeros(500)])
+        np.testing.assert_array_equal(decimate_path('MoveLin', poses), [0, 499])
+
+    def test_move_joints_within_tolerance(self):
+        steps = np.linspace(0.0, 1.0, 300)
+        joints = np.column_stack([30 * np.sin(2 * np.pi * steps)] + [steps * 10] * 5)
+        keep = decimate_path('MoveJoints', joints, tolerance=0.05)
+        for start, end in zip(keep[:-1], keep[1:]):
+            chord = joints[end] - joints[start]
+            offset = joints[start:end + 1] - joints[start]
+            fraction = np.clip(offset @ chord / (chord @ chord), 0.0, 1.0)[:, np.newaxis]
+            self.assertLessEqual(np.abs(offset - fraction * chord).max(), 0.05 + 1e-9)
+        self.assertLess(len(keep), len(joints))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Validation of paths on the host, before anything is sent."""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from MecademicRobot import RobotController
+from MecademicRobot.PathValidation import PathValidationError, validate_path
+from MecademicRobot.RobotKinematics import Meca500Kinematics
+from standin_robot import StandInRobot
+
+START = np.array([10.0, 20.0, 10.0, 0.0, 40.0, 0.0])
+
+
+class ValidatePathTest(unittest.TestCase):
+
+    def setUp(self):
+        self.kinematics = Meca500Kinematics()
+
+    def _line(self, offsets):
+        return np.array([self.kinematics.forward(START) + [0.0, offset, 0.0, 0.0, 0.0, 0.0] for offset in offsets])
+
+    def test_reachable_line_is_ok(self):
+        report = validate_path('MoveLin', self._line(range(0, 60, 3)), start_joints=START)
+        self.assertTrue(report.ok)
+        np.testing.assert_allclose(report.joints[0], START, atol=1e-6)
+
+    def test_wrist_flip_between_waypoints(self):
+        ends = np.array([[0, 0, 30, 30, 20, 0], [0, 0, 30, 30, -20, 0]], dtype=float)
+        poses = self.kinematics.forward(ends)
+        for start_joints in (ends[0], None):
+            report = validate_path('MoveLin', poses, start_joints=start_joints)
+            self.assertFalse(report.ok)
+            self.assertEqual(report.discontinuous.tolist(), [1])
+            self.assertEqual(report.unreachable.size, 0)   # both ends are fine on their own
+
+    def test_first_line_from_start_joints(self):
+        start = np.array([0, 0, 30, 30, 20, 0], dtype=float)
+        target = self.kinematics.forward(np.array([[0, 0, 30, 30, -20, 0]], dtype=float))
+        self.assertTrue(validate_path('MoveLin', target).ok)     # fine without knowing where the robot is
+        report = validate_path('MoveLin', target, start_joints=start)
+        self.assertEqual(report.discontinuous.tolist(), [0])
+
+    def test_move_pose_lines_not_checked(self):
+        ends = np.array([[0, 0, 30, 30, 20, 0], [0, 0, 30, 30, -20, 0]], dtype=float)
+        report = validate_path('MovePose', self.kinematics.forward(ends))
+        self.assertTrue(report.ok)
+
+    def test_joint_limits(self):
+        report = validate_path('MoveJoints', [[0, 0, 0, 0, 0, 0], [0, 100, 0, 0, 0, 0]])
+        self.assertEqual(report.out_of_limits.tolist(), [1])
+        with self.assertRaises(PathValidationError):
+            report.raise_for_errors()
+
+
+class SendPathTest(unittest.TestCase):
+
+    def setUp(self):
+        self.standin = StandInRobot()
+        self.robot = RobotController(self.standin.address[0])
+        self.assertTrue(self.robot.connect(self.standin.connect()))
+        self.path = np.array([Meca500Kinematics().forward(START) + [0.0, offset, 0.0, 0.0, 0.0, 0.0]
+                              for offset in (0.0, 5.0, 10.0)])
+
+    def tearDown(self):
+        self.robot.disconnect()
+        self.standin.close()
+
+    def test_reads_start_joints(self):
+        # The stand-in reports all joints at 0, on the wrist singularity
+        with self.assertRaises(PathValidationError):
+            self.robot.send_path('MoveLin', self.path)
+        self.assertEqual(self.standin.received, [b'GetJoints'])
+
+    def test_given_start_joints(self):
+        self.robot.send_path('MoveLin', self.path, start_joints=START)
+        self.assertEqual([message.partition(b'(')[0] for message in self.standin.received], [b'MoveLin'] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
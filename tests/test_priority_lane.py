@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Order of the priority lane commands against the buffered commands."""
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from MecademicRobot import RobotController
+from standin_robot import StandInRobot
+
+
+def _wait_received(standin, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while len(standin.received) < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return standin.received
+
+
+class PriorityLaneTest(unittest.TestCase):
+
+    threaded = False
+
+    def setUp(self):
+        self.standin = StandInRobot()
+        self.robot = RobotController(self.standin.address[0])
+        self.assertTrue(self.robot.connect(self.standin.connect()))
+        if self.threaded:
+            self.robot.set_threaded(True)
+        self.robot.set_write_coalescing(1 << 16, None)     # keep the moves in the write buffer
+        self.robot.queue = True
+
+    def tearDown(self):
+        self.robot.disconnect()
+        self.standin.close()
+
+    def _buffer_moves(self):
+        for index in range(5):
+            self.robot.MoveJoints(index, 0, 0, 0, 0, 0)
+        self.robot.queue = False
+
+    def test_clear_motion_follows_buffered_moves(self):
+        self._buffer_moves()
+        self.robot.ClearMotion()
+        received = _wait_received(self.standin, 6)
+        self.assertEqual([message.partition(b'(')[0] for message in received],
+                         [b'MoveJoints'] * 5 + [b'ClearMotion'])
+
+    def test_pause_motion_skips_ahead(self):
+        self._buffer_moves()
+        self.robot.PauseMotion()
+        self.robot.flush()
+        received = _wait_received(self.standin, 6)
+        self.assertEqual(received[0], b'PauseMotion')
+        self.assertEqual(received[1:], [f'MoveJoints({index},0,0,0,0,0)'.encode('ascii') for index in range(5)])
+
+    def test_clear_motion_while_in_error(self):
+        self._buffer_moves()
+        self.robot.error = True
+        self.robot.ClearMotion()
+        received = _wait_received(self.standin, 6)
+        self.assertEqual(received[-1], b'ClearMotion')
+
+
+class ThreadedPriorityLaneTest(PriorityLaneTest):
+    """The moves may still wait for the writer thread when ClearMotion is called."""
+
+    threaded = True
+
+    @unittest.skip('the writer thread writes the buffer whenever it is idle, nothing is left to skip')
+    def test_pause_motion_skips_ahead(self):
+        pass
+
+
+if __name__ == '__main__':
+    unittest.main()
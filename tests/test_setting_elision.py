@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Set* commands repeating what the robot acknowledged are not sent."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from MecademicRobot import RobotController
+from standin_robot import StandInRobot
+
+
+class SettingElisionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.standin = StandInRobot()
+        self.robot = RobotController(self.standin.address[0])
+        self.assertTrue(self.robot.connect(self.standin.connect()))
+
+    def tearDown(self):
+        self.robot.disconnect()
+        self.standin.close()
+
+    def test_identical_setter_not_sent(self):
+        first = self.robot.SetJointVel(10)
+        self.assertEqual(self.robot.SetJointVel(10), first)
+        self.assertEqual(self.standin.received, [b'SetJointVel(10)'])
+        self.assertEqual(self.robot.elided_commands, 1)
+        self.assertEqual(self.robot.settings['SetJointVel'], (10,))
+
+    def test_changed_argument_sent(self):
+        self.robot.SetJointVel(10)
+        self.robot.SetJointVel(20)
+        self.robot.SetTRF(0, 0, 10, 0, 0, 0)
+        self.robot.SetTRF(0, 0, 10, 0, 0, 5)
+        self.assertEqual(self.standin.received, [b'SetJointVel(10)', b'SetJointVel(20)',
+                                                 b'SetTRF(0,0,10,0,0,0)', b'SetTRF(0,0,10,0,0,5)'])
+        self.assertEqual(self.robot.elided_commands, 0)
+        self.assertEqual(self.robot.settings['SetJointVel'], (20,))
+
+    def test_reconnect_forgets_acknowledged(self):
+        self.robot.SetJointVel(10)
+        self.robot.disconnect()
+        self.assertTrue(self.robot.connect(self.standin.connect()))
+        self.robot.SetJointVel(10)
+        self.assertEqual(self.standin.received, [b'SetJointVel(10)'] * 2)
+        self.assertEqual(self.robot.elided_commands, 0)
+
+    def test_queued_setter_not_acknowledged(self):
+        self.robot.queue = True
+        self.robot.SetJointVel(10)                  # no answer is read in queueing mode
+        self.robot.queue = False
+        self.robot._receive([3012], 1)
+        self.robot.SetJointVel(10)
+        self.assertEqual(self.standin.received, [b'SetJointVel(10)'] * 2)
+        self.assertEqual(self.robot.elided_commands, 0)
+
+    def test_queueing_mode_replaces_acknowledged(self):
+        self.robot.SetJointVel(10)
+        self.robot.queue = True
+        self.robot.SetJointVel(20)
+        self.robot.queue = False
+        self.robot.flush()
+        self.robot._receive([3012], 1)              # answer of the queued command
+        self.robot.SetJointVel(20)
+        self.robot.SetJointVel(10)
+        self.assertEqual(self.standin.received, [b'SetJointVel(10)', b'SetJointVel(20)',
+                                                 b'SetJointVel(20)', b'SetJointVel(10)'])
+
+    def test_invalidate_settings(self):
+        self.robot.SetJointVel(10)
+        self.robot.invalidate_settings()
+        self.robot.SetJointVel(10)
+        self.assertEqual(self.standin.received, [b'SetJointVel(10)'] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
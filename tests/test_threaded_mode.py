@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Exchanges of several threads through the writer and reader threads."""
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from MecademicRobot import RobotController
+from standin_robot import StandInRobot
+
+# Commands of the concurrent exchanges and the answer each expects
+EXCHANGES = (
+    ('GetJoints', '[2026][0.0,0.0,0.0,0.0,0.0,0.0]'),
+    ('GetPose', '[2027][190.0,0.0,308.0,0.0,90.0,0.0]'),
+    ('GetConf', '[2029][1,1,1]'),
+    ('SetJointVel(10)', '[3012][End of block.]'),
+)
+
+
+def _run_threads(count, target):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(index):
+        barrier.wait()
+        results[index] = target(index)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+class ThreadedModeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.standin = StandInRobot()
+        self.robot = RobotController(self.standin.address[0])
+        self.assertTrue(self.robot.connect(self.standin.connect()))
+        self.robot.set_threaded(True)
+
+    def tearDown(self):
+        self.robot.disconnect()
+        self.standin.close()
+
+    def test_concurrent_exchanges(self):
+        def exchange(index):
+            answers = []
+            for repeat in range(25):
+                cmd, _ = EXCHANGES[(index + repeat) % len(EXCHANGES)]
+                answers.append(self.robot.exchange_msg(cmd, delay=5, decode=False))
+            return answers
+
+        results = _run_threads(8, exchange)
+        for index, answers in enumerate(results):
+            expected = [EXCHANGES[(index + repeat) % len(EXCHANGES)][1] for repeat in range(25)]
+            self.assertEqual(answers, expected)
+        self.assertEqual(len(self.standin.received), 8 * 25)
+        self.assertEqual(len(self.robot.unsolicited), 0)
+
+    def test_queries_in_flight_are_shared(self):
+        self.standin.delay = 0.3                    # the first query is still in flight when the others start
+        results = _run_threads(6, lambda index: self.robot.GetJoints())
+        self.assertEqual(results, [(0.0,) * 6] * 6)
+        self.assertEqual(self.standin.received, [b'GetJoints'])
+        self.assertEqual(self.robot.coalesced_queries, 5)
+        self.assertEqual(self.robot._flights, {})
+
+    def test_disconnect_flushes_and_stops(self):
+        self.robot.set_write_coalescing(1 << 16, None)
+        self.robot.queue = True
+        for index in range(5):
+            self.robot.MoveJoints(index, 0, 0, 0, 0, 0)
+        self.robot.queue = False
+        self.standin.answer = False
+        waiter = []
+        thread = threading.Thread(target=lambda: waiter.append(self.robot.exchange_msg('GetJoints', delay=20)))
+        thread.start()
+        deadline = time.monotonic() + 2
+        while b'GetJoints' not in self.standin.received and time.monotonic() < deadline:
+            time.sleep(0.001)
+        start = time.monotonic()
+        self.robot.disconnect()
+        thread.join(5)
+        self.assertLess(time.monotonic() - start, 2)       # the waiter is released, not timed out
+        self.assertEqual(waiter, [None])
+        self.assertEqual(self.robot._threads, ())
+        self.assertEqual(self.standin.received[:5],
+                         [f'MoveJoints({index},0,0,0,0,0)'.encode('ascii') for index in range(5)])
+
+
+if __name__ == '__main__':
+    unittest.main()